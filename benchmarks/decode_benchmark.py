@@ -0,0 +1,115 @@
+"""Compare two ways to turn a downloaded page into text, per source: requests' response.text and decode_response().
+
+response.text guesses the character set from the whole body when the server doesn't name one.
+decode_response() uses the header, the page's <meta charset>, or UTF-8, without guessing.
+Different text usually means the server sent text/html without a charset: response.text then assumes ISO-8859-1,
+while decode_response() follows the page's <meta charset>.
+
+Uses the HTML pages in a recorded run's archive if given (see pipeline_benchmark.py to record one),
+otherwise synthetic pages with and without a declared charset. No network, S3 or secrets needed.
+
+USAGE
+    python benchmarks/decode_benchmark.py
+    python benchmarks/decode_benchmark.py --archive fixtures/today.archive --repeats 10
+"""
+
+import argparse
+import gzip
+import pickle
+from statistics import median
+from time import perf_counter
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from finite_news.fetching import decode_response
+
+
+def make_response(content, headers):
+    """Build a response like the ones http_get() returns.
+
+    RETURNS
+    response (requests.Response): The response, with its body already read
+    """
+
+    response = Response()
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict(headers)
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = content
+    response._content_consumed = True
+    return response
+
+
+def make_pages(n_stories=3000):
+    """Create a large homepage, served a few different ways.
+
+    RETURNS
+    pages (dict): For each description, (content, headers)
+    """
+
+    stories = "".join([f"<div class='story'><h2>Café owners rally in São Paulo — update {i}</h2></div>\n" for i in range(n_stories)])
+    page = f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>News</title></head><body>{stories}</body></html>"
+    legacy_page = page.replace("charset='utf-8'", "charset='windows-1252'").replace("—", "-")
+    return {
+        "charset in header": (page.encode("utf-8"), {"Content-Type": "text/html; charset=utf-8"}),
+        "charset in meta only": (page.encode("utf-8"), {"Content-Type": "text/html"}),
+        "no content type": (page.encode("utf-8"), {}),
+        "windows-1252 in meta only": (legacy_page.encode("windows-1252"), {}),
+    }
+
+
+def load_archive_pages(archive_path):
+    """Find the HTML responses in a recorded run's archive.
+
+    RETURNS
+    pages (dict): For each request, (content, headers)
+    """
+
+    with gzip.open(archive_path, "rb") as f:
+        archive = pickle.load(f)
+    return {
+        key: (exchanges[-1]["content"], exchanges[-1]["headers"])
+        for key, exchanges in archive["exchanges"].items()
+        if "html" in CaseInsensitiveDict(exchanges[-1]["headers"]).get("Content-Type", "html") and exchanges[-1]["status_code"] == 200
+    }
+
+
+def time_decode(decode, content, headers, repeats):
+    """Time one way of decoding one page.
+
+    RETURNS
+    seconds (float): Median time to decode the page
+    text (str): The decoded page
+    """
+
+    times = []
+    for _ in range(repeats):
+        response = make_response(content, headers) # Fresh each time: requests doesn't reuse what it guessed
+        start = perf_counter()
+        text = decode(response)
+        times.append(perf_counter() - start)
+    return median(times), text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", help="Recorded with finite-news run --record. Default: synthetic pages")
+    parser.add_argument("--stories", type=int, default=3000, help="Size of the synthetic pages")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = load_archive_pages(args.archive) if args.archive else make_pages(args.stories)
+    totals = [0, 0]
+    for name, (content, headers) in pages.items():
+        text_seconds, text = time_decode(lambda response: response.text, content, headers, args.repeats)
+        decode_seconds, decoded = time_decode(decode_response, content, headers, args.repeats)
+        totals = [totals[0] + text_seconds, totals[1] + decode_seconds]
+        same = "same text" if text == decoded else "DIFFERENT text"
+        print(f"{name} ({len(content) / 1e3:.0f} KB): response.text {text_seconds * 1e3:.1f} ms, decode_response {decode_seconds * 1e3:.1f} ms, {same}")
+    print(f"\nTotal for {len(pages)} pages: response.text {totals[0] * 1e3:.1f} ms, decode_response {totals[1] * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
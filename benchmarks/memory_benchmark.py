@@ -0,0 +1,118 @@
+"""Measure how much memory issue configs take as the number of subscribers grows.
+
+Builds a synthetic publication and synthetic subscribers in memory (no S3 or secrets needed),
+then compares the layered issue configs made by load_subscriber_config() with a deepcopy per subscriber.
+
+USAGE
+    python benchmarks/memory_benchmark.py --subscribers 10000
+"""
+
+import argparse
+from copy import deepcopy
+import logging
+import tracemalloc
+
+from finite_news.loading import index_sources, load_subscriber_config
+
+
+def make_publication_config(n_sources=40, template_kb=20, n_rules=300, n_thoughts=200):
+    """Create a publication_config shaped like the one load_publication_config() returns.
+
+    RETURNS
+    publication_config (dict): Synthetic general settings
+    """
+
+    news_sources = [
+        {
+            "name": f"Source {i}",
+            "category": f"Category {i % 5}",
+            "type": "headlines",
+            "method": "scrape",
+            "url": f"https://news{i}.example.com",
+            "tag": "h1",
+            "min_words": 3,
+        }
+        for i in range(n_sources)
+    ]
+    return {
+        "bucket_path": "/tmp/finite_news_benchmark/",
+        "email_delivery": False,
+        "sender": {"email": "news@example.com"},
+        "layout": {"template_html": "<p>[[HEADLINES_BLOCK]]</p>" * (template_kb * 40), "logo_url": "https://example.com/logo.png"},
+        "editorial": {
+            "one_headline_keywords": ["keyword"],
+            "substance_rules": {
+                "cant_begin_with": [f"begin phrase {i}" for i in range(n_rules)],
+                "cant_contain": [f"contain phrase {i}" for i in range(n_rules)],
+                "cant_end_with": [f"end phrase {i}" for i in range(n_rules)],
+            },
+            "log_today_headlines": False,
+        },
+        "forecast": {"api_snooze_bar": 10},
+        "gpt": None,
+        "news_sources": news_sources,
+        "news_catalog": index_sources(news_sources),
+        "events_sources": [],
+        "events_catalog": index_sources([]),
+        "thoughts_of_the_day": [f"A thought worth sharing, number {i}." for i in range(n_thoughts)],
+    }
+
+
+def make_subscriber_config(i):
+    """Create one subscriber's parsed config_*.yml.
+
+    RETURNS
+    subscriber_config (dict): Synthetic subscriber settings
+    """
+
+    return {
+        "email": f"subscriber{i}@example.com",
+        "editorial": {"subject": "Finite News", "last_headlines_file": f"last_headlines_{i}.txt"},
+        "sources": {"news_categories": [f"Category {i % 5}", f"Category {(i + 1) % 5}"]},
+        "forecast": {"source": "nws", "office": "BOX", "grid_x": 1, "grid_y": 2},
+        "slogans": ["1/100th the News That's Fit to Print."],
+        "thoughts_of_the_day": [],
+    }
+
+
+def measure(make_issues):
+    """Measure the memory held by a list of issue configs.
+
+    RETURNS
+    current_mb (float): Memory still held after making the issues
+    peak_mb (float): Highest memory use while making them
+    """
+
+    tracemalloc.start()
+    issues = make_issues()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del issues
+    return current / 1e6, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=10000)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL) # Keep log formatting out of the measurement
+
+    publication_config = make_publication_config()
+    subscriber_configs = [make_subscriber_config(i) for i in range(args.subscribers)]
+
+    def layered():
+        return [
+            load_subscriber_config(f"config_{i}.yml", publication_config, subscriber_config)
+            for i, subscriber_config in enumerate(subscriber_configs)
+        ]
+
+    def deepcopied():
+        return [deepcopy(publication_config) for _ in subscriber_configs]
+
+    for label, make_issues in [("layered (load_subscriber_config)", layered), ("deepcopy per subscriber", deepcopied)]:
+        current_mb, peak_mb = measure(make_issues)
+        print(f"{label}: {current_mb:.1f} MB held, {peak_mb:.1f} MB peak, {1e3 * current_mb / args.subscribers:.2f} KB per subscriber")
+
+
+if __name__ == "__main__":
+    main()
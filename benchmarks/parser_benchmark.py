@@ -0,0 +1,147 @@
+"""Compare HTML parsers on news homepages: parse time, peak memory, and whether every recipe finds the same headlines.
+
+Uses saved copies of real homepages if given (save one with your browser, or curl URL > page.html),
+otherwise a synthetic homepage with thousands of stories. No network, S3 or secrets needed.
+
+Peak memory is measured in a fresh process per parser, from the operating system, because
+lxml and selectolax allocate outside of Python's memory tracking.
+
+USAGE
+    python benchmarks/parser_benchmark.py
+    python benchmarks/parser_benchmark.py --html saved_homepage1.html saved_homepage2.html --repeats 10
+"""
+
+import argparse
+import logging
+import resource
+from statistics import median
+import subprocess
+import sys
+from time import perf_counter
+
+from finite_news.parsing import PARSERS, parser_available
+from finite_news.reporting import parse_headlines
+
+# One recipe for each style in the sample publication_config.yml, written for make_homepage()'s page
+RECIPES = {
+    "tag": {"tag": "h2", "min_words": 3},
+    "tag + must_contain": {"tag": "a", "must_contain": "city"},
+    "tag_class": {"tag": "a", "tag_class": "story-link", "min_words": 4, "max_headlines": 5},
+    "select_query": {"select_query": "div.story > h3", "min_words": 3},
+    "tag_next + split_char": {"tag": "p", "tag_class": "briefs-heading", "tag_next": "ul", "split_char": "\n", "min_words": 4},
+}
+
+
+def make_homepage(n_stories=3000):
+    """Create a large, messy news homepage.
+
+    RETURNS
+    html (str): The page
+    """
+
+    topics = ["City council approves new budget", "Storm expected to reach coast", "Local team wins the championship", "Markets rally after report"]
+    stories = []
+    for i in range(n_stories):
+        topic = topics[i % len(topics)]
+        stories.append(
+            f'<div class="story" data-id="{i}"><h2>{topic} &amp; more, part {i}</h2>'
+            f'<a class="story-link" href="/story/{i}">{topic} in city {i} <span>Live</span></a>'
+            f'<h3>{topic}: what to know, {i}<em>analysis</em></h3>'
+            f'<!-- ad slot {i} --><script>window.ads = window.ads || []; ads.push({i});</script>'
+            f'<p class="byline">By A. Reporter &mdash; {i} minutes ago</p></div>\n'
+        )
+    briefs = "\n".join([f"<li>Brief number {i} about the news today</li>" for i in range(200)])
+    return (
+        '<!DOCTYPE html><html><head><title>News</title><style>.story{margin:0}</style></head><body>'
+        '<nav><a href="/">Home</a><a href="/city">City news</a></nav>'
+        + "".join(stories)
+        + f'<p class="briefs-heading">Briefs</p>\n<ul>\n{briefs}\n</ul></body></html>'
+    )
+
+
+def time_parser(markup, parser, recipe, repeats):
+    """Time one recipe with one parser.
+
+    RETURNS
+    seconds (float): Median time to parse the page and find the headlines
+    headlines (list of str): What the recipe found
+    """
+
+    source = {"name": "benchmark", "type": "headlines", "method": "scrape", "url": "file", **recipe, "html_parser": parser}
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        headlines = parse_headlines(markup, source)
+        times.append(perf_counter() - start)
+    return median(times), headlines
+
+
+def measure_peak_memory(html_path, parser):
+    """Parse a page with every recipe and report how much the process's peak memory grew. Run in a fresh process.
+
+    RETURNS
+    None. Prints the growth in MB
+    """
+
+    with open(html_path, encoding="utf-8") as f:
+        markup = f.read()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for recipe in RECIPES.values():
+        parse_headlines(markup, {"name": "benchmark", "type": "headlines", "method": "scrape", "url": "file", **recipe, "html_parser": parser})
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1e6 if sys.platform == "darwin" else 1e3 # ru_maxrss is in bytes on macOS, KB on Linux
+    print(f"{(peak - baseline) / scale:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--html", nargs="*", default=[], help="Saved homepages to parse. Default: a synthetic homepage")
+    parser.add_argument("--stories", type=int, default=3000, help="Size of the synthetic homepage")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--measure-peak-memory", nargs=2, metavar=("HTML_PATH", "PARSER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING) # Empty results from real pages aren't news here
+
+    if args.measure_peak_memory:
+        measure_peak_memory(*args.measure_peak_memory)
+        return
+
+    pages = args.html
+    if not pages:
+        pages = ["/tmp/finite_news_synthetic_homepage.html"]
+        with open(pages[0], "w", encoding="utf-8") as f:
+            f.write(make_homepage(args.stories))
+    parsers = [p for p in PARSERS if parser_available(p)]
+    print(f"Parsers installed: {', '.join(parsers)}")
+
+    # Before this process parses anything: on Linux, a child process starts with its parent's peak memory
+    peaks = {
+        (page, p): subprocess.run(
+            [sys.executable, __file__, "--measure-peak-memory", page, p], capture_output=True, text=True
+        ).stdout.strip()
+        for page in pages
+        for p in parsers
+    }
+
+    for page in pages:
+        with open(page, encoding="utf-8") as f:
+            markup = f.read()
+        print(f"\n{page} ({len(markup) / 1e6:.1f} MB)")
+        for recipe_name, recipe in RECIPES.items():
+            results = {}
+            for p in parsers:
+                try:
+                    results[p] = time_parser(markup, p, recipe, args.repeats)
+                except Exception as e:
+                    results[p] = (None, f"{type(e).__name__}: {e}")
+            reference = results["html.parser"][1]
+            summary = ", ".join([
+                f"{p} {seconds * 1e3:.0f} ms{'' if headlines == reference else ' (DIFFERENT headlines)'}" if seconds is not None else f"{p} failed"
+                for p, (seconds, headlines) in results.items()
+            ])
+            print(f"  {recipe_name}: {len(reference) if isinstance(reference, list) else reference} headlines. {summary}")
+        print("  Peak memory growth, all recipes: " + ", ".join([f"{p} {peaks[(page, p)]} MB" for p in parsers]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Time the whole pipeline offline, by replaying a recorded run's HTTP exchanges.
+
+Each repeat runs `finite-news run --dev-mode --disable-gpt --replay ARCHIVE` in a fresh process,
+like a scheduled job, and times every stage. No network is used, so results are repeatable.
+Secrets and the bucket are still needed: see the tip in the README about FN_SECRETS_FILE and a local BUCKET_PATH.
+
+USAGE
+    # Once, with the network: record today's run
+    finite-news run --dev-mode --disable-gpt --record fixtures/today.archive
+    # Then, as often as you like, offline
+    python benchmarks/pipeline_benchmark.py --archive fixtures/today.archive --repeats 5
+    python benchmarks/pipeline_benchmark.py --archive fixtures/today.archive --latency recorded --profile pipeline.prof
+"""
+
+import argparse
+import cProfile
+import os
+import pstats
+import re
+from statistics import median
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+STAGE_LINE = re.compile(r"^(plan|fetch|edit|render|deliver): ")
+
+
+def time_run(archive, latency, run_dir):
+    """Run the pipeline once in a fresh process, and time each stage by when it reports finishing.
+
+    RETURNS
+    timings (dict): Seconds for each stage, and "total". The plan stage includes starting Python and importing finite_news
+    """
+
+    command = [sys.executable, "-u", "-m", "finite_news", "run", "--dev-mode", "--disable-gpt", "--replay", archive, "--run-dir", run_dir]
+    if latency:
+        command += ["--replay-latency", latency]
+    start = perf_counter()
+    last = start
+    timings = {}
+    with subprocess.Popen(command, stdout=subprocess.PIPE, text=True) as process:
+        for line in process.stdout:
+            match = STAGE_LINE.match(line)
+            if match:
+                now = perf_counter()
+                timings[match.group(1)] = now - last
+                last = now
+    if process.returncode:
+        raise SystemExit(f"The run failed, exit code {process.returncode}")
+    timings["total"] = perf_counter() - start
+    return timings
+
+
+def profile_run(archive, latency, run_dir, profile_path):
+    """Run the pipeline once in this process under cProfile, and print the slowest functions.
+
+    RETURNS
+    None
+    """
+
+    from finite_news.cli import main as finite_news_main
+
+    argv = ["run", "--dev-mode", "--disable-gpt", "--replay", archive, "--run-dir", run_dir]
+    if latency:
+        argv += ["--replay-latency", latency]
+    cProfile.runctx("finite_news_main(argv)", globals(), {"finite_news_main": finite_news_main, "argv": argv}, profile_path)
+    pstats.Stats(profile_path).sort_stats("cumulative").print_stats(25)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", required=True, help="Recorded with finite-news run --record")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--latency", default=None, help="`recorded`, or seconds per response. Default: no simulated latency")
+    parser.add_argument("--profile", metavar="PATH", help="Also profile one run, and save the cProfile stats here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as run_dir:
+        runs = [time_run(args.archive, args.latency, os.path.join(run_dir, str(i))) for i in range(args.repeats)]
+        for stage in runs[0]:
+            seconds = [run[stage] for run in runs]
+            print(f"{stage}: median {median(seconds):.2f}s, min {min(seconds):.2f}s, max {max(seconds):.2f}s")
+        if args.profile:
+            profile_run(args.archive, args.latency, os.path.join(run_dir, "profile"), args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Measure the cold start of a Finite News run: importing the package and loading configs.
+
+Each repeat runs in a fresh Python process, so nothing is cached in sys.modules.
+
+USAGE
+    python benchmarks/startup_benchmark.py --repeats 5
+    python benchmarks/startup_benchmark.py --skip-config  # Import time only, no S3 or secrets needed
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = [
+    "boto3",
+    "env_canada",
+    "matplotlib",
+    "openai",
+    "pandas",
+    "s3fs",
+    "seaborn",
+    "sendgrid",
+    "yfinance",
+]
+
+CHILD_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import finite_news.publishing
+imported = time.perf_counter()
+result = {
+    "import_s": imported - start,
+    "heavy_modules_loaded": [m for m in HEAVY_MODULES if m in sys.modules],
+}
+if LOAD_CONFIG:
+    from finite_news.loading import load_subscriber_configs
+    subscriber_configs = load_subscriber_configs(dev_mode=True, disable_gpt=True)
+    result["config_load_s"] = time.perf_counter() - imported
+    result["subscribers"] = len(subscriber_configs)
+    from finite_news.loading import READ_SECONDS
+    result["slowest_reads"] = sorted(READ_SECONDS.items(), key=lambda item: -item[1])[:5]
+print(json.dumps(result))
+"""
+
+
+def run_once(load_config):
+    """Time one cold start in a new interpreter.
+
+    ARGUMENTS
+    load_config (bool): Also time load_subscriber_configs(), which needs secrets and the bucket
+
+    RETURNS
+    result (dict): Timings in seconds, and which heavy modules got imported
+    """
+
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\nLOAD_CONFIG = {load_config!r}\n" + CHILD_CODE
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--skip-config", action="store_true", help="Only time the import")
+    args = parser.parse_args()
+
+    results = [run_once(load_config=not args.skip_config) for _ in range(args.repeats)]
+    for metric in ["import_s", "config_load_s"]:
+        timings = [r[metric] for r in results if metric in r]
+        if timings:
+            print(f"{metric}: median {statistics.median(timings):.3f}, min {min(timings):.3f}, max {max(timings):.3f}")
+    print(f"Heavy modules loaded at import: {results[-1]['heavy_modules_loaded'] or 'none'}")
+    if "subscribers" in results[-1]:
+        print(f"Subscribers loaded: {results[-1]['subscribers']}")
+        for path, seconds in results[-1]["slowest_reads"]:
+            print(f"    {seconds:.3f}s  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""🗞️ Finite News: the mindful, AI-assisted newspaper.
+
+The code is organized in the order an issue is made:
+    loading -> reporting -> editorial -> design -> publishing
+
+NOTE
+Heavy libraries (pandas, matplotlib, seaborn, yfinance, openai, boto3, s3fs, env_canada, sendgrid)
+are imported inside the functions that use them, so a run only pays for the sections today's issues need.
+"""
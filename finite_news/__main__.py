@@ -0,0 +1,3 @@
+from finite_news.cli import main
+
+main()
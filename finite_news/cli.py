@@ -0,0 +1,273 @@
+"""⌨️ Command line: Run Finite News without a notebook, in stages
+
+Each stage saves its output in the run directory, so a later stage can be rerun on its own.
+For example, after one `finite-news fetch`, iterate on the template or editorial rules with
+`finite-news edit` and `finite-news render` without scraping every source again.
+
+    plan -> fetch -> edit -> render -> deliver
+
+To keep slow sources from delaying the email, `finite-news prefetch` can fetch everything earlier,
+into the bucket's content store. Then `--from-store` builds the issues from it, fetching only what's missing or stale.
+
+USAGE
+    finite-news run --dev-mode --disable-gpt
+    finite-news render --dev-mode
+    finite-news prefetch
+    finite-news run --from-store
+"""
+
+import argparse
+from datetime import date
+import logging
+import os
+import pickle
+import traceback
+
+from finite_news.content_store import log_content_store_stats, start_content_store
+from finite_news.editorial import log_headlines
+from finite_news.fetching import log_http_stats, start_fetch_clock
+from finite_news.health import reset_source_health, save_source_health, source_health_rows
+from finite_news.loading import init_logging, load_subscriber_configs, reset_selection_warnings
+from finite_news.planning import log_fetch_plan, plan_fetches
+from finite_news.publishing import deliver_issue, edit_issue, prefetch_finite_news, render_issue, research_issue
+from finite_news.replay import start_recording, start_replay, stop_http_archive
+from finite_news.reporting import log_research_cache_stats, reset_research_cache
+from finite_news.storage import clear_storage_caches
+
+STAGES = ["plan", "fetch", "edit", "render", "deliver"]
+
+
+def stage_path(run_dir, stage):
+    """Helper function to locate a stage's saved output.
+
+    ARGUMENTS
+    run_dir (str): The directory for this run's stage outputs
+    stage (str): One of STAGES
+
+    RETURNS
+    path (str): Where the stage's output is saved
+    """
+
+    return os.path.join(run_dir, f"{stage}.pickle")
+
+
+def save_stage(run_dir, stage, output, log_stream):
+    """Save a stage's output, along with the logs so far, for the next stage.
+
+    ARGUMENTS
+    run_dir (str): The directory for this run's stage outputs
+    stage (str): One of STAGES
+    output (dict): What the stage produced
+    log_stream (StringIO object): The logs from this and previous stages
+
+    RETURNS
+    None
+    """
+
+    os.makedirs(run_dir, exist_ok=True)
+    with open(stage_path(run_dir, stage), "wb") as f:
+        pickle.dump({**output, "log": log_stream.getvalue()}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"{stage}: saved {stage_path(run_dir, stage)}")
+
+
+def load_stage(run_dir, stage, log_stream):
+    """Load a stage's saved output, and carry its logs forward so they reach the admin issue.
+
+    ARGUMENTS
+    run_dir (str): The directory for this run's stage outputs
+    stage (str): One of STAGES
+    log_stream (StringIO object): The logs for this process, which the saved logs are added to
+
+    RETURNS
+    output (dict): What the stage produced
+    """
+
+    try:
+        with open(stage_path(run_dir, stage), "rb") as f:
+            output = pickle.load(f)
+    except FileNotFoundError:
+        raise SystemExit(f"No output from the {stage} stage in {run_dir}. Run `finite-news {stage}` first.")
+    log_stream.write(output.pop("log"))
+    return output
+
+
+def for_each_issue(issue_configs, inputs, stage_function, dev_mode):
+    """Apply one stage to every issue, so one issue's failure doesn't stop the others.
+
+    ARGUMENTS
+    issue_configs (list of dict): The settings for each issue
+    inputs (list): The previous stage's output for each issue. None if that issue already failed
+    stage_function (function): Takes an issue_config and its input, and returns the stage's output for the issue
+    dev_mode (bool): If True, raise exceptions instead of logging them
+
+    RETURNS
+    outputs (list): The stage's output for each issue. None for issues that failed
+    """
+
+    outputs = []
+    for issue_config, stage_input in zip(issue_configs, inputs):
+        if stage_input is None:
+            outputs.append(None)
+            continue
+        try:
+            outputs.append(stage_function(issue_config, stage_input))
+        except Exception as e:
+            if dev_mode: # During dev or debugging, raise exception and show traceback.
+                raise e
+            logging.critical(f"{issue_config['subscriber_email']}: Issue failed due to unhandled exception. {traceback.format_exc()}")
+            outputs.append(None)
+    return outputs
+
+
+def apply_run_options(issue_configs, args):
+    """Apply this command's --dev-mode and --disable-gpt to issue configs loaded by an earlier stage.
+
+    NOTE
+    The plan stage bakes --dev-mode into the issue configs it saves. Without this, `finite-news deliver --dev-mode`
+    after a plan made without --dev-mode would still send emails and overwrite the headline logs.
+    The plan stage always keeps the GPT settings, so a later stage can turn GPT on or off, whatever the plan was made with.
+
+    ARGUMENTS
+    issue_configs (list of dict): The settings for each issue, from the plan stage
+    args (argparse.Namespace): The command line options
+
+    RETURNS
+    issue_configs (list of dict): Copies of the settings, following this command's options
+    """
+
+    return [
+        {
+            **issue_config,
+            "email_delivery": not args.dev_mode,
+            "editorial": {**issue_config["editorial"], "log_today_headlines": not args.dev_mode},
+            "gpt": None if args.disable_gpt else issue_config["gpt"],
+        }
+        for issue_config in issue_configs
+    ]
+
+
+def run_stage(stage, args, log_stream, previous=None):
+    """Run one stage, reading the previous stage's output and saving this one's.
+
+    ARGUMENTS
+    stage (str): One of STAGES
+    args (argparse.Namespace): The command line options
+    log_stream (StringIO object): In-memory file-like object that collects results from logging during the Finite News run
+    previous (dict): Optional, the previous stage's output, if it ran in this process. If None, load it from the run directory.
+
+    RETURNS
+    output (dict): What this stage produced
+    """
+
+    if stage == "plan":
+        issue_configs = load_subscriber_configs(args.dev_mode, disable_gpt=False) # Each later stage applies its own --disable-gpt
+        plan = plan_fetches(issue_configs)
+        log_fetch_plan(plan)
+        output = {"issue_configs": issue_configs, "plan": plan}
+        save_stage(args.run_dir, stage, output, log_stream)
+        return output
+
+    if previous is None:
+        previous = load_stage(args.run_dir, STAGES[STAGES.index(stage) - 1], log_stream)
+    issue_configs = apply_run_options(previous["issue_configs"], args)
+    previous = {**previous, "issue_configs": issue_configs}
+
+    if stage == "fetch":
+        research = for_each_issue(
+            issue_configs,
+            issue_configs,
+            lambda issue_config, _: research_issue(issue_config, args.dev_mode),
+            args.dev_mode
+        )
+        log_research_cache_stats()
+        log_content_store_stats()
+        log_http_stats()
+        save_source_health(args.dev_mode)
+        output = {**previous, "research": research, "source_health": source_health_rows()}
+
+    elif stage == "edit":
+        content = for_each_issue(
+            issue_configs,
+            previous["research"],
+            lambda issue_config, research: edit_issue(issue_config, research, log_today_headlines=False), # Logged at delivery, so this stage can be rerun
+            args.dev_mode
+        )
+        output = {**previous, "content": content}
+
+    elif stage == "render":
+        issues = for_each_issue(
+            issue_configs,
+            previous["content"],
+            lambda issue_config, content: render_issue(issue_config, content, log_stream, previous.get("source_health")),
+            args.dev_mode
+        )
+        output = {**previous, "issues": issues}
+
+    elif stage == "deliver":
+        def deliver(issue_config, content_and_issue):
+            content, (html, images) = content_and_issue
+            if issue_config["admin"]: # Render again, so the admin issue's logs include problems delivering earlier issues
+                html, images = render_issue(issue_config, content, log_stream, previous.get("source_health"))
+            deliver_issue(issue_config, html, images)
+            if issue_config["editorial"]["log_today_headlines"]==True:
+                log_headlines(content["original_headlines"], issue_config["editorial"]["last_headlines_path"])
+            return True
+
+        delivered = for_each_issue(
+            issue_configs,
+            [(content, issue) if issue else None for content, issue in zip(previous["content"], previous["issues"])],
+            deliver,
+            args.dev_mode
+        )
+        print(f"deliver: {sum(1 for d in delivered if d)} of {len(issue_configs)} issues delivered")
+        return {**previous, "delivered": delivered} # Not saved: delivering is the last step, and rerunning it resends
+
+    save_stage(args.run_dir, stage, output, log_stream)
+    return output
+
+
+def main(argv=None):
+    """Entry point for the finite-news command.
+
+    ARGUMENTS
+    argv (list of str): Optional, the command line arguments. Defaults to sys.argv
+
+    RETURNS
+    None
+    """
+
+    parser = argparse.ArgumentParser(prog="finite-news", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("stage", choices=STAGES + ["run", "prefetch"], help="The stage to run, `run` for all of them in order, or `prefetch` to fill the content store")
+    parser.add_argument("--dev-mode", action="store_true", help="Don't send emails or modify headline logs. Write issues to a local file instead")
+    parser.add_argument("--disable-gpt", action="store_true", help="Don't call the GPT API")
+    parser.add_argument("--logging-level", choices=["warning", "info"], default="warning")
+    parser.add_argument("--run-dir", default=os.path.join("runs", date.today().isoformat()), help="Where to save and find each stage's output. Default: runs/TODAY")
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument("--record", metavar="ARCHIVE", help="Save every HTTP exchange to this file, to replay later")
+    archive.add_argument("--replay", metavar="ARCHIVE", help="Serve HTTP requests from this recorded file instead of the network")
+    parser.add_argument("--from-store", action="store_true", help="Use the content saved by `finite-news prefetch`. Fetch only what's missing or stale")
+    parser.add_argument("--replay-latency", default=None, help="With --replay: `recorded` to wait as long as each response originally took, or a number of seconds per response. Default: no wait")
+    args = parser.parse_args(argv)
+
+    log_stream = init_logging(args.logging_level)
+    start_fetch_clock()
+    clear_storage_caches()
+    reset_research_cache()
+    reset_source_health()
+    reset_selection_warnings()
+    start_content_store("build" if args.from_store else None) # prefetch_finite_news() sets its own
+    if args.record:
+        start_recording(args.record)
+    if args.replay:
+        start_replay(args.replay, args.replay_latency if args.replay_latency in (None, "recorded") else float(args.replay_latency))
+    try:
+        if args.stage == "prefetch":
+            prefetch_finite_news(args.dev_mode, args.disable_gpt, args.logging_level) # The same as in a notebook. Prints its own summary
+        else:
+            output = None
+            for stage in STAGES if args.stage == "run" else [args.stage]:
+                output = run_stage(stage, args, log_stream, output)
+    finally:
+        stop_http_archive() # Write what was recorded, even if the run failed
+    if args.stage != "prefetch":
+        print("👍")
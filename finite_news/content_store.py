@@ -0,0 +1,147 @@
+"""🗄️ Content store: Fetch content ahead of time, so slow sources never delay the email
+
+A prefetch run (finite-news prefetch) fetches everything today's issues need: news and events sources,
+forecasts, NBA games and stock plots. Each piece is saved with the time it was fetched, in the bucket's content_store/ folder.
+
+Later, an issue-build run (finite-news run --from-store) uses that content instead of fetching it again.
+Only content that's missing, or older than content_max_age_minutes, is fetched again, and saved for next time.
+Without either, every run fetches everything itself, as usual.
+"""
+
+from datetime import datetime
+import logging
+import pickle
+from threading import Lock
+
+from finite_news.planning import source_key
+from finite_news.storage import get_storage
+
+CONTENT_STORE_DIR = "content_store/"
+CONTENT_MAX_AGE_MINUTES = 60 # Default for the publication's `content_max_age_minutes` setting
+CONTENT_STORE = {
+    "mode": None, # None, "prefetch" or "build"
+    "path": None,
+    "max_age_minutes": CONTENT_MAX_AGE_MINUTES,
+}
+CONTENT_STORE_STATS = {"stored": 0, "missing": 0, "stale": 0, "oldest_minutes": 0, "logged": None}
+CONTENT_STORE_LOCK = Lock()
+
+
+def start_content_store(mode):
+    """Choose how this run uses the content store, and forget the previous run's stats. Call when every run begins.
+
+    ARGUMENTS
+    mode (str or None): "prefetch" to fetch everything and save it, "build" to use what was saved and fetch only what's missing or stale,
+        or None to fetch everything without the store
+
+    RETURNS
+    None
+    """
+
+    with CONTENT_STORE_LOCK:
+        CONTENT_STORE["mode"] = mode
+        CONTENT_STORE_STATS.update({"stored": 0, "missing": 0, "stale": 0, "oldest_minutes": 0, "logged": None})
+
+
+def configure_content_store(bucket_path, fetching_config=None):
+    """Apply the publication's settings to the content store.
+
+    ARGUMENTS
+    bucket_path (str): Where the content_store/ folder is kept
+    fetching_config (dict): Optional, the publication's `fetching` settings
+
+    RETURNS
+    None
+    """
+
+    CONTENT_STORE["path"] = bucket_path + CONTENT_STORE_DIR
+    CONTENT_STORE["max_age_minutes"] = (fetching_config or {}).get("content_max_age_minutes", CONTENT_MAX_AGE_MINUTES)
+
+
+def content_entry_path(kind, key_data):
+    """Helper function to locate a piece of content in the store.
+
+    ARGUMENTS
+    kind (str): What the content is, like "source" or "forecast"
+    key_data (dict, list or str): The settings the content was fetched with, like a source's config
+
+    RETURNS
+    path (str): Where the content is saved
+    """
+
+    return f"{CONTENT_STORE['path']}{kind}_{source_key({'key': key_data})}.pickle"
+
+
+def read_content_entry(entry_path):
+    """Load a piece of content from the store.
+
+    ARGUMENTS
+    entry_path (str): From content_entry_path()
+
+    RETURNS
+    entry (dict or None): With keys for fetched_at (float, a timestamp) and content. None if not saved
+    """
+
+    try:
+        return pickle.loads(get_storage(entry_path).read(entry_path))
+    except Exception: # Not prefetched, or saved by an incompatible version
+        return None
+
+
+def use_content_store(kind, key_data, fetch):
+    """Get a piece of content from the store if it's fresh, otherwise fetch it, and save it in the store.
+
+    NOTE
+    When the run isn't prefetching or building from the store, just fetches.
+    Content that fails to fetch (an exception, or None) isn't saved, so the next run tries again.
+    So fetch() should return something other than None, like "", when there's simply nothing today.
+
+    ARGUMENTS
+    kind (str): What the content is, like "source" or "forecast"
+    key_data (dict, list or str): The settings the content is fetched with, like a source's config
+    fetch (function): Fetches the content, with no arguments
+
+    RETURNS
+    content (any): What fetch() returns, now or when it was saved
+    """
+
+    if CONTENT_STORE["mode"] is None or CONTENT_STORE["path"] is None:
+        return fetch()
+    entry_path = content_entry_path(kind, key_data)
+    if CONTENT_STORE["mode"] == "build":
+        entry = read_content_entry(entry_path)
+        age_minutes = (datetime.now().timestamp() - entry["fetched_at"]) / 60 if entry else None
+        with CONTENT_STORE_LOCK:
+            if entry is None:
+                CONTENT_STORE_STATS["missing"] += 1
+            elif age_minutes > CONTENT_STORE["max_age_minutes"]:
+                CONTENT_STORE_STATS["stale"] += 1
+            else:
+                CONTENT_STORE_STATS["stored"] += 1
+                CONTENT_STORE_STATS["oldest_minutes"] = max(CONTENT_STORE_STATS["oldest_minutes"], age_minutes)
+                return entry["content"]
+
+    content = fetch()
+    if content is not None:
+        entry = {"fetched_at": datetime.now().timestamp(), "kind": kind, "content": content}
+        try:
+            get_storage(entry_path).write(entry_path, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            logging.warning(f"use_content_store: Couldn't save {kind}. {str(type(e))}, {str(e)}")
+    return content
+
+
+def log_content_store_stats():
+    """Report how much of an issue-build run's content came from the prefetch. For the admin issue.
+
+    RETURNS
+    None
+    """
+
+    stats = (CONTENT_STORE_STATS["stored"], CONTENT_STORE_STATS["missing"], CONTENT_STORE_STATS["stale"])
+    if CONTENT_STORE["mode"] == "build" and sum(stats) and stats != CONTENT_STORE_STATS["logged"]: # Don't repeat the same numbers
+        CONTENT_STORE_STATS["logged"] = stats
+        logging.warning(
+            f"Content store: {stats[0]} prefetched (oldest {CONTENT_STORE_STATS['oldest_minutes']:.0f} minutes), "
+            f"fetched again: {stats[1]} missing, {stats[2]} older than {CONTENT_STORE['max_age_minutes']} minutes"
+        )
@@ -0,0 +1,133 @@
+"""🎨 Design: Lay out the email"""
+
+import logging
+from random import choice
+
+from finite_news.reporting import get_attributions, get_car_talk_credit, get_weather_emoji
+
+
+def format_issue(
+    issue_config,
+    headlines,
+    forecast,
+    events_html=None,
+    stock_plots=[],
+    screenshots=None,
+    log_stream=None,
+    source_health=None
+):
+    """Organize the final content as HTML for one subscriber's issue.
+    
+    ARGUMENTS
+    issue_config (dict): The settings for the issue
+    headlines (list of str): The final news headlines to be reported in this issue
+    forecast (dict): Forecast content, if any
+    events_html (str): Optional, HTML-formatted section with upcoming events
+    stock_plots (list of base64): Optional, list of pngs as base64
+    screenshots (list): Optional, other images to attach to the image
+    log_stream (String IO): Optional, the log report from running Finite News
+    source_health (list of dict): Optional, each source's health from source_health_rows(), for the admin issue
+    
+    RETURNS
+    html (str): The Finite News template populated with the final content
+    """
+    
+    html = issue_config["layout"]["template_html"]
+    html = html.replace("[[LOGO_URL]]", issue_config["layout"]["logo_url"])
+    slogans = issue_config.get("slogans", [''])
+    html = html.replace("[[SLOGAN]]", choice(slogans))
+
+    headlines_html = [f"<li>{headline}</li>" for headline in headlines]
+    headlines_html = "".join(headlines_html)
+    if headlines_html:
+        headlines_block = f"""<h3>📰 News</h3><ul>{headlines_html}</ul>"""
+    else:
+        headlines_block = ""
+    html = html.replace("[[HEADLINES_BLOCK]]", headlines_block)
+
+    if forecast:
+        weather_emoji = get_weather_emoji(forecast["short"])
+        weather_icon = f"<img src={forecast['icon_url']} alt='Forecast icon'><br>" if "icon_url" in forecast else ""
+        weather_block = f"<h3>{weather_emoji} {forecast['short']}</h3>{weather_icon}<p>{forecast['detailed']}</p>"
+    else:
+        weather_block = ""
+    html = html.replace("[[WEATHER_BLOCK]]", weather_block)
+
+    if events_html:
+        events_block = f"<h3>🪩 Upcoming events</h3>{events_html}"
+    else:
+        events_block = ""
+    html = html.replace("[[EVENTS_BLOCK]]", events_block)
+
+    if len(stock_plots)>0:
+        stocks_block = "<h3>💰 Financial update</h3>"
+        stocks_block += "".join([f"<img src='cid:image_{i}', alt='image_{i}'><br>" for i in range(0,len(stock_plots))])
+    else:
+        stocks_block = ""
+    html = html.replace("[[STOCKS_BLOCK]]", stocks_block)
+
+    if screenshots:
+        # Increment cids if stock images already attached
+        screenshots_block = "".join([f"<img src='cid:image_{i + len(stock_plots)}', alt='image_{i + len(stock_plots)}'><br>" for i in range(0,len(screenshots))])
+    else:
+        screenshots_block = ""
+    html = html.replace("[[IMAGES_BLOCK]]", screenshots_block)
+    
+    if issue_config["editorial"]["add_car_talk_credit"]:
+        car_talk_block = "<p>" + get_car_talk_credit(issue_config["bucket_path"]) + "</p><br>"
+    else:
+        car_talk_block = ""
+    html = html.replace("[[CAR_TALK_CREDIT]]",car_talk_block)
+
+    try:
+        if issue_config["thoughts_of_the_day"]:
+            html = html.replace("[[THOUGHT_OF_THE_DAY]]", f"""<h3>💭 Thought for the day</h3><p>{choice(issue_config['thoughts_of_the_day'])}</p>""")
+        else:
+            html = html.replace("[[THOUGHT_OF_THE_DAY]]","")
+    except TypeError as e:
+        logging.warning(f"TypeError on replace closing thoughts. Yaml malfored?: {e}. thoughts_of_the_day type: {type(issue_config['thoughts_of_the_day'])}. Expected string. {issue_config['thoughts_of_the_day']}")
+        html = html.replace("[[THOUGHT_OF_THE_DAY]]","")
+
+    attributions=get_attributions(
+        sources=issue_config["news_sources"] + issue_config["events_sources"],
+        nba_used=issue_config["nba_teams"],
+        nws_used=forecast!=None,
+        stocks_used=len(stock_plots)>0
+    )
+    html = html.replace("[[ATTRIBUTIONS]]", attributions)
+
+    if issue_config["admin"]: # Append exceptions from logging to email
+        log_items = [l for l in log_stream.getvalue().split("\n") if len(l)>0]
+        if log_items:
+            log_items_html = "".join([f"<li><i>{log_item}</i></li>" for log_item in log_items])
+            logging_block = f"<h3>👾 Logs</h3><ul>{log_items_html}</ul>"
+        else:
+            logging_block = ""
+        logging_block += format_source_health(source_health)
+    else:
+        logging_block = ""
+    html = html.replace("[[LOGGING_BLOCK]]", logging_block)
+
+    return html
+
+
+def format_source_health(source_health):
+    """Lay out a table of each source's health, for the admin issue.
+    
+    ARGUMENTS
+    source_health (list of dict): Each source's health, from source_health_rows()
+    
+    RETURNS
+    html (str): The table, or "" if there's nothing to report
+    """
+    
+    if not source_health:
+        return ""
+    seconds = lambda value: "" if value is None else f"{value:.2f}s"
+    rows_html = "".join([
+        f"<tr><td>{row['name']}</td><td>{row['state']}</td><td>{row['runs']}</td><td>{seconds(row['p50_seconds'])}</td>"
+        f"<td>{seconds(row['p90_seconds'])}</td><td>{row['error_rate']:.0%}</td><td>{row['zero_streak']}</td></tr>"
+        for row in source_health
+    ])
+    header = "<tr><th>Source</th><th>State</th><th>Runs</th><th>p50</th><th>p90</th><th>Errors</th><th>Empty streak</th></tr>"
+    return f"<h3>🩺 Source health</h3><table>{header}{rows_html}</table>"
@@ -0,0 +1,308 @@
+"""✂️ Editorial: Refine the news and other reporting results"""
+
+import logging
+from time import sleep
+
+from finite_news.loading import get_fn_secret
+from finite_news.storage import get_storage
+
+
+def count_words(text):
+    """Helper function to count how many words are in a string.
+    
+    TODO: Use a tokenizer/built-in
+    
+    ARGUMENTS
+    text (str)
+    
+    RETURNS
+    count (int)
+    """
+    
+    return len(text
+               .strip()
+               .split(" "))
+
+
+def log_headlines(headlines, last_headlines_path):
+    """Export a list of today's headlines, so we can use them to de-dup tomorrow's news.
+    
+    NOTE: Must call this before edit_research so we carry forward repeats that were dropped too
+
+    ARGUMENTS
+    headlines (list of str): Headlines from all sources
+    last_headlines_path (str): The full path on S3 for this subscriber's cache of yesterday's headlines
+
+    RETURNS
+    None
+    """
+    
+    get_storage(last_headlines_path).write(
+        last_headlines_path,
+        "".join([f"{headline}\n" for headline in headlines]).encode("utf-8")
+    )
+    logging.info(f"Wrote last headlines to {last_headlines_path}")
+            
+
+def apply_one_headline_keyword_filter(headlines, keyword):
+    """Cap headlines mentioning this keyword.
+
+    ARGUMENTS
+    headlines (list of str): Headlines from all sources
+
+    RETURNS
+    new_headlines (list of str): Headlines except those that contain this keyword
+    """
+    
+    new_headlines = []
+    kw_counter = 0
+    keyword = keyword.lower()
+    for headline in headlines:
+        has_kw = keyword in headline.lower() # Could add spaCy tokenizer, split on spaces, punctuation. But the benefit would be teeny. Empirically this has been working perfectly for months.
+        kw_counter += has_kw
+        if not has_kw or kw_counter<=1:
+            new_headlines.append(headline)
+    return new_headlines
+
+
+def limit_one_headline_keywords(headlines, keywords):
+    """Apply user's policy to have a maximum of one article with each keyword in a singles issue.
+    
+    ARGUMENTS
+    headlines (list of str): Headlines from all sources
+    keywords (list of str): Keywords that should appear in the issue at most one time
+    
+    RETURNS
+    new_headlines (list of str): Headlines except those cut for containing keywords already reported on once
+
+    """
+    for keyword in keywords:
+        headlines = apply_one_headline_keyword_filter(headlines, keyword)
+    return headlines
+
+
+def remove_repeat_headlines(headlines, last_headlines_path):
+    """Don't present a headline if it was already delivered yesterday.
+    
+    ARGUMENTS
+    headlines (list of str): Headlines from all sources
+    last_headlines_path (str): The full path on S3 for this subscriber's cache of yesterday's headlines
+    
+    RETURNS
+    fresh_headlines (list of str): Headlines except those we already delivered yesterday
+    """
+    
+    last_headlines = [line.strip() for line in get_storage(last_headlines_path).read(last_headlines_path).decode("utf-8").splitlines()]
+    logging.info(f"Read last headlines from {last_headlines_path}")
+    fresh_headlines = [headline for headline in headlines if headline not in last_headlines]
+    logging.info(f"Removed repeat headlines: {[headline for headline in headlines if headline in last_headlines]}") 
+    return fresh_headlines
+
+
+def collect_all_headlines(all_source_headlines):
+    """Extract headlines from all sources we researched.
+    
+    ARGUMENTS
+    all_source_headlines (list of list): A list of headlines retrieved from every source
+
+    RETURNS
+    headlines (list of str): Flat list of headlines retrieved from all sources
+    
+    """
+    headlines_nested = [headlines for headlines in all_source_headlines if headlines]
+    return [item for sublist in headlines_nested for item in sublist]
+
+
+def lower_list(l):
+    """Helper function to lowercase the items in a list of strings.
+    
+    ARGUMENTS
+    l (list of str): A list of headlines
+    
+    RETURNS
+    l_lower (list of str): A list of lowercase headlines
+    """
+    
+    if not l:
+        return None
+    return [item.lower() for item in l]
+
+
+def breaks_rule(headline, cant_begin_with, cant_contain, cant_end_with):
+    """Evaluate whether a headline breaks any of the passed sets of editorial rules
+    
+    ARGUMENTS
+    headline (str): The text to evaluate
+    cant_begin_with (list of str): Text that a headline cannot start with
+    cant_contain (list of str): Text that cannot exist anywhere in a headline
+    cant_end_with (list of str): Text that a headline cannot end with
+    
+    RETURNS
+    True if this headline violates any rule
+    """
+    
+    for phrase in cant_begin_with:
+        if headline.startswith(phrase):
+            return True
+    for phrase in cant_contain:
+        if phrase in headline:
+            return True
+    for phrase in cant_end_with:
+        if headline.endswith(phrase):
+            return True
+
+        
+def apply_substance_rules(headlines, substance_rules):
+    """Remove headlines that fail our logic for ensuring a headline is substanative.
+
+    ARGUMENTS
+    headlines (list of str): The headlines retrieved from all sources
+    substance_rules (dict): The editorial rules, which consist of lists of phrases
+    
+    RETURNS
+    kept_headlines (list of str): The headlines that pass all substrance rules.
+
+    """
+    cant_begin_with = lower_list(substance_rules.get("cant_begin_with", []))
+    cant_contain = lower_list(substance_rules.get("cant_contain", []))
+    cant_end_with = lower_list(substance_rules.get("cant_end_with", []))
+    removed_headlines = [headline for headline in headlines if breaks_rule(headline.lower(), cant_begin_with, cant_contain, cant_end_with)]
+    logging.info(f"Substance rules removed: {removed_headlines}")
+    kept_headlines = [headline for headline in headlines if headline not in removed_headlines]
+    return kept_headlines 
+
+
+def openai_chat_completion(gpt_config, message):
+    """Make an API call to the OpenAI GPT chat endpoint.
+    
+    ARGUMENTS
+    gpt_config (dict): Parameters for using the API
+    message (str): The full prompt to send GPT, including generic lead-in, headlines, and instruction (customized to each subscriber)
+    
+    RETURNS
+    headlines_to_remove_str (string): GPT's response of which headlines to remove, in str format
+    """
+    
+    import openai
+
+    response = openai.ChatCompletion.create(
+        model=gpt_config["substance_filter_model"],
+        messages=[
+            {"role":"system", "content": gpt_config["system_role"]},
+            {"role": "user", "content": message}
+        ]
+    )
+    return response["choices"][0]["message"]["content"]
+
+
+def apply_substance_filter_model(headlines, gpt_config, nba_teams=None):
+    """Use LLM to remove headlines that don't say much useful.
+    
+    NOTE
+    Requires an OPENAI_API_KEY in AWS Secrets Manager.
+    
+    ARGUMENTS
+    headlines (list): List of string headlines, original candidates for the issue
+    gpt_config (dict): Configuration for editing headlines using GPT LLM through the Open AI API.
+    nba_teams (list): The names of NBA teams we're tracking, to ensure GPT doesn't cut those headlines. They're important!
+    
+    RETURNS
+    kept_headlines (list): The headlines that GPT did not remove
+    """
+    
+    import openai # Only load the OpenAI library when an issue is edited by GPT
+
+    GPT_RETRY_SLEEP = 30
+    openai.api_key = get_fn_secret("OPENAI_API_KEY")
+    headlines_for_gpt = [f"* {headline}" for headline in headlines]
+    lead_in = "Here are today's news headlines:"
+    message = lead_in + "\n" + "\n".join(headlines_for_gpt) + "\n" + gpt_config["instruction"]
+    try:
+        try:
+            headlines_to_remove_str = openai_chat_completion(gpt_config, message)
+        except openai.error.APIConnectionError:
+            logging.info(f"OpenAI API error. Waiting {GPT_RETRY_SLEEP} secs, retrying...")
+            sleep(GPT_RETRY_SLEEP)
+            headlines_to_remove_str = openai_chat_completion(gpt_config, message)
+            logging.info(f"OpenAI API error. Waiting {GPT_RETRY_SLEEP} secs, retrying...")
+            logging.info("Retry worked! 😅")
+    except Exception as e:
+        logging.warning(f"OpenAI failed: {str(type(e))}, {str(e)}")
+        headlines_to_remove_str = None
+
+    headlines_to_remove = [h for h in headlines_to_remove_str.split("\n")]
+    removed_headlines = [headline for headline in headlines if headline in headlines_to_remove] # Extra QC step to make sure GPT didn't return a hallucination that wasn't in headlines we sent it.
+    logging.info(f"GPT removed: {removed_headlines}") 
+    return [headline for headline in headlines if headline not in removed_headlines]
+
+
+def clean_headline(headline):
+    """Standardize text formatting of a headline string
+    
+    NOTE
+    - Assumes we have already stripped white space from beginning and end of headline
+    - We apply these steps before applying substance rules, which rely on standard format,
+    before checking if these headlines were in yesterday's issue, and before logging today's headlines.
+
+    ARGUMENTS
+    headline (str): A single headline.
+    
+    RETURNS
+    headline (str): A single, clean headline.
+    """ 
+    
+    headline = headline.replace("’","'").replace("‘","'") # Standardize apostrophe characters
+    # Ensure all have trailing period
+    return headline + "." if not headline.endswith(".") and not (headline.endswith("?") or headline.endswith("1")) else headline 
+
+
+def edit_headlines(raw_headlines, editorial_policies, gpt_config=None):
+    """Apply all editorial policies to the headlines.
+    
+    ARGUMENTS
+    raw_headlines (list): List of string headlines, original candidates for the issue
+    editorial_policies (dict): Rules and preferences from this user/issue's config
+    gpt_config (dict): Configuration for editing headlines using GPT LLM through the Open AI API.
+    
+    RETURNS
+    edited_headlines (list): Headlines after filtering ones that violate editorial policies
+    """
+    
+    edited_headlines = remove_repeat_headlines(raw_headlines, editorial_policies["last_headlines_path"])
+    edited_headlines = [clean_headline(headline) for headline in edited_headlines] # Do after removing repeats, since we log the raw uncleaned
+    if "one_headline_keywords" in editorial_policies:
+        edited_headlines = limit_one_headline_keywords(edited_headlines, editorial_policies["one_headline_keywords"])
+    if edited_headlines:
+        edited_headlines = apply_substance_rules(edited_headlines, editorial_policies["substance_rules"])
+        if gpt_config:
+            edited_headlines = apply_substance_filter_model(edited_headlines, gpt_config)
+        else:
+            logging.info("Did not apply GPT substance model. no gpt_config")
+            pass
+    logging.info("Edited headlines: " + str(edited_headlines))
+    return edited_headlines
+
+
+def edit_nba_headlines(nba_headlines, nba_teams):
+    """Clean and harmonize NBA game headlines. The key outcome: when two of our tracked teams are playing each other, only report once, not twice.
+    
+    ARGUMENTS
+    nba_headlines (list of str): News related to today's NBA game(s) for tracked teams
+    nba_teams (list of str): The names of the tracked teams that may be in the headlines.
+    
+    RETURNS
+    cleaned_headlines (list of str): Harmonized news about today's NBA game(s)
+    """
+    
+    # Avoid [None] lists
+    nba_headlines = [h for h in nba_headlines if h] 
+
+    # If two tracked teams are playing each other, only give one headline
+    cleaned_headlines = []
+    teams_already_reported = set()
+    for headline in nba_headlines:
+        teams_found = {t for t in nba_teams if t in headline}
+        if not teams_already_reported.intersection(teams_found):
+            cleaned_headlines.append(headline)
+        teams_already_reported.update(teams_found) 
+    return cleaned_headlines
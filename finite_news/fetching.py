@@ -0,0 +1,575 @@
+"""📡 Fetching: One HTTP client for every website and API that Finite News reads
+
+Scrapers, API calls, the NBA schedule, NWS forecasts and event calendars all go through http_get().
+They share one pooled session, so repeat visits to a host reuse an open connection instead of
+paying for a new TCP and TLS handshake each time.
+
+Responses with an ETag or Last-Modified header are saved in the bucket's http_cache/ folder.
+The next run asks the server whether they changed, and skips the download if they didn't.
+
+Scraped pages are streamed and capped at max_bytes, so one huge page can't exhaust memory.
+
+Each host has a rate limit (a token bucket), shared by every thread, so fetching in parallel doesn't get us throttled.
+"""
+
+import codecs
+import hashlib
+import logging
+import pickle
+import re
+from threading import Lock
+from time import monotonic, sleep
+from urllib.parse import urlparse
+
+from finite_news.replay import HTTP_ARCHIVE, http_archive_active
+from finite_news.storage import get_storage
+
+HTTP_DEFAULTS = { # Override any of these in the `fetching` section of publication_config.yml
+    "connect_timeout_seconds": 5,
+    "read_timeout_seconds": 30,
+    "retries": 2, # Retries on connection errors and on 429 and 5xx responses
+    "retry_backoff_seconds": 0.5, # Wait 0.5s, 1s, 2s... between retries
+    "pool_hosts": 32, # How many hosts to keep connections open to
+    "pool_connections_per_host": 8, # How many open connections to keep per host
+    "max_bytes": 10000000, # Stop downloading a scraped page after this many bytes. A source can set its own `max_bytes`
+    "host_rate_per_second": 5, # Requests per second to any one host, on average. 0 = no limit
+    "host_burst": 10, # Requests to one host that can go at once, before the rate applies
+    "rate_limits": {}, # Rates and bursts for particular hosts, like {"api.weather.gov": {"rate_per_second": 1, "burst": 2}}
+}
+DOWNLOAD_CHUNK_BYTES = 65536
+HEADER_CHARSET = re.compile(r"charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+META_CHARSET_BYTES = 4096 # Browsers look for <meta charset> in the first 1024 bytes; some pages put it later
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+HTTP_CLIENT = {"session": None, "settings": None, "cache_path": None}
+HTTP_CLIENT_LOCK = Lock()
+HTTP_STATS = {"requests": 0, "connections": 0, "throttled": 0, "throttled_seconds": 0.0, "logged": None}
+HTTP_STATS_LOCK = Lock()
+HTTP_CACHE_STATS = {} # For each URL (without its query, which may hold an API key): [requests, not modified, bytes saved]
+HTTP_CACHE_DIR = "http_cache/"
+RUN_DEADLINE_SECONDS = 1200 # Default for the publication's `run_deadline_seconds` setting
+FETCH_DEADLINE = {"started": None, "at": None} # Times from time.monotonic()
+
+
+RATE_LIMITERS = {} # For each host, its TokenBucket. Shared by every thread
+RATE_LIMITERS_LOCK = Lock()
+
+
+class FetchDeadlineExceeded(Exception):
+    """The run's fetch deadline passed before a request was sent."""
+
+
+class TokenBucket:
+    """A rate limiter for one host: each request takes a token, and tokens refill at a steady rate, up to the burst size."""
+
+    def __init__(self, rate_per_second, burst):
+        self.rate_per_second = rate_per_second
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = monotonic()
+        self.lock = Lock()
+
+    def reserve(self):
+        """Take a token, even one that hasn't refilled yet, so requests are served in the order they arrive.
+
+        RETURNS
+        wait (float): Seconds to wait before sending the request. 0 if a token was ready
+        """
+
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate_per_second)
+            self.updated = now
+            self.tokens -= 1
+            return max(-self.tokens / self.rate_per_second, 0)
+
+
+def start_fetch_clock():
+    """Start timing a run, for its fetch deadline, and forget the previous run's HTTP stats. Call when a run begins.
+
+    RETURNS
+    None
+    """
+
+    FETCH_DEADLINE["started"] = monotonic()
+    FETCH_DEADLINE["at"] = None # Set by configure_http(), once the publication's settings are loaded
+    with HTTP_STATS_LOCK:
+        HTTP_STATS.update({"requests": 0, "connections": 0, "throttled": 0, "throttled_seconds": 0.0, "logged": None})
+        HTTP_CACHE_STATS.clear()
+
+
+def deadline_remaining():
+    """How long until the run's fetch deadline.
+
+    RETURNS
+    seconds (float or None): Seconds left, which is negative after the deadline. None if there's no deadline
+    """
+
+    if FETCH_DEADLINE["at"] is None:
+        return None
+    return FETCH_DEADLINE["at"] - monotonic()
+
+
+def count_http(stat):
+    """Helper function to add one to a counter in HTTP_STATS, from any thread.
+
+    ARGUMENTS
+    stat (str): "requests" or "connections"
+
+    RETURNS
+    None
+    """
+
+    with HTTP_STATS_LOCK:
+        HTTP_STATS[stat] += 1
+
+
+def make_counting_pool_classes():
+    """Create connection pool classes that count every new connection, including reconnects after a host closed one.
+
+    RETURNS
+    pool_classes (dict): For "http" and "https", a urllib3 connection pool class
+    """
+
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class CountingHTTPConnection(HTTPConnection):
+        def connect(self):
+            count_http("connections")
+            return super().connect()
+
+    class CountingHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            count_http("connections")
+            return super().connect()
+
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = CountingHTTPConnection
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = CountingHTTPSConnection
+
+    return {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+
+def get_http_settings(fetching_config=None):
+    """Combine the publication's fetching settings with the defaults.
+
+    ARGUMENTS
+    fetching_config (dict): Optional, the publication's `fetching` settings
+
+    RETURNS
+    settings (dict): A value for every key in HTTP_DEFAULTS
+    """
+
+    fetching_config = fetching_config or {}
+    return {key: fetching_config.get(key, default) for key, default in HTTP_DEFAULTS.items()}
+
+
+def make_session(settings):
+    """Create a requests session with pooled keep-alive connections, compression and retries.
+
+    NOTE
+    Accept-Encoding offers gzip and deflate, plus brotli (br) when the brotli package is installed.
+    Each retry takes a token from the host's rate limit, so retrying a throttled host doesn't send a burst. See wait_for_rate_limit().
+
+    ARGUMENTS
+    settings (dict): From get_http_settings()
+
+    RETURNS
+    session (requests.Session): The session to send every request through
+    """
+
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import Retry, make_headers
+
+    class RateLimitedRetry(Retry):
+        """Retries that wait their turn under the host's rate limit, like the first attempt in http_get()."""
+
+        def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+            retry = super().increment(method, url, response, error, _pool, _stacktrace) # Raises if out of retries
+            if _pool is not None:
+                default_port = {"http": 80, "https": 443}.get(_pool.scheme)
+                port = f":{_pool.port}" if _pool.port and _pool.port != default_port else ""
+                wait_for_rate_limit(f"{_pool.scheme}://{_pool.host}{port}/")
+            return retry
+
+    retry = RateLimitedRetry(
+        total=settings["retries"],
+        backoff_factor=settings["retry_backoff_seconds"],
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET", "HEAD"],
+        raise_on_status=False, # After the last retry, return the response so callers can check its status
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings["pool_hosts"],
+        pool_maxsize=settings["pool_connections_per_host"],
+        max_retries=retry,
+    )
+    adapter.poolmanager.pool_classes_by_scheme = make_counting_pool_classes()
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(make_headers(accept_encoding=True))
+    return session
+
+
+def configure_http(fetching_config=None, bucket_path=None):
+    """Apply the publication's fetching settings to the shared session. Starts a new session only if the settings changed.
+
+    ARGUMENTS
+    fetching_config (dict): Optional, the publication's `fetching` settings
+    bucket_path (str): Optional, where to keep the HTTP cache between runs. If None, or if the
+        fetching settings have `http_cache: False`, every request downloads the full response
+
+    RETURNS
+    None
+    """
+
+    settings = get_http_settings(fetching_config)
+    if FETCH_DEADLINE["started"] is None:
+        start_fetch_clock()
+    run_deadline_seconds = (fetching_config or {}).get("run_deadline_seconds", RUN_DEADLINE_SECONDS)
+    FETCH_DEADLINE["at"] = FETCH_DEADLINE["started"] + run_deadline_seconds if run_deadline_seconds else None
+    use_cache = bucket_path is not None and (fetching_config or {}).get("http_cache", True)
+    with HTTP_CLIENT_LOCK:
+        HTTP_CLIENT["cache_path"] = bucket_path + HTTP_CACHE_DIR if use_cache else None
+        if HTTP_CLIENT["session"] is not None and settings != HTTP_CLIENT["settings"]:
+            HTTP_CLIENT["session"].close()
+            HTTP_CLIENT["session"] = None
+        if settings != HTTP_CLIENT["settings"]:
+            with RATE_LIMITERS_LOCK:
+                RATE_LIMITERS.clear()
+        HTTP_CLIENT["settings"] = settings
+
+
+def get_session():
+    """Get the session shared by the whole run, creating it on first use.
+
+    RETURNS
+    session (requests.Session): The shared session
+    """
+
+    with HTTP_CLIENT_LOCK:
+        if HTTP_CLIENT["session"] is None:
+            if HTTP_CLIENT["settings"] is None:
+                HTTP_CLIENT["settings"] = get_http_settings()
+            HTTP_CLIENT["session"] = make_session(HTTP_CLIENT["settings"])
+        return HTTP_CLIENT["session"]
+
+
+def http_cache_entry_path(cache_path, url):
+    """Helper function to locate a URL's entry in the HTTP cache.
+
+    NOTE
+    The file name is a hash, so API keys in a URL aren't written to storage.
+
+    ARGUMENTS
+    cache_path (str): The HTTP cache folder
+    url (str): The URL requested
+
+    RETURNS
+    path (str): Where the URL's last response is saved
+    """
+
+    return cache_path + hashlib.sha1(url.encode("utf-8")).hexdigest() + ".pickle"
+
+
+def read_http_cache(entry_path):
+    """Load a saved response from the HTTP cache.
+
+    ARGUMENTS
+    entry_path (str): From http_cache_entry_path()
+
+    RETURNS
+    entry (dict or None): The saved response, with keys for etag, last_modified, encoding, content_type and content. None if not saved
+    """
+
+    try:
+        return pickle.loads(get_storage(entry_path).read(entry_path))
+    except Exception: # Not cached yet, or saved by an incompatible version
+        return None
+
+
+def write_http_cache(entry_path, response):
+    """Save a response and its validators in the HTTP cache, if the server sent validators.
+
+    ARGUMENTS
+    entry_path (str): From http_cache_entry_path()
+    response (requests.Response): A 200 response
+
+    RETURNS
+    None
+    """
+
+    if "ETag" not in response.headers and "Last-Modified" not in response.headers:
+        return # The server can't tell us whether it changed, so a saved copy can't be used
+    entry = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "encoding": response.encoding,
+        "content_type": response.headers.get("Content-Type"),
+        "content": response.content,
+    }
+    try:
+        get_storage(entry_path).write(entry_path, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception as e:
+        logging.info(f"write_http_cache: {str(type(e))}, {str(e)}")
+
+
+def count_http_cache(url, not_modified, bytes_saved):
+    """Helper function to tally the HTTP cache's results for a URL, from any thread.
+
+    ARGUMENTS
+    url (str): The URL requested
+    not_modified (bool): Did the server answer 304, so the saved copy was used?
+    bytes_saved (int): Size of the content we didn't have to download
+
+    RETURNS
+    None
+    """
+
+    parts = urlparse(url)
+    with HTTP_STATS_LOCK:
+        stats = HTTP_CACHE_STATS.setdefault(parts.netloc + parts.path, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += int(not_modified)
+        stats[2] += bytes_saved
+
+
+def wait_for_rate_limit(url):
+    """Wait until the host's rate limit allows another request. Shared by every fetch, so sources,
+    API calls, calendar pages and forecasts on the same host take turns instead of triggering 429s.
+
+    ARGUMENTS
+    url (str): What's about to be requested
+
+    RETURNS
+    None. Raises FetchDeadlineExceeded if the wait would run past the fetch deadline
+    """
+
+    if HTTP_ARCHIVE["mode"] == "replay" and not HTTP_ARCHIVE["latency"]:
+        return # No server to protect, and no time to simulate
+    host = urlparse(url).netloc.lower()
+    settings = HTTP_CLIENT["settings"] or HTTP_DEFAULTS
+    with RATE_LIMITERS_LOCK:
+        if host not in RATE_LIMITERS:
+            rate_limits = settings["rate_limits"] or {}
+            limits = rate_limits.get(host) or rate_limits.get(host.split(":")[0]) or {}
+            rate = limits.get("rate_per_second", settings["host_rate_per_second"])
+            RATE_LIMITERS[host] = TokenBucket(rate, limits.get("burst", settings["host_burst"])) if rate else None
+        limiter = RATE_LIMITERS[host]
+    if limiter is None:
+        return
+    wait = limiter.reserve()
+    if wait <= 0:
+        return
+    remaining = deadline_remaining()
+    if remaining is not None and wait >= remaining:
+        raise FetchDeadlineExceeded(f"Fetch deadline would pass while waiting for the rate limit of {host}")
+    with HTTP_STATS_LOCK:
+        HTTP_STATS["throttled"] += 1
+        HTTP_STATS["throttled_seconds"] += wait
+    sleep(wait)
+
+
+def get_max_bytes(source):
+    """How much of a source's page to download.
+
+    ARGUMENTS
+    source (dict): Description of the website to scrape
+
+    RETURNS
+    max_bytes (int or None): The source's `max_bytes`, or else the publication's. None = no limit
+    """
+
+    settings = HTTP_CLIENT["settings"] or HTTP_DEFAULTS
+    return source.get("max_bytes", settings["max_bytes"])
+
+
+def read_capped(response, max_bytes):
+    """Download a streamed response's body, up to a limit, and stop there.
+
+    NOTE
+    The body is kept in the response, so response.content and response.text work as usual.
+    If the limit was hit, response.truncated is True and the connection is closed instead of being reused.
+    The body then ends before its last HTML tag, so a headline cut off in the middle isn't reported.
+
+    ARGUMENTS
+    response (requests.Response): A response from session.get(..., stream=True)
+    max_bytes (int): The most bytes to keep
+
+    RETURNS
+    response (requests.Response): The same response, with its body read
+    """
+
+    chunks = []
+    size = 0
+    response.truncated = False
+    for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_bytes:
+            response.truncated = True
+            break
+    content = b"".join(chunks)
+    if response.truncated:
+        content = content[:max_bytes]
+        content = content[:content.rfind(b"<")] or content # Drop the last element, which was probably cut off mid-way
+        response.close()
+    response._content = content
+    response._content_consumed = True
+    return response
+
+
+def http_get(url, timeout=None, use_cache=True, max_bytes=None, **kwargs):
+    """Send a GET request through the shared session.
+
+    NOTE
+    Timeouts are shortened so a request can't run past the fetch deadline. After the deadline, raises FetchDeadlineExceeded.
+    Waits its turn under the host's rate limit. See wait_for_rate_limit().
+    When the HTTP cache is on, send the validators (ETag and Last-Modified) of the last response saved for this URL.
+    If the server answers 304 Not Modified, return the saved content as a 200 response, without downloading it again.
+    With max_bytes, the body is streamed and cut off at that size. A cut-off response is logged and never cached.
+    With stream=True, the HTTP cache isn't used: saving the response would mean downloading all of it before the caller reads it.
+
+    ARGUMENTS
+    url (str): What to request
+    timeout (float or tuple): Optional, seconds to wait. Defaults to the configured connect and read timeouts
+    use_cache (bool): Use the HTTP cache, if configured
+    max_bytes (int): Optional, the most bytes of the body to download. None = all of it
+    **kwargs: Any other arguments for requests.get, like headers or params
+
+    RETURNS
+    response (requests.Response): The response
+    """
+
+    session = get_session()
+    wait_for_rate_limit(url)
+    if timeout is None:
+        settings = HTTP_CLIENT["settings"]
+        timeout = (settings["connect_timeout_seconds"], settings["read_timeout_seconds"])
+    remaining = deadline_remaining()
+    if remaining is not None:
+        if remaining <= 0:
+            raise FetchDeadlineExceeded(f"Fetch deadline passed before requesting {urlparse(url).netloc}")
+        timeout = tuple(min(t, remaining) for t in timeout) if isinstance(timeout, tuple) else min(timeout, remaining)
+    count_http("requests")
+
+    def get(**get_kwargs):
+        if not max_bytes:
+            return session.get(url, timeout=timeout, **get_kwargs)
+        response = read_capped(session.get(url, timeout=timeout, stream=True, **get_kwargs), max_bytes)
+        if response.truncated:
+            logging.warning(f"{urlparse(url).netloc}{urlparse(url).path}: download stopped at the {max_bytes:,} byte limit. The page was parsed as far as that")
+        return response
+
+    use_cache = use_cache and not kwargs.get("params") and not kwargs.get("stream") and not http_archive_active() # Archives hold full responses
+    cache_path = HTTP_CLIENT["cache_path"] if use_cache else None
+    if cache_path is None:
+        return get(**kwargs)
+
+    entry_path = http_cache_entry_path(cache_path, url)
+    entry = read_http_cache(entry_path)
+    headers = dict(kwargs.pop("headers", None) or {})
+    if entry and entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    response = get(headers=headers, **kwargs)
+
+    if response.status_code == 304 and entry:
+        response.status_code = 200
+        response.reason = "OK (not modified)"
+        response._content = entry["content"]
+        response._content_consumed = True # So iter_content() serves the saved content, not the 304's empty body
+        response.encoding = entry["encoding"]
+        if entry.get("content_type"):
+            response.headers["Content-Type"] = entry["content_type"]
+        count_http_cache(url, True, len(entry["content"]))
+    else:
+        if response.status_code == 200 and not getattr(response, "truncated", False):
+            write_http_cache(entry_path, response)
+        count_http_cache(url, False, 0)
+    return response
+
+
+def decode_response(response, encoding=None):
+    """Turn a response's body into text, without guessing its character set from the content.
+
+    NOTE
+    response.text runs charset detection over the whole body when the server doesn't name a charset,
+    which is slow on big pages, and for text/html it assumes ISO-8859-1, which garbles UTF-8 pages.
+    Instead, like a browser, use the first of these that works:
+    the encoding passed in, a byte order mark, the charset in the Content-Type header, the page's <meta charset>, UTF-8.
+    If none does, decode as Windows-1252, which never fails.
+
+    ARGUMENTS
+    response (requests.Response): The response
+    encoding (str): Optional, a source's `encoding` setting, for servers that name the wrong charset
+
+    RETURNS
+    text (str): The decoded body
+    """
+
+    content = response.content
+    header_charset = HEADER_CHARSET.search(response.headers.get("Content-Type", ""))
+    meta_charset = META_CHARSET.search(content[:META_CHARSET_BYTES])
+    candidates = [
+        encoding,
+        "utf-8-sig" if content.startswith(codecs.BOM_UTF8) else None,
+        header_charset.group(1) if header_charset else None,
+        meta_charset.group(1).decode("ascii", errors="ignore") if meta_charset else None,
+        "utf-8",
+    ]
+    for candidate in candidates:
+        if candidate:
+            try:
+                return content.decode(candidate)
+            except (LookupError, UnicodeDecodeError):
+                continue
+    return content.decode("windows-1252", errors="replace")
+
+
+def log_http_stats():
+    """Report how many requests reused an open connection instead of opening a new one. For the admin issue.
+
+    RETURNS
+    None
+    """
+
+    stats = (HTTP_STATS["requests"], HTTP_STATS["connections"])
+    if stats[0] and stats != HTTP_STATS["logged"]: # Don't repeat the same numbers
+        HTTP_STATS["logged"] = stats
+        if HTTP_ARCHIVE["mode"] == "replay":
+            logging.warning(f"HTTP connections: {stats[0]} requests, replayed from {HTTP_ARCHIVE['path']}")
+        else:
+            logging.warning(f"HTTP connections: {stats[0]} requests, {stats[1]} connections opened, {max(stats[0] - stats[1], 0)} reused")
+        if HTTP_STATS["throttled"]:
+            logging.warning(f"HTTP rate limits: {HTTP_STATS['throttled']} requests waited {HTTP_STATS['throttled_seconds']:.1f} seconds in all")
+        log_http_cache_stats()
+
+
+def log_http_cache_stats(max_urls=10):
+    """Report how much downloading the HTTP cache saved, for the URLs where it saved the most. For the admin issue.
+
+    ARGUMENTS
+    max_urls (int): How many URLs to list
+
+    RETURNS
+    None
+    """
+
+    with HTTP_STATS_LOCK:
+        stats = {url: list(url_stats) for url, url_stats in HTTP_CACHE_STATS.items()}
+    if not stats:
+        return
+    cached_requests = sum(url_stats[0] for url_stats in stats.values())
+    not_modified = sum(url_stats[1] for url_stats in stats.values())
+    bytes_saved = sum(url_stats[2] for url_stats in stats.values())
+    top_urls = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:max_urls]
+    details = ", ".join([f"{url} {url_stats[2] / 1e3:.0f} KB" for url, url_stats in top_urls if url_stats[2]])
+    logging.warning(f"HTTP cache: {not_modified} of {cached_requests} requests not modified, {bytes_saved / 1e3:.0f} KB not downloaded. {details}")
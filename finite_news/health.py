@@ -0,0 +1,219 @@
+"""🩺 Health: Track how reliable each source is across runs, and rest the ones that keep failing
+
+Every run records each news and events source's latency and outcome in source_health.json in the bucket.
+After several failures in a row (errors, timeouts, or no headlines from a source that usually has some),
+the source's circuit breaker opens: it's skipped for a day. Then it's probed once. If it works, it's back to normal.
+If not, it rests again for twice as long, up to a limit.
+
+The admin issue ends with a table of every source's health.
+"""
+
+from datetime import date, timedelta
+import json
+import logging
+from threading import Lock
+
+from finite_news.planning import source_key
+from finite_news.storage import get_storage
+
+HEALTH_FILE_NAME = "source_health.json"
+HEALTH_DEFAULTS = { # Override any of these in the `fetching` section of publication_config.yml
+    "breaker_failures": 3, # Failures in a row that open a source's circuit breaker
+    "breaker_max_rest_days": 16, # The longest a failing source is rested between probes
+}
+HISTORY_LENGTH = 30 # How many runs of latency and outcomes to keep per source
+FORGET_AFTER_DAYS = 60 # Drop sources that haven't been fetched in this long, like ones removed from the config
+FAILURES = ["error", "timeout", "empty"]
+SOURCE_HEALTH = {"path": None, "sources": {}, "settings": dict(HEALTH_DEFAULTS), "recorded": set(), "announced": set()}
+SOURCE_HEALTH_LOCK = Lock()
+
+
+def configure_source_health(bucket_path, fetching_config=None):
+    """Load the sources' health history from the bucket, once per run.
+
+    ARGUMENTS
+    bucket_path (str): Where source_health.json is kept
+    fetching_config (dict): Optional, the publication's `fetching` settings
+
+    RETURNS
+    None
+    """
+
+    path = bucket_path + HEALTH_FILE_NAME
+    with SOURCE_HEALTH_LOCK:
+        SOURCE_HEALTH["settings"] = {key: (fetching_config or {}).get(key, default) for key, default in HEALTH_DEFAULTS.items()}
+        if SOURCE_HEALTH["path"] == path:
+            return
+        try:
+            sources = json.loads(get_storage(path).read(path).decode("utf-8"))
+        except FileNotFoundError:
+            sources = {}
+        except Exception as e:
+            logging.warning(f"configure_source_health: Starting fresh. Couldn't read {HEALTH_FILE_NAME}: {str(type(e))}, {str(e)}")
+            sources = {}
+        SOURCE_HEALTH.update({"path": path, "sources": sources, "recorded": set(), "announced": set()})
+
+
+def reset_source_health():
+    """Forget the previous run's results, so a notebook or long-lived process records and announces every source again. Call when a run starts.
+
+    NOTE
+    The history is loaded from the bucket again at the next configure_source_health(), in case another run, like a prefetch, updated it.
+
+    RETURNS
+    None
+    """
+
+    with SOURCE_HEALTH_LOCK:
+        SOURCE_HEALTH.update({"path": None, "sources": {}, "recorded": set(), "announced": set()})
+
+
+def source_allowed(source):
+    """Check the source's circuit breaker: should we fetch it today?
+
+    NOTE
+    A resting source whose rest is over is allowed, as a probe.
+
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+
+    RETURNS
+    allowed (bool): False if the source is resting
+    """
+
+    key = source_key(source)
+    health = SOURCE_HEALTH["sources"].get(key)
+    if not health or not health.get("open_until"):
+        return True
+    allowed = date.today().isoformat() >= health["open_until"]
+    with SOURCE_HEALTH_LOCK:
+        if key not in SOURCE_HEALTH["announced"]: # Once per run
+            SOURCE_HEALTH["announced"].add(key)
+            if allowed:
+                logging.info(f"{health['name']}: probing after resting {health['rest_days']} days")
+            else:
+                logging.warning(f"{health['name']}: skipped, resting until {health['open_until']} after {health['failure_streak']} failures in a row")
+    return allowed
+
+
+def record_source_result(source, seconds, outcome):
+    """Add a run's result to the source's health, and open or close its circuit breaker.
+
+    NOTE
+    Only the first result for a source during a run counts, so a source that timed out isn't also counted when its
+    abandoned fetch finishes later.
+
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+    seconds (float): How long the fetch took
+    outcome (str): "ok", "empty" (no headlines), "error" or "timeout"
+
+    RETURNS
+    None
+    """
+
+    if outcome == "empty" and source.get("exclude_from_0_results_warning", False):
+        outcome = "ok" # This source is often empty, and that's fine
+    key = source_key(source)
+    today = date.today()
+    with SOURCE_HEALTH_LOCK:
+        if key in SOURCE_HEALTH["recorded"]:
+            return
+        SOURCE_HEALTH["recorded"].add(key)
+        health = SOURCE_HEALTH["sources"].setdefault(
+            key, {"name": source.get("name", ""), "latencies": [], "outcomes": [], "zero_streak": 0, "failure_streak": 0, "rest_days": 0, "open_until": None}
+        )
+        health["name"] = source.get("name", "")
+        health["last_run"] = today.isoformat()
+        health["latencies"] = (health["latencies"] + [round(seconds, 3)])[-HISTORY_LENGTH:]
+        health["outcomes"] = (health["outcomes"] + [outcome])[-HISTORY_LENGTH:]
+        health["zero_streak"] = health["zero_streak"] + 1 if outcome == "empty" else 0
+
+        if outcome not in FAILURES:
+            if health["open_until"]:
+                logging.warning(f"{health['name']}: recovered after resting {health['rest_days']} days")
+            health.update({"failure_streak": 0, "rest_days": 0, "open_until": None})
+            return
+        health["failure_streak"] += 1
+        probing = health["open_until"] is not None
+        if probing or health["failure_streak"] >= SOURCE_HEALTH["settings"]["breaker_failures"]:
+            health["rest_days"] = min(2 * health["rest_days"], SOURCE_HEALTH["settings"]["breaker_max_rest_days"]) if probing else 1
+            health["open_until"] = (today + timedelta(days=health["rest_days"])).isoformat()
+            logging.warning(f"{health['name']}: {health['failure_streak']} failures in a row ({outcome} today). Resting until {health['open_until']}")
+
+
+def save_source_health(dev_mode=False):
+    """Save the sources' health history to the bucket, for the next run.
+
+    ARGUMENTS
+    dev_mode (bool): If True, don't save, like headline logs
+
+    RETURNS
+    None
+    """
+
+    if dev_mode or SOURCE_HEALTH["path"] is None or not SOURCE_HEALTH["recorded"]:
+        return
+    cutoff = (date.today() - timedelta(days=FORGET_AFTER_DAYS)).isoformat()
+    with SOURCE_HEALTH_LOCK:
+        sources = {key: health for key, health in SOURCE_HEALTH["sources"].items() if health.get("last_run", "") >= cutoff}
+        content = json.dumps(sources, indent=1, sort_keys=True).encode("utf-8")
+    try:
+        get_storage(SOURCE_HEALTH["path"]).write(SOURCE_HEALTH["path"], content)
+    except Exception as e:
+        logging.warning(f"save_source_health: {str(type(e))}, {str(e)}")
+
+
+def percentile(values, share):
+    """Helper function to find a percentile by the nearest-rank method.
+
+    ARGUMENTS
+    values (list of float): The values
+    share (float): Which percentile, from 0 to 1, like 0.9
+
+    RETURNS
+    value (float or None): The percentile. None if there are no values
+    """
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(share * len(ordered))) - 1))]
+
+
+def source_health_rows():
+    """Summarize each source's health, for the admin issue.
+
+    RETURNS
+    rows (list of dict): One per source fetched today or resting, worst first, with keys for:
+        - name (str)
+        - runs (int): How many runs are in the history
+        - p50_seconds (float), p90_seconds (float): Median and 90th percentile latency
+        - error_rate (float): Share of runs that errored or timed out
+        - zero_streak (int): Runs in a row with no headlines
+        - state (str): "ok", "failing", "resting until DATE" or "probing"
+    """
+
+    today = date.today().isoformat()
+    rows = []
+    with SOURCE_HEALTH_LOCK:
+        for key, health in SOURCE_HEALTH["sources"].items():
+            if key not in SOURCE_HEALTH["recorded"] and not health.get("open_until") and health.get("last_run") != today:
+                continue # Only sources that were fetched today, like by a prefetch, or are resting
+            if health.get("open_until") and key not in SOURCE_HEALTH["recorded"]:
+                state = f"resting until {health['open_until']}" if today < health["open_until"] else "probing"
+            elif health.get("open_until"):
+                state = f"resting until {health['open_until']}"
+            else:
+                state = "failing" if health["failure_streak"] else "ok"
+            outcomes = health["outcomes"]
+            rows.append({
+                "name": health["name"],
+                "runs": len(outcomes),
+                "p50_seconds": percentile(health["latencies"], 0.5),
+                "p90_seconds": percentile(health["latencies"], 0.9),
+                "error_rate": sum(1 for outcome in outcomes if outcome in ["error", "timeout"]) / len(outcomes) if outcomes else 0,
+                "zero_streak": health["zero_streak"],
+                "state": state,
+            })
+    return sorted(rows, key=lambda row: (row["state"] == "ok", -row["error_rate"], -row["zero_streak"], row["name"]))
@@ -0,0 +1,741 @@
+"""📦 Loading: Import data and initialize variables"""
+
+import calendar
+from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from io import StringIO
+import json
+import logging
+import os
+import pickle
+from time import monotonic
+
+import yaml
+
+from finite_news.parsing import compile_recipes
+from finite_news.storage import get_storage
+
+
+def init_logging(logging_level):
+    """Initialize logging to in-memory object, for optional delivery in admin's issue of Finite News.
+    
+    NOTE
+    Reminder: This function doesn't reset an active log. Must restart the kernel in SageMaker.
+    
+    ARGUMENTS
+    logging_level (str): The granularity of logging messages, 'warning' or 'info'
+    
+    RETURNS
+    log_stream (StringIO object): In-memory file-like object that collects results from logging during the Finite News run
+    """
+    
+    log_stream = StringIO() 
+    if logging_level=='warning':
+        level = logging.WARNING
+    elif logging_level=='info':
+        level = logging.INFO
+    logging.basicConfig(stream=log_stream, level=level)
+    return log_stream
+
+
+FN_SECRETS_CACHE = {} # Process-wide cache of secret groups, so each run calls AWS Secrets Manager once, not once per source/issue/email
+
+
+def fetch_fn_secrets(secret_name="fn_secrets", region_name="us-east-1"):
+    """Retrieve and parse a whole group of secrets in one call.
+    
+    NOTE
+    For offline runs and benchmarks, set one of these environment variables to skip AWS Secrets Manager:
+        - FN_SECRETS_FILE: Path to a local JSON file with the same keys as the secret group, like {"BUCKET_PATH": "..."}
+        - FN_SECRETS: The same JSON as a string
+    
+    ARGUMENTS
+    secret_name (string): the group where the Finite News secrets are stored in AWS Secrets Manager
+    region_name (string): the region where your AWS Secrets Manager secret_name lives.
+
+    RETURNS
+    secrets (dict): All secrets in the group, by key
+    """
+    
+    if os.environ.get("FN_SECRETS_FILE"):
+        with open(os.environ["FN_SECRETS_FILE"]) as f:
+            return json.load(f)
+    if os.environ.get("FN_SECRETS"):
+        return json.loads(os.environ["FN_SECRETS"])
+
+    import boto3 # Imported here so offline runs never load boto3
+    from botocore.exceptions import ClientError
+
+    # Create a Secrets Manager client
+    session = boto3.session.Session()
+    client = session.client(
+        service_name='secretsmanager',
+        region_name=region_name
+    )
+
+    try:
+        get_secret_value_response = client.get_secret_value(
+            SecretId=secret_name
+        )
+    except ClientError as e: # Stop the presses, we can't get our secret.
+        raise e
+    return json.loads(get_secret_value_response["SecretString"])
+
+
+def get_fn_secret(secret_key, secret_name="fn_secrets", region_name="us-east-1", ttl_seconds=None):
+    """Retrieve a secret from AWS Secrets Manager.
+    
+    NOTE
+    The secret group is fetched once and then served from FN_SECRETS_CACHE for the rest of the run.
+    For long-running (daemon) processes, set the environment variable FN_SECRETS_TTL_SECONDS to refetch it when it's older than that,
+    so rotated keys are picked up.
+    
+    ARGUMENTS
+    secret_key (string): the specific secret to retrieve, such as BUCKET_PATH or OPENAI_API_KEY
+    secret_name (string): the group where the Finite News secrets are stored in AWS Secrets Manager
+    region_name (string): the region where your AWS Secrets Manager secret_name lives. See the sample code provided by Secrets Manager after you create the secret
+    ttl_seconds (int): Optional, refetch the group if the cached copy is older than this. Defaults to FN_SECRETS_TTL_SECONDS, if set. None = never refetch
+
+    RETURNS
+    secret_value (string): the secret!
+    """
+
+    if ttl_seconds is None and os.environ.get("FN_SECRETS_TTL_SECONDS"):
+        ttl_seconds = float(os.environ["FN_SECRETS_TTL_SECONDS"])
+    cached = FN_SECRETS_CACHE.get((secret_name, region_name))
+    if not cached or (ttl_seconds is not None and monotonic() - cached["fetched_at"] > ttl_seconds):
+        cached = {
+            "secrets": fetch_fn_secrets(secret_name, region_name),
+            "fetched_at": monotonic(),
+        }
+        FN_SECRETS_CACHE[(secret_name, region_name)] = cached
+
+    try:
+        return cached["secrets"][secret_key]
+    except KeyError as e:
+        raise KeyError(f"Secret key {str(e)} not found. Is it stored in AWS Secrets Manager? Have you given permissions for your SageMaker user to access the secret?") # No sense in logging the exception since we won't be sending any emails (where we store logs)
+
+
+def clear_fn_secrets_cache():
+    """Forget all cached secrets, so the next get_fn_secret() call fetches them again.
+    
+    RETURNS
+    None
+    """
+    
+    FN_SECRETS_CACHE.clear()
+
+
+MAX_CONCURRENT_READS = 16 # How many files to read from storage at the same time
+READ_SECONDS = {} # Latency of each file read from storage during this run, by path
+
+
+def read_file(path):
+    """Read a whole file from storage (S3 or local) and record how long it took.
+    
+    ARGUMENTS
+    path (str): The full path of the file, beginning with BUCKET_PATH
+    
+    RETURNS
+    content (bytes): The raw content of the file
+    """
+    
+    start = monotonic()
+    content = get_storage(path).read(path)
+    READ_SECONDS[path] = monotonic() - start
+    logging.info(f"Read {path} in {READ_SECONDS[path]:.3f} seconds")
+    return content
+
+
+def iter_files(paths, max_workers=MAX_CONCURRENT_READS):
+    """Read many files from storage concurrently, with at most max_workers reads in flight, yielding each as soon as it arrives.
+    
+    NOTE
+    Reading from S3 is almost all waiting on the network, so threads are enough to overlap the reads.
+    
+    ARGUMENTS
+    paths (list of str): The full paths of the files
+    max_workers (int): The maximum number of files to read at once
+    
+    YIELDS
+    path (str), content (bytes or Exception): The raw content of the file, or the Exception raised while reading it
+    """
+    
+    if not paths:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+        futures = {executor.submit(read_file, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+
+def read_files(paths, max_workers=MAX_CONCURRENT_READS):
+    """Read many files from storage concurrently, with at most max_workers reads in flight.
+    
+    ARGUMENTS
+    paths (list of str): The full paths of the files
+    max_workers (int): The maximum number of files to read at once
+    
+    RETURNS
+    contents (dict): For each path, the raw content of the file (bytes), or the Exception raised while reading it
+    """
+    
+    return dict(iter_files(paths, max_workers))
+
+
+def raise_if_exception(content):
+    """Helper function to surface an error caught by read_files().
+    
+    ARGUMENTS
+    content (bytes or Exception): One of the results of read_files()
+    
+    RETURNS
+    content (bytes): The same content, if it's not an Exception
+    """
+    
+    if isinstance(content, Exception):
+        raise content
+    return content
+
+
+YAML_LOADER = getattr(yaml, "CLoader", yaml.Loader) # The C (libyaml) loader is much faster, when PyYAML was built with it
+SNAPSHOT_FILE_NAME = "compiled_configs.pickle" # Don't begin with "config_", or it would look like a subscriber
+SNAPSHOT_FORMAT = 2 # Increment to invalidate old snapshots if the snapshot layout changes
+
+
+def parse_config_file(file_name, content):
+    """Turn a raw config file into Python objects.
+    
+    ARGUMENTS
+    file_name (str): The name of the file. YML files are parsed, anything else is decoded as text
+    content (bytes): The raw content of the file
+    
+    RETURNS
+    parsed (dict, list, or str): The content of the file
+    """
+    
+    if file_name.endswith((".yml", ".yaml")):
+        return yaml.load(content, Loader=YAML_LOADER)
+    return content.decode("utf-8")
+
+
+def load_snapshot(snapshot_path):
+    """Read the compiled snapshot of config files left by a previous run.
+    
+    ARGUMENTS
+    snapshot_path (str): The full path of the snapshot file
+    
+    RETURNS
+    snapshot (dict): For each file name, its "version" and "pickled" parsed content. Empty if there's no usable snapshot.
+    """
+    
+    try:
+        snapshot = pickle.loads(read_file(snapshot_path))
+        if snapshot.get("format") == SNAPSHOT_FORMAT:
+            return snapshot["files"]
+        logging.info(f"Ignoring config snapshot in an old format: {snapshot.get('format')}")
+    except Exception as e:
+        logging.info(f"No config snapshot loaded: {str(type(e))}, {str(e)}")
+    return {}
+
+
+def iter_config_files(bucket_path, file_names, use_snapshot=True):
+    """Read and parse config files, reusing the compiled snapshot for every file that hasn't changed since it was parsed.
+    Yield each file as soon as it's ready: first the ones from the snapshot, then the rest as their reads finish.
+    
+    NOTE
+    - One listing of the bucket gets the version (S3 ETag, or local modification time) of every file.
+    Only files whose version differs from the snapshot are read and parsed.
+    - The snapshot holds each file as parsed, not the merged issue configs, because merging depends on
+    today's date (event and stock schedules) and on dev_mode. Merging is cheap; reading and parsing is not.
+    - Each file is pickled into the snapshot as soon as it's parsed, so callers are free to modify what we yield.
+    
+    ARGUMENTS
+    bucket_path (str): The location of the S3 bucket (or local directory) where the files are stored.
+    file_names (list of str): The files to load
+    use_snapshot (bool): If False, read and parse every file and don't touch the snapshot.
+    
+    YIELDS
+    file_name (str), parsed (dict, list, str, or Exception): The file's parsed content, or the Exception raised while reading or parsing it
+    """
+    
+    snapshot = load_snapshot(bucket_path + SNAPSHOT_FILE_NAME) if use_snapshot else {}
+    versions = get_storage(bucket_path).list_versions(bucket_path) if use_snapshot else {}
+    changed = [
+        file_name for file_name in file_names
+        if not versions.get(file_name) or snapshot.get(file_name, {}).get("version") != versions[file_name]
+    ]
+    logging.info(f"Loading {len(file_names)} config files. Parsing {len(changed)}, reusing {len(file_names) - len(changed)} from snapshot")
+    
+    for file_name in file_names:
+        if file_name not in changed:
+            yield file_name, pickle.loads(snapshot[file_name]["pickled"])
+
+    for path, content in iter_files([bucket_path + file_name for file_name in changed]):
+        file_name = path[len(bucket_path):]
+        try:
+            parsed = parse_config_file(file_name, raise_if_exception(content))
+            if versions.get(file_name):
+                snapshot[file_name] = {
+                    "version": versions[file_name],
+                    "pickled": pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL)
+                }
+        except Exception as e:
+            parsed = e
+        yield file_name, parsed
+
+    if use_snapshot and changed:
+        try:
+            get_storage(bucket_path).write(
+                bucket_path + SNAPSHOT_FILE_NAME,
+                pickle.dumps({"format": SNAPSHOT_FORMAT, "files": snapshot}, protocol=pickle.HIGHEST_PROTOCOL)
+            )
+        except Exception as e:
+            logging.warning(f"Couldn't write config snapshot: {str(type(e))}, {str(e)}")
+
+
+def load_config_files(bucket_path, file_names, use_snapshot=True):
+    """Read and parse config files all at once. See iter_config_files().
+    
+    ARGUMENTS
+    bucket_path (str): The location of the S3 bucket (or local directory) where the files are stored.
+    file_names (list of str): The files to load
+    use_snapshot (bool): If False, read and parse every file and don't touch the snapshot.
+    
+    RETURNS
+    parsed (dict): For each file name, its parsed content, or the Exception raised while reading or parsing it
+    """
+    
+    return dict(iter_config_files(bucket_path, file_names, use_snapshot))
+
+
+def load_assets_from_s3(bucket_path, parsed=None):
+    """Import assets from storage for the publication in general.
+
+    ARGUMENTS
+    bucket_path (str): The location of the S3 bucket where required files are stored.
+    parsed (dict): Optional, the files already loaded by load_config_files(). If None, load them now.
+
+    RETURNS
+    thoughts_of_the_day (list): Jokes and quotes
+    substance_rules (dict): Logic for dropping headlines of little substance
+    template_html (str): The HTML layout of a Finite News issue
+    """
+
+    if parsed is None:
+        parsed = load_config_files(bucket_path, ["thoughts_of_the_day.yml", "substance_rules.yml", "template.htm"])
+
+    # List of quotes from which to sample a Thought for the Day
+    thoughts_of_the_day = []
+    try:
+        thoughts_of_the_day = raise_if_exception(parsed["thoughts_of_the_day.yml"])["quotes"]
+    except Exception as e:
+        logging.warning(f"Couldn't load thoughts_of_the_day.yml. load_assets_from_s3() error: {str(type(e))}, {str(e)}")
+
+    # Text rules for filtering out headlines
+    substance_rules = {}
+    try:
+        substance_rules = raise_if_exception(parsed["substance_rules.yml"])
+    except Exception as e:
+        logging.critical(f"Couldn't load substance_rules.yml. load_assets_from_s3() error: {str(type(e))}, {str(e)}")
+
+    # Template for the email
+    try:
+        template_html = raise_if_exception(parsed["template.htm"])
+    except Exception as e:
+        logging.critical(f"Couldn't load template.htm. load_assets_from_s3() error: {str(type(e))}, {str(e)}")
+        raise
+    
+    return thoughts_of_the_day, substance_rules, template_html
+
+
+def load_publication_config(
+    publication_config_file_name="publication_config.yml",
+    dev_mode=False,
+    disable_gpt=False
+):
+    """Import general settings and assets from files on S3, used for all subscribers
+    
+    ARGUMENTS
+    publication_config_file_name (str): file name for the general publication parameters YML file in the S3 bucket identified by BUCKET_PATH
+    dev_mode (bool): If True we're in development or debug mode, so don't send emails or modify headline_logs.
+    disable_gpt (bool): If True, don't call the GPT API and incur costs, for example during dev or debug cycles.
+    
+    RETURNS
+    publication_config (dict): General settings for today's run of Finite News, that apply to all issues / subscribers 
+    """
+    
+    bucket_path = get_fn_secret("BUCKET_PATH")
+
+    # Load publication settings and shared assets all at once
+    parsed = load_config_files(
+        bucket_path,
+        [publication_config_file_name, "thoughts_of_the_day.yml", "substance_rules.yml", "template.htm"]
+    )
+    publication_config = raise_if_exception(parsed[publication_config_file_name])
+    
+    # Check every source's recipe now, so a mistake stops the run before anything is fetched
+    compile_recipes(
+        publication_config["news_sources"] + publication_config.get("events_sources", []),
+        publication_config.get("fetching")
+    )
+
+    # Add shared assets
+    thoughts_of_the_day, substance_rules, template_html = load_assets_from_s3(bucket_path, parsed)
+    # Populate config dictionary
+    return {
+        "bucket_path": bucket_path,
+        "email_delivery": not dev_mode, # If dev_mode is True, don't send emails
+        "sender": publication_config["sender"],
+        "layout": {
+            "template_html": template_html,
+            "logo_url": publication_config["layout"]["logo_url"],
+        },
+        "editorial": {
+            "one_headline_keywords": publication_config["editorial"]["one_headline_keywords"],
+            "substance_rules": substance_rules,
+            "log_today_headlines": False if dev_mode else True,
+        },
+        "forecast" : publication_config["forecast"],
+        "gpt": publication_config.get("gpt", None) if not disable_gpt else None,
+        "fetching": publication_config.get("fetching", {}),
+        "news_sources": publication_config["news_sources"],
+        "news_catalog": index_sources(publication_config["news_sources"]),
+        "events_sources": publication_config.get("events_sources", []),
+        "events_catalog": index_sources(publication_config.get("events_sources", [])),
+        "thoughts_of_the_day": thoughts_of_the_day,
+    }
+
+
+def get_subscriber_list(bucket_path):
+    """Find the subscribers (the names of their config files) on the Finite News bucket.
+    
+    ARGUMENTS
+    bucket_path (str): The location of the S3 bucket (or local directory) where required files are stored.
+    
+    NOTE: 
+    Assumes all files in the bucket_path folder that begin with "config_" are a subscriber config file.
+    
+    RETURNS
+    subscriber_config_file_names (list): yml file names in finite bucket
+    """
+    
+    return get_storage(bucket_path).list_files(bucket_path, prefix="config_")
+
+
+def personalize_gpt_instruction(instruction, nba_teams=None):
+    """Customize the instructions we give GPT for editing headlines, depending on the subscriber's preferences
+
+    ARGUMENTS
+    instruction (str): The current GPT instruction text, including the placeholder {NBA_EXCLUSION}
+    nba_teams (list): The names of NBA teams the subscriber is tracking
+    
+    RETURNS
+    instruction (str): Updated instruction that tells GPT not to remove those NBA headlines
+    """
+    
+    nba_base = "Don't list a headline if it mentions "
+    if len(nba_teams)==1:
+        nba_exclusion = nba_base + f"'the {nba_teams[0]}'. "
+    elif len(nba_teams)>1:
+        nba_exclusion = nba_base + " or ".join([f"'the {team}'" for team in nba_teams]) + ". "
+    else: # No NBA teams tracked, so we'll just cut the placeholder {NBA_EXCLUSION} from instruction.
+        nba_exclusion = ""
+    return instruction.replace("{NBA_EXCLUSION}", nba_exclusion)
+
+
+UNKNOWN_SELECTIONS_WARNED = set() # (criterion, selection) pairs we've already warned about during this run
+
+
+def reset_selection_warnings():
+    """Forget which unknown selections were warned about, so each run's admin issue lists the typos again. Call when a run starts.
+    
+    RETURNS
+    None
+    """
+    
+    UNKNOWN_SELECTIONS_WARNED.clear()
+
+
+def index_sources(sources):
+    """Compile a list of sources into a catalog indexed by category and by name, once per run.
+    
+    ARGUMENTS
+    sources (list of dict): Descriptions of sources from publication_config
+    
+    RETURNS
+    catalog (dict): With keys for:
+        - sources (list of dict): The original list
+        - category, name (dict): For each category (or name), the (position, source) pairs that have it, in publication order
+    """
+    
+    catalog = {"sources": sources, "category": {}, "name": {}}
+    for position, source in enumerate(sources):
+        for criterion in ["category", "name"]:
+            catalog[criterion].setdefault(source.get(criterion), []).append((position, source))
+    return catalog
+
+
+def filter_sources(catalog, selections, criterion="name"):
+    """Applies subscriber's selections to a catalog of sources
+    
+    NOTE
+    Sources are returned in the order they're listed in the publication config, like scanning the whole list would.
+
+    ARGUMENTS
+    catalog (dict): Sources indexed by index_sources()
+    selections (list of str): Names/Categories of sources that subscriber wants
+    criterion (str): "name" or "category" for how to filter
+    
+    RETURNS
+    sources_filtered (list of dict): Subset of sources that match subscriber's selections
+    """
+    
+    matches = []
+    for selection in set(selections or []):
+        if selection in catalog[criterion]:
+            matches += catalog[criterion][selection]
+        elif (criterion, selection) not in UNKNOWN_SELECTIONS_WARNED:
+            UNKNOWN_SELECTIONS_WARNED.add((criterion, selection))
+            logging.warning(f"No sources in publication_config have the {criterion} '{selection}'. Check for a typo in a subscriber config.")
+    logging.info(f"Selected {len(matches)} of {len(catalog['sources'])} sources by {criterion}")
+    return [source for _, source in sorted(matches, key=lambda match: match[0])]
+
+
+def day_name_to_number(day_name):
+    """Helper function to convert a named day like "Friday" to an ISO standard number like 4.
+    
+    ARGUMENTS
+    day_name (str): Fully spelled out day of week. Case insensitive
+    
+    RETURNS
+    day_number (int): Number from 0-6, where 0 = Monday
+    """
+    calendar.Calendar(firstweekday=0)
+    return (
+        {name: i for i, name in enumerate(calendar.day_name)}
+        .get(day_name.capitalize(), None)
+        + 1  # To align with isocalendar()
+    )
+
+
+def parse_frequency_config(frequency_config):
+    """Determine if today is the day to deliver a scheduled section of the paper.
+    
+    ARGUMENTS
+    frequency_config (dict): Parameters for a cycle
+    
+    RETURNS
+    today (bool): Is today in the frequency schedule?
+    """
+    if not frequency_config:
+        return False
+    
+    frequency = frequency_config.get("frequency", None) # The cadence label
+        
+    if frequency == "monthly":
+        dom = frequency_config.get("day_of_month", 1) # Which day of the month does subscriber want?
+        dom_today = date.today().day # What's the day of the month today?
+        match = dom == dom_today
+        logging.info(f"parse_frequency_config, result: {match}. Today: {dom_today}. Requested: {dom}")
+        return match
+    
+    elif frequency == "weekly":
+        dow_number = day_name_to_number(frequency_config.get("day_of_week", "Monday"))
+        _, today_dow_number = date.today().isocalendar()[1:] # Get today's "week of year" and "day of week" as integers using ISO standard
+        match = today_dow_number==dow_number # Is today the requested day of the week?
+        logging.info(f"parse_frequency_config, result: {match}. Today: {today_dow_number}. Requested: {frequency_config.get('day_of_week')}, dow_number: {dow_number}")
+        return match
+
+    elif frequency == "every_other_week":
+        dow_number = day_name_to_number(frequency_config.get("day_of_week", "Monday"))
+        eow_odd = frequency_config.get("eow_odd", False) # Should every other week fall on odd week numbers or even?
+        week_number, today_dow_number = date.today().isocalendar()[1:] # Get today's "week of year" and "day of week" as integers using ISO standard
+        week_number_match = (
+                (eow_odd and week_number % 2 == 1)
+                or (not eow_odd and week_number % 2 == 0)
+        )
+        match = (
+            today_dow_number==dow_number # Today is the requested day of the week
+            and week_number_match # This is the requested week
+        )
+        logging.info(f"parse_frequency_config, result: {match}. Today: {week_number, today_dow_number}. Requested: {frequency_config}, eow_odd= {eow_odd}")
+        return match
+
+    else:
+        logging.warning(f"Unexpected value for frequency: {frequency}. Not parsed.")
+        return False
+
+
+def load_events_config(publication_events_catalog, subscriber_sources):
+    """Import the parameters for an events calendar source, if subscriber requests. 
+    
+    Includes deciding if today meets the subscriber's frequency for including events in their issue.
+    
+    ARGUMENTS
+    publication_events_catalog (dict): The event-type sources in the publication, if present, indexed by index_sources()
+    subscriber_sources (list of str): The subscriber's source configuration, which may or may not include preferences for event sources
+    
+    RETURNS
+    event_sources (list of dict): Source configuration for events that 
+    """
+    
+    try:
+        subscriber_events_sources = subscriber_sources.get("events", {}).get("sources", [])
+        frequency_match = parse_frequency_config(
+            subscriber_sources.get("events", {}).get("frequency", None)
+        )
+        if frequency_match and len(publication_events_catalog["sources"])>0 and len(subscriber_events_sources)>0:
+            return filter_sources(publication_events_catalog, subscriber_events_sources)
+        else:
+            return []
+    except Exception as e:
+        logging.warning(f"Unhandled exception in load_events_config: {str(type(e))}, {str(e)}. publication_events_sources: {publication_events_catalog['sources']}. subscriber_sources: {subscriber_sources}")
+        return []
+        
+        
+def load_stocks_config(subscriber_sources):
+    """Import the parameters for subscriber's stock section, if any.
+
+    ARGUMENTS
+    subscriber_sources (list of str): The subscriber's source configuration, which may or may not include preferences for stock data
+    
+    RETURNS
+    stocks (list of lists): Lists of tickers for each plot [ [TICKER1, TICKER2], [TICKER3, TICKER4] ], or empty list for none
+    """
+    
+    try:
+        stocks_config = subscriber_sources.get("stocks", None)
+        if not stocks_config:
+            return []
+        frequency_match = parse_frequency_config(stocks_config)
+        ticker_sets = stocks_config.get("tickers", [])
+        if len(ticker_sets)==0 or not frequency_match:
+            return []
+        return [[ticker.strip() for ticker in ticker_set.split(",")] for ticker_set in ticker_sets]
+
+    except Exception as e:
+        logging.warning(f"Unhandled exception in load_stocks_confg: {str(type(e))}, {str(e)}. subscriber_sources: {subscriber_sources}")
+        return []
+    
+
+def load_subscriber_config(subscriber_config_file_name, publication_config, subscriber_config=None):
+    """Import subscriber-specific parameters and combine with general publication settings
+    
+    ARGUMENTS
+    subscriber_config_file_name (str): name of the subscriber's config YML file in the S3 bucket
+    publication_config (dict): loaded general publication parameters
+    subscriber_config (dict): Optional, the config file already loaded by load_config_files(). If None, load it now.
+    
+    RETURNS
+    issue (ChainMap): Settings for an issue, combining subscriber and general publication parameters
+    """
+    
+    # Layer the subscriber's settings over the publication's, instead of copying the publication's.
+    # Reads fall through to publication_config, which is shared by reference by every issue.
+    # Writes only go into the issue's own top layer, so one issue can never change another.
+    issue = ChainMap({}, publication_config)
+    issue["sender"] = ChainMap({}, publication_config["sender"])
+    issue["editorial"] = ChainMap({}, publication_config["editorial"])
+    if subscriber_config is None:
+        subscriber_config = load_config_files(issue["bucket_path"], [subscriber_config_file_name])[subscriber_config_file_name]
+    subscriber_config = raise_if_exception(subscriber_config)
+    issue["admin"] = subscriber_config.get("admin", False)
+    issue["sender"]["subject"] = subscriber_config["editorial"].get("subject", "Finite News")
+    issue["subscriber_email"] = subscriber_config["email"]
+
+    issue["editorial"]["add_car_talk_credit"] = subscriber_config["editorial"].get("add_car_talk_credit", False)
+    issue["editorial"]["last_headlines_path"] = ""
+    if "editorial" in subscriber_config:
+        if "last_headlines_file" in subscriber_config["editorial"]:
+            issue["editorial"]["last_headlines_path"] = issue["bucket_path"] + subscriber_config["editorial"]["last_headlines_file"]
+    if issue["editorial"]["last_headlines_path"] == "":
+        logging.warning("No last_headlines_path. Not logging/updating yesterday's headlines")
+    
+    issue["news_sources"] = filter_sources(
+        publication_config["news_catalog"],
+        subscriber_config.get("sources", {}).get("news_categories", []),
+        "category"
+    )
+    issue["events_sources"] = load_events_config(publication_config["events_catalog"], subscriber_config["sources"])
+    issue["stocks"] = load_stocks_config(subscriber_config["sources"])
+    issue["nba_teams"] = subscriber_config.get("nba_teams", None)
+    if "forecast" in issue:
+        issue["forecast"] = subscriber_config.get("forecast", None)
+        if issue["forecast"]:
+            issue["forecast"]["api_snooze_bar"] = publication_config["forecast"].get("api_snooze_bar", None)
+    else:
+        issue["forecast"] = None
+        
+    issue["slogans"] = subscriber_config["slogans"]
+    issue["thoughts_of_the_day"] = subscriber_config.get("thoughts_of_the_day", [])
+    if subscriber_config["editorial"].get("add_shared_thoughts", False):
+        issue["thoughts_of_the_day"] + publication_config["thoughts_of_the_day"] 
+    return issue
+
+
+def load_subscriber_configs(dev_mode, disable_gpt):
+    """Create the config file needed to generate each issue, combining publication and subscriber settings.
+    
+    ARGUMENTS
+    dev_mode (bool): If True we're in development or debug mode, so don't send emails or modify headline_logs.
+    disable_gpt (bool): If True, don't call the GPT API and incur costs, for example during dev or debug cycles.
+
+    RETURNS
+    subscriber_configs (list): issue_config for each subscriber we need to generate an issue for
+    """ 
+    
+    publication_config = load_publication_config(dev_mode=dev_mode, disable_gpt=disable_gpt)    
+    subscriber_list = get_subscriber_list(publication_config["bucket_path"])
+    parsed = load_config_files(publication_config["bucket_path"], subscriber_list)
+    subscriber_configs = [
+        load_subscriber_config(subscriber_config_file_name, publication_config, parsed[subscriber_config_file_name])
+        for subscriber_config_file_name in subscriber_list
+    ]
+    # Sort subscribers so the "admins" go last. 
+    # Allows the admin email issue(s) to include logging warnings from the non-admin issues.
+    subscriber_configs = sorted(subscriber_configs , key=lambda x: x["admin"]) 
+    return subscriber_configs
+
+
+def iter_subscriber_configs(dev_mode, disable_gpt, on_loaded=None):
+    """Yield the config for each issue as soon as the subscriber's config file is read and parsed,
+    so creating the first issues overlaps with loading the rest.
+    
+    NOTE
+    Admin issues are held back and yielded last, so they can include logging warnings from the non-admin issues.
+    A subscriber whose config can't be loaded is logged (for the admin issue) and skipped, since other issues may already be out.
+    
+    ARGUMENTS
+    dev_mode (bool): If True we're in development or debug mode, so don't send emails or modify headline_logs.
+    disable_gpt (bool): If True, don't call the GPT API and incur costs, for example during dev or debug cycles.
+    on_loaded (function): Optional, called with the list of every issue config once they're all loaded, before the admin issues are yielded.
+        For example, to log the fetch plan in time for the admin issue
+
+    YIELDS
+    issue_config (ChainMap): Settings for the next issue to create
+    """
+    
+    publication_config = load_publication_config(dev_mode=dev_mode, disable_gpt=disable_gpt)
+    subscriber_list = get_subscriber_list(publication_config["bucket_path"])
+    admin_configs = []
+    loaded_configs = [] # Only kept for on_loaded
+    for subscriber_config_file_name, subscriber_config in iter_config_files(publication_config["bucket_path"], subscriber_list):
+        try:
+            issue_config = load_subscriber_config(subscriber_config_file_name, publication_config, subscriber_config)
+        except Exception as e:
+            logging.critical(f"{subscriber_config_file_name}: Couldn't load subscriber config. {str(type(e))}, {str(e)}")
+            continue
+        if on_loaded:
+            loaded_configs.append(issue_config)
+        if issue_config["admin"]:
+            admin_configs.append(issue_config)
+        else:
+            yield issue_config
+    if on_loaded:
+        on_loaded(loaded_configs)
+    yield from admin_configs
@@ -0,0 +1,557 @@
+"""🧩 Parsing: Turn downloaded web pages into headlines, with a choice of HTML parser
+
+PARSERS
+    - html.parser: BeautifulSoup with Python's built-in parser. The default. Slowest, but needs nothing else installed
+    - lxml: BeautifulSoup with the lxml parser. Same soup, built faster
+    - selectolax: The lexbor parser, without BeautifulSoup. Fastest. Used for headline recipes; calendars use lxml instead
+
+Choose for every source with `html_parser` in the `fetching` section of publication_config.yml,
+or for one source with `html_parser` in that source's settings.
+If a parser isn't installed, Finite News warns once and uses html.parser.
+
+Every recipe style finds the same headlines with each parser on well-formed pages. On broken markup, like unclosed tags,
+lxml and selectolax repair the page the way a browser does, which can differ from html.parser. Check a source with
+benchmarks/parser_benchmark.py on a saved copy of its page before switching it.
+
+API sources return JSON. With ijson installed (pip install finite_news[parsers]), each response is parsed
+as it downloads, and only until the source's max_headlines are found.
+"""
+
+import codecs
+import json
+import logging
+
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+
+from finite_news.planning import source_key
+
+PARSERS = ["html.parser", "lxml", "selectolax"]
+PARSING = {"default": "html.parser"}
+PARSER_MODULES = {"lxml": "lxml", "selectolax": "selectolax.lexbor"}
+PARSERS_AVAILABLE = {"html.parser": True}
+
+
+def configure_parsing(fetching_config=None):
+    """Set the parser used by sources that don't choose their own.
+
+    ARGUMENTS
+    fetching_config (dict): Optional, the publication's `fetching` settings
+
+    RETURNS
+    None
+    """
+
+    PARSING["default"] = (fetching_config or {}).get("html_parser", "html.parser")
+
+
+def parser_available(parser):
+    """Helper function to check, once per run, whether a parser's library is installed.
+
+    ARGUMENTS
+    parser (str): One of PARSERS
+
+    RETURNS
+    available (bool): True if it can be used
+    """
+
+    if parser not in PARSERS_AVAILABLE:
+        if parser not in PARSER_MODULES:
+            logging.warning(f"Unknown html_parser {parser}. Using html.parser. Choose from: {', '.join(PARSERS)}")
+            PARSERS_AVAILABLE[parser] = False
+        else:
+            try:
+                __import__(PARSER_MODULES[parser])
+                PARSERS_AVAILABLE[parser] = True
+            except ImportError:
+                logging.warning(f"html_parser {parser} isn't installed. Using html.parser. To install: pip install {parser}")
+                PARSERS_AVAILABLE[parser] = False
+    return PARSERS_AVAILABLE[parser]
+
+
+def choose_parser(source=None, soup=False):
+    """Pick the parser for a source: its own choice, or else the publication's.
+
+    ARGUMENTS
+    source (dict): Optional, description of the website to scrape
+    soup (bool): Does the caller need a BeautifulSoup object? If so, selectolax is swapped for lxml
+
+    RETURNS
+    parser (str): One of PARSERS that is installed
+    """
+
+    parser = (source or {}).get("html_parser") or PARSING["default"]
+    if soup and parser == "selectolax":
+        parser = "lxml"
+    return parser if parser_available(parser) else "html.parser"
+
+
+def make_soup(markup, parser="html.parser", parse_only=None):
+    """Parse HTML into a BeautifulSoup object.
+
+    ARGUMENTS
+    markup (str): The HTML
+    parser (str): "html.parser" or "lxml"
+    parse_only (SoupStrainer): Optional, keep only the elements it matches, and what's inside them
+
+    RETURNS
+    soup (BeautifulSoup object): The parsed HTML
+    """
+
+    return BeautifulSoup(markup, parser, parse_only=parse_only)
+
+
+def select_headlines_from_soup(soup, recipe):
+    """Find the raw headlines in a page, following the source's recipe, with BeautifulSoup.
+
+    ARGUMENTS
+    soup (BeautifulSoup object): The parsed page
+    recipe (SourceRecipe): How to find the source's headlines
+
+    NOTE
+    The whole page is parsed into the soup first. After that, matching elements are found one at a time, as the caller
+    asks for them, so a caller that stops at max_headlines skips searching and reading the rest of the soup.
+
+    RETURNS
+    headlines (iterator of str): The text of each element found, before cleaning, read as it's needed
+    """
+
+    if recipe.strategy == "select_query":
+        headlines = recipe.selector.iselect(soup) # Like select(), one match at a time
+        headlines = (headline.contents[0] for headline in headlines)
+    elif recipe.strategy == "tag_next":
+        headlines = soup.find_all(recipe.tag, {"class":recipe.tag_class})
+        headlines = headlines[0].findNext(recipe.tag_next).get_text()
+        headlines = (headline for headline in headlines.split(recipe.split_char) if headline)
+    elif recipe.strategy == "tag_class":
+        headlines = (node for node in soup.descendants if isinstance(node, Tag) and recipe.matches(node)) # Like find_all(), one match at a time
+        headlines = (headline.contents[0] for headline in headlines)
+    else:
+        headlines = (node for node in soup.descendants if isinstance(node, Tag) and recipe.matches(node))
+        headlines = (headline.get_text() for headline in headlines)
+    return headlines
+
+
+def first_child_text(node):
+    """Helper function for selectolax. Like node.contents[0] in BeautifulSoup, when that first child is text.
+
+    NOTE
+    As with BeautifulSoup, the recipe only works if the element starts with text.
+
+    ARGUMENTS
+    node (selectolax node): An element
+
+    RETURNS
+    text (str): The text before the element's first child tag
+    """
+
+    child = node.child
+    if child is None:
+        raise IndexError(f"<{node.tag}> is empty")
+    if child.tag != "-text":
+        raise TypeError(f"<{node.tag}> begins with <{child.tag}>, not text")
+    return child.text(deep=False)
+
+
+def class_selector(tag, tag_class):
+    """Helper function for selectolax. Write a CSS selector that matches like BeautifulSoup's find_all(tag, {"class": tag_class}).
+
+    ARGUMENTS
+    tag (str): The element name
+    tag_class (str): One class name, or a string of several to match exactly
+
+    RETURNS
+    selector (str): The CSS selector
+    """
+
+    quoted = tag_class.replace("\\", "\\\\").replace('"', '\\"')
+    if " " in tag_class.strip():
+        return f'{tag}[class="{quoted}"]' # BeautifulSoup matches a multi-class string against the whole attribute
+    return f'{tag}[class~="{quoted}"]'
+
+
+def class_matcher(tag_class):
+    """Helper function to match an element's class attribute like BeautifulSoup's find_all(tag, {"class": tag_class}).
+
+    NOTE
+    One class name matches any element that has that class, among others. A string of several matches the whole attribute exactly.
+    A plain string in a SoupStrainer isn't enough: while the page is being strained, BeautifulSoup compares it with the
+    attribute as one string, like "story big", so elements with more than one class would be dropped.
+
+    ARGUMENTS
+    tag_class (str): One class name, or a string of several to match exactly
+
+    RETURNS
+    matches (function): Takes the class attribute (str, list of str, or None) and returns True if it matches
+    """
+
+    names = tag_class.split()
+
+    def matches(value):
+        if value is None:
+            return False
+        value = " ".join(value) if isinstance(value, list) else value
+        return names[0] in value.split() if len(names) == 1 else value == tag_class
+
+    return matches
+
+
+def find_next(tree, node, tag):
+    """Helper function for selectolax. Like node.findNext(tag) in BeautifulSoup: the first tag after node in document order.
+
+    ARGUMENTS
+    tree (LexborHTMLParser): The parsed page
+    node (selectolax node): Where to start looking
+    tag (str): The element name to find
+
+    RETURNS
+    next_node (selectolax node): The next matching element
+    """
+
+    passed = False
+    for candidate in tree.root.traverse(include_text=False):
+        if passed and candidate.tag == tag:
+            return candidate
+        if candidate == node:
+            passed = True
+    raise AttributeError(f"No <{tag}> after <{node.tag}>")
+
+
+def select_headlines_from_selectolax(markup, recipe):
+    """Find the raw headlines in a page, following the source's recipe, with selectolax.
+
+    ARGUMENTS
+    markup (str): The page's HTML
+    recipe (SourceRecipe): How to find the source's headlines
+
+    RETURNS
+    headlines (iterator of str): The text of each element found, before cleaning. Same as select_headlines_from_soup()
+    """
+
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(markup)
+    nodes = tree.css(recipe.css)
+    if recipe.strategy == "tag_next":
+        headlines = find_next(tree, nodes[0], recipe.tag_next).text(deep=True)
+        headlines = (headline for headline in headlines.split(recipe.split_char) if headline)
+    elif recipe.strategy == "tag":
+        headlines = (node.text(deep=True) for node in nodes)
+    else:
+        headlines = (first_child_text(node) for node in nodes)
+    return headlines
+
+
+def select_headlines(markup, recipe):
+    """Find the raw headlines in a page, following the source's recipe, with the source's parser.
+
+    NOTE
+    With lxml, only the elements the recipe reads are built into the soup, when the recipe allows it. See SourceRecipe.strainer.
+
+    ARGUMENTS
+    markup (str): The page's HTML
+    recipe (SourceRecipe): How to find the source's headlines
+
+    RETURNS
+    headlines (iterator of str): The text of each element found, before cleaning, read as it's needed
+    """
+
+    parser = choose_parser(recipe.source)
+    if parser == "selectolax":
+        return select_headlines_from_selectolax(markup, recipe)
+    strainer = recipe.strainer if parser == "lxml" else None
+    return select_headlines_from_soup(make_soup(markup, parser, strainer), recipe)
+
+
+# JSON
+JSON_STREAMING = {"available": None} # Is ijson installed? Checked once per run
+
+
+class ChunkReader:
+    """A file-like view of an iterator of bytes, like response.iter_content(), so ijson can read a response as it downloads."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def json_streaming_available():
+    """Helper function to check, once per run, whether ijson is installed for streaming JSON.
+
+    RETURNS
+    available (bool): True if ijson can be imported
+    """
+
+    if JSON_STREAMING["available"] is None:
+        try:
+            import ijson # noqa: F401
+            JSON_STREAMING["available"] = True
+        except ImportError:
+            logging.info("ijson isn't installed, so API responses are read whole. To stream them: pip install ijson")
+            JSON_STREAMING["available"] = False
+    return JSON_STREAMING["available"]
+
+
+def get_json_field(value, path):
+    """Helper function to follow a path of keys and list positions, like "headline.main" or "multimedia.0.caption", into parsed JSON.
+
+    ARGUMENTS
+    value (dict, list or other): Parsed JSON
+    path (str): Keys separated by dots. A number means that position in a list. "" = the value itself
+
+    RETURNS
+    value (dict, list, str, float or None): What's at the path. None if the path isn't there
+    """
+
+    for part in path.split(".") if path else []:
+        if isinstance(value, dict):
+            value = value.get(part)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return None
+    return value
+
+
+def select_json_headlines(chunks, results_path, headline_field, max_headlines=None):
+    """Find the headlines in an API's JSON response, reading only as far as needed.
+
+    NOTE
+    With ijson installed, the response is parsed as it downloads: one result at a time, and
+    only until max_headlines are found. Without it, the whole response is parsed first.
+
+    ARGUMENTS
+    chunks (iterator of bytes): The response body, like response.iter_content()
+    results_path (str): Path to the list of results, like "results" or "response.docs". Keys only. "" = the response is the list
+    headline_field (str): Path within each result to its headline, like "title" or "headline.main". See get_json_field()
+    max_headlines (int): Optional, stop after this many headlines
+
+    RETURNS
+    headlines (list of str): Each result's headline, skipping results without one
+    """
+
+    if json_streaming_available():
+        import ijson
+        results = ijson.items(ChunkReader(chunks), f"{results_path}.item" if results_path else "item", use_float=True)
+    else:
+        results = get_json_field(json.loads(b"".join(chunks)), results_path) or []
+    headlines = []
+    for result in results:
+        headline = get_json_field(result, headline_field)
+        if headline:
+            headlines.append(headline)
+            if max_headlines and len(headlines) == max_headlines:
+                break
+    return headlines
+
+
+# Recipes
+SOURCE_TYPES = {"headlines": ["scrape", "api"], "events_calendar": ["scrape"]}
+REQUIRED_FIELDS = {
+    ("headlines", "scrape"): ["url"],
+    ("headlines", "api"): ["url", "api_key_name", "headline_field"],
+    ("events_calendar", "scrape"): ["url_base", "window", "event_item_tag", "event_list_class"],
+}
+NUMBER_FIELDS = ["min_words", "max_headlines", "max_events", "window", "budget_seconds", "max_bytes"]
+RECIPES = {} # SourceRecipe for each source's settings, by (source_key(), default parser). Kept for the whole process, so reruns with the same settings skip compiling
+
+
+class SourceRecipe:
+    """A source's settings, checked once and prepared for finding and cleaning its content.
+
+    NOTE
+    Raises ValueError, listing every problem, if the source's settings can't work.
+    """
+
+    def __init__(self, source, default_parser="html.parser"):
+        problems = find_recipe_problems(source, default_parser)
+        if problems:
+            raise ValueError(f"{source.get('name', 'A source')}: {'; '.join(problems)}")
+        self.source = source
+        self.name = source["name"]
+        self.tag = source.get("tag")
+        self.tag_class = source.get("tag_class")
+        self.class_matches = class_matcher(self.tag_class) if self.tag_class else None # See class_matcher()
+        self.tag_next = source.get("tag_next")
+        self.split_char = source.get("split_char")
+        self.must_contain = source["must_contain"].lower() if "must_contain" in source else None
+        self.heal_inner_n = "heal_inner_n" in source
+        self.min_words = source.get("min_words")
+        self.max_headlines = source.get("max_headlines")
+        self.selector = None # Compiled CSS for BeautifulSoup
+        self.css = None # CSS for selectolax
+        self.strainer = None # Matches the elements the recipe reads. With lxml, only they're built into the soup
+
+        if source["type"] != "headlines" or source["method"] != "scrape":
+            self.strategy = f"{source['type']} {source['method']}"
+        elif "select_query" in source:
+            import soupsieve
+            self.strategy = "select_query"
+            self.selector = soupsieve.compile(source["select_query"])
+            self.css = source["select_query"]
+        elif "tag_next" in source:
+            self.strategy = "tag_next"
+            self.css = class_selector(self.tag, self.tag_class)
+        elif "tag_class" in source:
+            self.strategy = "tag_class"
+            self.css = class_selector(self.tag, self.tag_class)
+            self.strainer = SoupStrainer(self.tag, {"class":self.class_matches})
+        else:
+            self.strategy = "tag"
+            self.css = self.tag
+            self.strainer = SoupStrainer(self.tag)
+        # select_query can depend on an element's ancestors, and tag_next reads past the element, so they need the whole page.
+        # The strainer is only used with lxml: it closes unclosed tags before BeautifulSoup sees them. With html.parser,
+        # BeautifulSoup closes them itself, using the surrounding elements a strainer would drop, so a broken page could
+        # give different headlines.
+
+    def matches(self, node):
+        """Does an element have the recipe's tag and tag_class? Like find_all(tag, {"class": tag_class}).
+
+        ARGUMENTS
+        node (bs4.Tag): An element of the soup
+
+        RETURNS
+        matches (bool): True if the recipe reads it
+        """
+
+        if node.name != self.tag:
+            return False
+        return self.class_matches is None or self.class_matches(node.get("class"))
+
+
+def find_recipe_problems(source, default_parser="html.parser"):
+    """Check a source's settings for mistakes that would make it fail when it's fetched.
+
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+    default_parser (str): The publication's html_parser, for sources that don't choose their own
+
+    RETURNS
+    problems (list of str): What's wrong. Empty if nothing
+    """
+
+    problems = []
+    if "name" not in source:
+        problems.append("missing name")
+    source_type, method = source.get("type"), source.get("method")
+    if source_type not in SOURCE_TYPES:
+        problems.append(f"type must be one of {', '.join(SOURCE_TYPES)}, not {source_type}")
+    elif method not in SOURCE_TYPES[source_type]:
+        problems.append(f"method for {source_type} must be one of {', '.join(SOURCE_TYPES[source_type])}, not {method}")
+    else:
+        problems += [f"missing {field}" for field in REQUIRED_FIELDS[(source_type, method)] if field not in source]
+    problems += [
+        f"{field} must be a number, not {source[field]!r}"
+        for field in NUMBER_FIELDS
+        if field in source and (isinstance(source[field], bool) or not isinstance(source[field], (int, float)))
+    ]
+    if "html_parser" in source and source["html_parser"] not in PARSERS:
+        problems.append(f"html_parser must be one of {', '.join(PARSERS)}, not {source['html_parser']}")
+    if "must_contain" in source and not isinstance(source["must_contain"], str):
+        problems.append("must_contain must be text")
+    if source_type == "headlines" and method == "api":
+        problems += [f"{field} must be text" for field in ["headline_field", "results_path"] if field in source and not isinstance(source[field], str)]
+        if any(part.isdigit() for part in str(source.get("results_path", "")).split(".")):
+            problems.append("results_path can only have keys, not list positions")
+    if "encoding" in source:
+        try:
+            codecs.lookup(str(source["encoding"]))
+        except LookupError:
+            problems.append(f"encoding {source['encoding']} isn't a known character set")
+
+    if source_type == "headlines" and method == "scrape":
+        if "select_query" in source:
+            problems += find_selector_problems(source["select_query"], source.get("html_parser") or default_parser)
+        elif "tag" not in source:
+            problems.append("needs a select_query or a tag")
+        next_fields = [field for field in ["tag_class", "tag_next", "split_char"] if field in source]
+        if ("tag_next" in source or "split_char" in source) and len(next_fields) < 3:
+            problems.append("tag_next needs tag_class and split_char, and the other way around")
+    return problems
+
+
+def find_selector_problems(select_query, parser):
+    """Helper function to check that a CSS selector can be compiled by the parsers that may use it.
+
+    ARGUMENTS
+    select_query (str): The CSS selector
+    parser (str): The html_parser the source will use
+
+    RETURNS
+    problems (list of str): What's wrong. Empty if nothing
+    """
+
+    import soupsieve
+
+    problems = []
+    try:
+        soupsieve.compile(select_query) # Needed even with selectolax, in case it isn't installed
+    except Exception as e:
+        problems.append(f"select_query {select_query!r} isn't valid CSS: {str(e).splitlines()[0]}")
+    if parser == "selectolax" and parser_available(parser):
+        from selectolax.lexbor import LexborHTMLParser
+        try:
+            LexborHTMLParser("").css(select_query)
+        except Exception as e:
+            problems.append(f"select_query {select_query!r} isn't supported by selectolax: {str(e)}")
+    return problems
+
+
+def get_recipe(source):
+    """Get a source's compiled recipe, compiling it the first time it's used.
+
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+
+    RETURNS
+    recipe (SourceRecipe): The source's recipe
+    """
+
+    key = (source_key(source), PARSING["default"])
+    if key not in RECIPES:
+        RECIPES[key] = SourceRecipe(source, PARSING["default"])
+    return RECIPES[key]
+
+
+def compile_recipes(sources, fetching_config=None):
+    """Check and compile every source's recipe, when the publication's settings are loaded, so mistakes stop the run before any fetching.
+
+    NOTE
+    Sources of a type Finite News doesn't know, like the old `screenshot` sources, aren't checked. As before,
+    they're skipped with a warning when they're researched, instead of stopping every issue.
+
+    ARGUMENTS
+    sources (list of dict): The publication's news and events sources
+    fetching_config (dict): Optional, the publication's `fetching` settings
+
+    RETURNS
+    recipes (list of SourceRecipe): One per source of a known type
+    """
+
+    default_parser = (fetching_config or {}).get("html_parser", "html.parser")
+    recipes = []
+    problems = []
+    for source in sources:
+        if source.get("type") not in SOURCE_TYPES:
+            continue
+        key = (source_key(source), default_parser)
+        try:
+            if key not in RECIPES:
+                RECIPES[key] = SourceRecipe(source, default_parser)
+            recipes.append(RECIPES[key])
+        except ValueError as e:
+            problems.append(str(e))
+    if problems:
+        raise ValueError("Malformed sources in publication_config.yml:\n" + "\n".join(problems))
+    return recipes
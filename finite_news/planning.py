@@ -0,0 +1,111 @@
+"""🗺️ Planning: Work out everything today's issues need from the outside world, before fetching any of it"""
+
+import hashlib
+import json
+import logging
+
+
+def source_key(source):
+    """Make a fingerprint of a source config, so identical sources selected by different subscribers are recognized as one.
+
+    ARGUMENTS
+    source (dict): Description of a source, forecast location, or other resource to fetch
+
+    RETURNS
+    key (str): A hash of the source's settings, independent of key order
+    """
+
+    return hashlib.sha1(json.dumps(dict(source), sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def plan_fetches(issue_configs):
+    """Walk every issue's config and combine what they need into one de-duplicated fetch plan.
+
+    ARGUMENTS
+    issue_configs (list of dict): The settings for each of today's issues, from load_subscriber_configs()
+
+    RETURNS
+    plan (dict): Each resource to fetch exactly once today, with keys for:
+        - news_sources (dict): For each category, the unique news sources in it
+        - events_sources (list of dict): The unique event sources due today
+        - tickers (list of str): The unique stock tickers
+        - ticker_sets (list of list of str): The unique sets of tickers to plot together
+        - forecasts (list of dict): The unique forecast locations
+        - nba_teams (list of str): The unique NBA teams tracked
+        - naive_counts (dict): How many of each resource we'd fetch if every issue fetched its own
+    """
+
+    news_sources = {}
+    events_sources = {}
+    ticker_sets = {}
+    forecasts = {}
+    nba_teams = {}
+    naive_counts = {"news_sources": 0, "events_sources": 0, "tickers": 0, "forecasts": 0, "nba_schedules": 0}
+
+    for issue_config in issue_configs:
+        for source in issue_config["news_sources"]:
+            news_sources.setdefault(source.get("category"), {})[source_key(source)] = source
+        naive_counts["news_sources"] += len(issue_config["news_sources"])
+
+        for source in issue_config["events_sources"]:
+            events_sources[source_key(source)] = source
+        naive_counts["events_sources"] += len(issue_config["events_sources"])
+
+        for tickers in issue_config["stocks"]:
+            ticker_sets[tuple(tickers)] = tickers
+            naive_counts["tickers"] += len(tickers)
+
+        if issue_config["forecast"]:
+            forecasts[source_key(issue_config["forecast"])] = issue_config["forecast"]
+            naive_counts["forecasts"] += 1
+
+        for team in issue_config["nba_teams"] or []:
+            nba_teams[team] = team
+            naive_counts["nba_schedules"] += 1 # get_todays_nba_game() downloads the league schedule once per team
+
+    return {
+        "news_sources": {category: list(sources.values()) for category, sources in news_sources.items()},
+        "events_sources": list(events_sources.values()),
+        "tickers": sorted({ticker for tickers in ticker_sets.values() for ticker in tickers}),
+        "ticker_sets": list(ticker_sets.values()),
+        "forecasts": list(forecasts.values()),
+        "nba_teams": list(nba_teams.values()),
+        "naive_counts": naive_counts,
+    }
+
+
+def count_plan(plan):
+    """Compare how many fetches the plan needs with how many the issues would make on their own.
+
+    ARGUMENTS
+    plan (dict): The fetch plan from plan_fetches()
+
+    RETURNS
+    counts (dict): For each resource, a tuple of (planned fetches, naive fetches)
+    """
+
+    planned = {
+        "news_sources": sum(len(sources) for sources in plan["news_sources"].values()),
+        "events_sources": len(plan["events_sources"]),
+        "tickers": len(plan["tickers"]),
+        "forecasts": len(plan["forecasts"]),
+        "nba_schedules": 1 if plan["nba_teams"] else 0, # One schedule covers every team
+    }
+    return {resource: (planned[resource], plan["naive_counts"][resource]) for resource in planned}
+
+
+def log_fetch_plan(plan):
+    """Report the size of the fetch plan versus fetching separately for every issue.
+
+    ARGUMENTS
+    plan (dict): The fetch plan from plan_fetches()
+
+    RETURNS
+    None
+    """
+
+    counts = count_plan(plan)
+    total_planned = sum(planned for planned, _ in counts.values())
+    total_naive = sum(naive for _, naive in counts.values())
+    details = ", ".join([f"{resource} {planned} (vs {naive})" for resource, (planned, naive) in counts.items()])
+    logging.warning(f"Fetch plan: {total_planned} fetches instead of {total_naive}. {details}") # Warning, like the other stats, so it reaches the admin issue
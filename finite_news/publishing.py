@@ -0,0 +1,358 @@
+"""📰 Publishing: Orchestrate and deliver the news"""
+
+from datetime import date, datetime
+import logging
+import traceback
+
+from tqdm.auto import tqdm
+
+from finite_news.content_store import configure_content_store, log_content_store_stats, start_content_store, use_content_store
+from finite_news.design import format_issue
+from finite_news.editorial import collect_all_headlines, edit_headlines, edit_nba_headlines, log_headlines
+from finite_news.fetching import configure_http, log_http_stats, start_fetch_clock
+from finite_news.health import configure_source_health, reset_source_health, save_source_health, source_health_rows
+from finite_news.loading import get_fn_secret, init_logging, iter_subscriber_configs, load_subscriber_configs, reset_selection_warnings
+from finite_news.parsing import configure_parsing
+from finite_news.planning import log_fetch_plan, plan_fetches
+from finite_news.reporting import get_forecast, get_screenshots, get_stocks_plot, get_todays_nba_game, log_research_cache_stats, research_sources, reset_research_cache
+from finite_news.storage import clear_storage_caches
+
+
+def email_issue(sender, subscriber_email, html, images):
+    """Send issue of Finite News to a subscriber by email using the SendGrid API service.
+    
+    NOTE
+    Requires a secret in AWS Secret Manager for SENDGRID_API_KEY
+    
+    ARGUMENTS
+    sender (dict): Metadata about the email source, with keys for "subject" and "email"
+    subscriber_email (str): The email address for the destination
+    html (str): The issue content
+    images (list): Optional, png images to attach to the email
+    
+    RETURNS
+    None
+    """
+    
+    from sendgrid import Attachment, SendGridAPIClient # Not needed in dev mode, which writes issues to a file instead
+    from sendgrid.helpers.mail import Mail
+
+    today = date.today().strftime("%m.%d.%y").lstrip("0")
+    message = Mail(
+        from_email=sender["email"],
+        to_emails=subscriber_email,
+        subject=f"{sender['subject']} for {today}",
+        html_content=html
+    )
+    attachments = []
+    for i, image in enumerate(images):
+        attachedFile = Attachment(
+            disposition='inline',
+            file_name=f'image_{i}.png',
+            file_type='image/png',
+            file_content=image,
+            content_id=f'image_{i}',
+        )
+        attachments.append(attachedFile)
+    message.attachment = attachments
+    try:
+        sendgrid_key = get_fn_secret('SENDGRID_API_KEY')
+        sg = SendGridAPIClient(sendgrid_key)
+        response = sg.send(message)
+        if response.status_code==202:
+            logging.info(f"{subscriber_email}: Extry extry! Email is away!")
+    except Exception as e:
+        logging.critical(f"{subscriber_email}: Error in send_email: {str(type(e))}, {str(e)}") # Admin issue will get this logging line in its email about failures in prior, non-admin issues.
+
+        
+def write_issue_to_file(subscriber_name, html):
+    """Append issue html to local .txt file of day's issues, creating file if it doesn't exist.
+    
+    ARGUMENTS
+    subscriber_name (str): The name (or email address) of the issue's recipient, to categorize a day's issues
+    html (str): The content of the issue
+    
+    RETURNS
+    None
+    
+    """
+    with open(f"issues_for_{datetime.now().strftime('%m-%d-%y')}.txt", "a") as f:
+        f.write(f"""{subscriber_name}\n{datetime.now().strftime('%m-%d-%y %H:%M:%S')}\n{html}\n--------------------------------------------\n""")
+    logging.info(f"{subscriber_name}: Extry extry! Wrote to text file.")
+
+
+def deliver_issue(issue_config, html, images):
+    """Send the content of Finite News to one subscriber by the selected method
+
+    ARGUMENTS
+    issue_config (dict): The settings for the issue
+    html (str): The content of the email formatted for the email
+    images (list): Optional, images to attach to the image
+    
+    RETURNS
+    None
+    """
+    logging.info(f"{issue_config['subscriber_email']}: Starting deliver_issue()")
+    if issue_config["email_delivery"]:
+        email_issue(
+            issue_config["sender"],
+            issue_config["subscriber_email"],
+            html,
+            images
+        )
+    else: 
+        write_issue_to_file(subscriber_name=issue_config["subscriber_email"], html=html)
+
+
+def configure_fetching(issue_config):
+    """Apply the publication's fetching settings, before researching. Safe to call for every issue.
+    
+    ARGUMENTS
+    issue_config (dict): The settings for an issue
+    
+    RETURNS
+    None
+    """
+    
+    configure_http(issue_config.get("fetching"), issue_config["bucket_path"])
+    configure_parsing(issue_config.get("fetching"))
+    configure_source_health(issue_config["bucket_path"], issue_config.get("fetching"))
+    configure_content_store(issue_config["bucket_path"], issue_config.get("fetching"))
+
+
+def prefetch_content(issue_configs, dev_mode=False):
+    """Fetch everything today's issues need into the content store, once each, ahead of building the issues.
+    
+    ARGUMENTS
+    issue_configs (list of dict): The settings for each of today's issues
+    dev_mode (bool): If we're in dev/debug, output plots to local files too.
+    
+    RETURNS
+    plan (dict): What was fetched, from plan_fetches()
+    """
+    
+    plan = plan_fetches(issue_configs)
+    if not issue_configs:
+        return plan
+    configure_fetching(issue_configs[0]) # The fetching settings are the publication's, the same for every issue
+    fetching_config = issue_configs[0].get("fetching")
+    research_sources([source for sources in plan["news_sources"].values() for source in sources], fetching_config=fetching_config)
+    research_sources(plan["events_sources"], return_html=True, fetching_config=fetching_config)
+    for forecast_config in plan["forecasts"]:
+        use_content_store("forecast", forecast_config, lambda: get_forecast(forecast_config))
+    for nba_team in plan["nba_teams"]:
+        use_content_store("nba_game", nba_team, lambda: get_todays_nba_game(nba_team))
+    for tickers_set in plan["ticker_sets"]:
+        use_content_store("stocks_plot", tickers_set, lambda: get_stocks_plot(tickers_set, dev_mode))
+    return plan
+
+
+def research_issue(issue_config, dev_mode=False):
+    """Gather the raw content for one subscriber's issue, before any editing.
+    
+    ARGUMENTS
+    issue_config (dict): The settings for the issue
+    dev_mode (bool): If we're in dev/debug, output plots to local files too.
+    
+    RETURNS
+    research (dict): The issue's content, with keys for:
+        - headlines (list of str): NBA and news headlines, unedited
+        - forecast (dict or None)
+        - events_html (str or None)
+        - stock_plots (list of base64)
+        - screenshots (list)
+    """
+    
+    configure_fetching(issue_config)
+
+    # Get tonight's NBA games for tracked teams
+    if issue_config["nba_teams"]:
+        nba_headlines = [use_content_store("nba_game", nba_team, lambda: get_todays_nba_game(nba_team)) for nba_team in issue_config["nba_teams"]]
+        nba_headlines = edit_nba_headlines(nba_headlines, issue_config["nba_teams"])
+    else:
+        nba_headlines = []
+
+    # Get News headlines
+    news_headlines = research_sources(issue_config["news_sources"], fetching_config=issue_config.get("fetching"))
+    news_headlines = nba_headlines + collect_all_headlines(news_headlines)
+
+    if issue_config["forecast"]:
+        forecast = use_content_store("forecast", issue_config["forecast"], lambda: get_forecast(issue_config["forecast"]))
+    else:
+        forecast = None
+        
+    # Get Events section in HTML, if requested by subscriber
+    if len(issue_config["events_sources"])>0:
+        events_html = research_sources(issue_config["events_sources"], return_html=True, fetching_config=issue_config.get("fetching"))
+    else:
+        events_html = None
+
+    # Get Stock plot images, if requested by subscriber 
+    stock_plots = []
+    if len(issue_config["stocks"])>0:
+        for tickers_set in issue_config["stocks"]:
+            stock_plots.append(use_content_store("stocks_plot", tickers_set, lambda: get_stocks_plot(tickers_set, dev_mode)))
+
+    screenshots = get_screenshots([source for source in issue_config["news_sources"] if source["type"]=="screenshot"])
+
+    return {
+        "headlines": news_headlines,
+        "forecast": forecast,
+        "events_html": events_html,
+        "stock_plots": stock_plots,
+        "screenshots": screenshots,
+    }
+
+
+def edit_issue(issue_config, research, log_today_headlines=True):
+    """Apply the editorial policies to an issue's research.
+    
+    ARGUMENTS
+    issue_config (dict): The settings for the issue
+    research (dict): The issue's raw content from research_issue()
+    log_today_headlines (bool): If False, don't record today's headlines for tomorrow's de-dup, even if the issue_config says to.
+        The staged command line does this later, at delivery, so the edit stage can be rerun.
+    
+    RETURNS
+    content (dict): The research, with "headlines" edited and the unedited ones kept as "original_headlines"
+    """
+    
+    original_headlines = research["headlines"]
+    news_headlines = original_headlines
+    if news_headlines:
+        news_headlines = edit_headlines(
+            raw_headlines=news_headlines,
+            editorial_policies=issue_config["editorial"],
+            gpt_config = issue_config["gpt"]
+        )
+
+    # Log unedited headlines
+    # Do so with originals before removing repeats, cleaning, or applying substance filters.
+        # That way, when checking log for repeats, we compare unedited to unedited (same punctuation etc).
+        # Also GPT filtering is nondeterministic. We need to remove repeats before GPT changes the pool.
+    # But log them _after_ edit_headlines(), which checks the logs and needs to be yesterday's, not today's.
+    if log_today_headlines and issue_config["editorial"]["log_today_headlines"]==True: 
+        log_headlines(original_headlines, issue_config["editorial"]["last_headlines_path"])
+
+    return {**research, "headlines": news_headlines, "original_headlines": original_headlines}
+
+
+def render_issue(issue_config, content, log_stream, source_health=None):
+    """Lay out an issue's edited content as the email.
+    
+    ARGUMENTS
+    issue_config (dict): The settings for the issue
+    content (dict): The issue's edited content from edit_issue()
+    log_stream (StringIO object): In-memory file-like object that collects results from logging during the Finite News run
+    source_health (list of dict): Optional, the sources' health from the fetch stage, if it ran in another process. Default: this run's
+    
+    RETURNS
+    html (str): The content of the email formatted for the email
+    images (list): Optional, images to attach to the image
+    """
+    
+    if issue_config["admin"]:
+        log_research_cache_stats()
+        log_content_store_stats()
+        log_http_stats()
+    images = content["stock_plots"] + content["screenshots"]
+    html = format_issue(
+        issue_config,
+        content["headlines"],
+        content["forecast"],
+        content["events_html"],
+        content["stock_plots"],
+        content["screenshots"],
+        log_stream,
+        (source_health_rows() if source_health is None else source_health) if issue_config["admin"] else None
+    )
+    return html, images
+
+
+def create_issue(issue_config, log_stream, dev_mode=False):   
+    """Populate the content of Finite News customized for one subscriber
+    
+    ARGUMENTS
+    issue_config (dict): The settings for the issue
+    log_stream (StringIO object): In-memory file-like object that collects results from logging during the Finite News run
+    dev_mode (bool): If we're in dev/debug, output plots to local files too.
+
+    RETURNS
+    html (str): The content of the email formatted for the email
+    images (list): Optional, images to attach to the image
+    """    
+    
+    logging.info(f"{issue_config['subscriber_email']}: Starting create_issue()")
+    research = research_issue(issue_config, dev_mode)
+    content = edit_issue(issue_config, research)
+    html, images = render_issue(issue_config, content, log_stream)
+    logging.info(f"{issue_config['subscriber_email']}: Finished create_issue()")
+    return html, images
+
+
+def run_finite_news(dev_mode, disable_gpt, logging_level, stream_subscribers=True, from_store=False):
+    """Entry point to create and deliver all of today's issues of Finite News.
+
+    ARGUMENTS
+    dev_mode (bool): If True we're in development or debug mode, so don't send emails or modify headline_logs, and also output plots to local files.
+    disable_gpt (bool): If True, don't call the GPT API and incur costs, for example during dev or debug cycles.
+    logging_level (level from logging library): The deepest granularity of log messages to track
+    stream_subscribers (bool): If True, start creating issues as soon as the first subscriber configs are loaded. If False, load them all first. Either way, the fetch plan is logged for the admin issue.
+    from_store (bool): If True, use the content saved by prefetch_finite_news(), and only fetch what's missing or stale.
+    
+    RETURNS
+    None
+    """
+    
+    log_stream = init_logging(logging_level)
+    start_fetch_clock()
+    clear_storage_caches()
+    reset_research_cache()
+    reset_source_health()
+    reset_selection_warnings()
+    start_content_store("build" if from_store else None)
+    if stream_subscribers:
+        subscriber_configs = iter_subscriber_configs(dev_mode, disable_gpt, on_loaded=lambda issue_configs: log_fetch_plan(plan_fetches(issue_configs)))
+    else:
+        subscriber_configs = load_subscriber_configs(dev_mode, disable_gpt)
+        log_fetch_plan(plan_fetches(subscriber_configs))
+    for subscriber_config in tqdm(subscriber_configs):
+        try:
+            html, images = create_issue(subscriber_config, log_stream, dev_mode)
+            deliver_issue(subscriber_config, html, images)
+        except Exception as e:
+            if dev_mode: # During dev or debugging, raise exception and show traceback in notebook.
+                raise e
+            else: # In prod mode, save traceback for admin's issue, but continue to try to publish the next issue.
+                logging.critical(f"{subscriber_config['subscriber_email']}: Issue failed due to unhandled exception. {traceback.format_exc()}")
+    save_source_health(dev_mode)
+    print("👍")
+
+
+def prefetch_finite_news(dev_mode, disable_gpt, logging_level):
+    """Entry point to fetch the content for all of today's issues ahead of time, for run_finite_news(from_store=True).
+
+    ARGUMENTS
+    dev_mode (bool): If True we're in development or debug mode, so output plots to local files.
+    disable_gpt (bool): Passed on to loading the subscriber configs.
+    logging_level (level from logging library): The deepest granularity of log messages to track
+    
+    RETURNS
+    None
+    """
+    
+    init_logging(logging_level)
+    start_fetch_clock()
+    clear_storage_caches()
+    reset_research_cache()
+    reset_source_health()
+    reset_selection_warnings()
+    start_content_store("prefetch")
+    plan = prefetch_content(load_subscriber_configs(dev_mode, disable_gpt), dev_mode)
+    log_fetch_plan(plan)
+    log_research_cache_stats()
+    log_http_stats()
+    save_source_health(dev_mode)
+    sources = sum(len(sources) for sources in plan["news_sources"].values()) + len(plan["events_sources"])
+    print(f"prefetch: {sources} sources, {len(plan['forecasts'])} forecasts, {len(plan['nba_teams'])} NBA teams, {len(plan['ticker_sets'])} stock plots")
+    print("👍")
@@ -0,0 +1,228 @@
+"""📼 Replay: Record a run's HTTP exchanges, and play them back later without the network
+
+Recording saves every request made through the requests library during a run, and its response, to an archive file.
+That covers news sources, APIs, the NBA schedule, NWS forecasts, event calendars, Yahoo Finance and OpenAI.
+Replaying serves those responses from the archive, optionally with the recorded or a fixed latency, so the whole
+pipeline can be benchmarked and profiled offline, with the same inputs every time.
+
+Secrets in URLs, like API keys, are replaced with their names before anything is saved.
+Not covered: Environment Canada forecasts (aiohttp) and SendGrid (urllib). Use --dev-mode to skip sending emails.
+
+USAGE
+    finite-news run --dev-mode --record fixtures/today.archive
+    finite-news run --dev-mode --replay fixtures/today.archive --replay-latency recorded
+"""
+
+from datetime import timedelta
+import gzip
+import hashlib
+from io import BytesIO
+import logging
+import pickle
+from threading import Lock
+from time import sleep
+
+from finite_news.loading import FN_SECRETS_CACHE
+
+ARCHIVE_FORMAT = 1
+HTTP_ARCHIVE = {
+    "mode": None, # None, "record" or "replay"
+    "path": None,
+    "exchanges": {}, # For each request_key(), the list of responses in the order they were received
+    "served": {}, # In replay, how many responses have been served for each request_key()
+    "latency": None, # In replay: None, "recorded", or seconds
+    "original_send": None,
+}
+HTTP_ARCHIVE_LOCK = Lock()
+DROPPED_HEADERS = ["content-encoding", "content-length", "transfer-encoding"] # The archive stores decoded content
+
+
+def redact_secrets(text):
+    """Helper function to replace the values of loaded secrets with their names, like {NYT_API_KEY}.
+
+    ARGUMENTS
+    text (str): A URL or request body
+
+    RETURNS
+    text (str): The same text without secret values
+    """
+
+    for cached in list(FN_SECRETS_CACHE.values()):
+        for name, value in cached["secrets"].items():
+            if isinstance(value, str) and len(value) >= 8 and value in text:
+                text = text.replace(value, "{" + name + "}")
+    return text
+
+
+def request_key(request):
+    """Helper function to identify a request in the archive, independent of headers and secrets.
+
+    ARGUMENTS
+    request (requests.PreparedRequest): The request
+
+    RETURNS
+    key (str): The method, the redacted URL, and a hash of the redacted body, if any
+    """
+
+    key = f"{request.method} {redact_secrets(request.url)}"
+    if request.body:
+        body = request.body if isinstance(request.body, str) else request.body.decode("utf-8", errors="replace")
+        key += " " + hashlib.sha1(redact_secrets(body).encode("utf-8")).hexdigest()
+    return key
+
+
+def record_send(adapter, request, **kwargs):
+    """Replacement for HTTPAdapter.send while recording: send the request, then save its response.
+
+    ARGUMENTS
+    adapter (HTTPAdapter): The adapter sending the request
+    request (requests.PreparedRequest): The request
+    **kwargs: The rest of HTTPAdapter.send's arguments
+
+    RETURNS
+    response (requests.Response): The live response
+    """
+
+    response = HTTP_ARCHIVE["original_send"](adapter, request, **kwargs)
+    exchange = {
+        "status_code": response.status_code,
+        "reason": response.reason,
+        "headers": {name: value for name, value in response.headers.items() if name.lower() not in DROPPED_HEADERS},
+        "content": response.content,
+        "elapsed_seconds": response.elapsed.total_seconds(),
+    }
+    with HTTP_ARCHIVE_LOCK:
+        HTTP_ARCHIVE["exchanges"].setdefault(request_key(request), []).append(exchange)
+    return response
+
+
+def replay_send(adapter, request, **kwargs):
+    """Replacement for HTTPAdapter.send while replaying: serve the recorded response instead of using the network.
+
+    NOTE
+    If a request was recorded several times, like retries, the responses are served in order, then the last one repeats.
+
+    ARGUMENTS
+    adapter (HTTPAdapter): The adapter that would have sent the request
+    request (requests.PreparedRequest): The request
+    **kwargs: The rest of HTTPAdapter.send's arguments
+
+    RETURNS
+    response (requests.Response): The recorded response
+    """
+
+    import requests
+    from requests.structures import CaseInsensitiveDict
+    from requests.utils import get_encoding_from_headers
+
+    key = request_key(request)
+    with HTTP_ARCHIVE_LOCK:
+        exchanges = HTTP_ARCHIVE["exchanges"].get(key)
+        if not exchanges:
+            raise requests.ConnectionError(f"Not in the HTTP archive {HTTP_ARCHIVE['path']}: {key}", request=request)
+        served = HTTP_ARCHIVE["served"].get(key, 0)
+        HTTP_ARCHIVE["served"][key] = served + 1
+    exchange = exchanges[min(served, len(exchanges) - 1)]
+
+    latency = HTTP_ARCHIVE["latency"]
+    if latency == "recorded":
+        sleep(exchange["elapsed_seconds"])
+    elif latency:
+        sleep(latency)
+
+    response = requests.Response()
+    response.status_code = exchange["status_code"]
+    response.reason = exchange["reason"]
+    response.headers = CaseInsensitiveDict(exchange["headers"])
+    response.encoding = get_encoding_from_headers(response.headers)
+    response._content = exchange["content"]
+    response._content_consumed = True
+    response.raw = BytesIO(exchange["content"])
+    response.url = request.url
+    response.request = request
+    response.connection = adapter
+    response.elapsed = timedelta(seconds=exchange["elapsed_seconds"])
+    return response
+
+
+def start_recording(archive_path):
+    """Start saving every HTTP exchange made through the requests library. Call stop_http_archive() to write the archive.
+
+    ARGUMENTS
+    archive_path (str): Local file to write the archive to
+
+    RETURNS
+    None
+    """
+
+    patch_send(record_send)
+    HTTP_ARCHIVE.update({"mode": "record", "path": archive_path, "exchanges": {}, "served": {}})
+    logging.info(f"Recording HTTP exchanges to {archive_path}")
+
+
+def start_replay(archive_path, latency=None):
+    """Serve HTTP requests made through the requests library from an archive, instead of the network.
+
+    ARGUMENTS
+    archive_path (str): An archive written by a recorded run
+    latency (str or float): Optional, "recorded" to wait as long as each response originally took, or a number of seconds to wait for every response. None = no wait
+
+    RETURNS
+    None
+    """
+
+    with gzip.open(archive_path, "rb") as f:
+        archive = pickle.load(f)
+    if archive.get("format") != ARCHIVE_FORMAT:
+        raise ValueError(f"{archive_path} was recorded by an incompatible version of Finite News. Record it again.")
+    patch_send(replay_send)
+    HTTP_ARCHIVE.update({"mode": "replay", "path": archive_path, "exchanges": archive["exchanges"], "served": {}, "latency": latency})
+    logging.info(f"Replaying HTTP exchanges from {archive_path}: {len(archive['exchanges'])} requests recorded")
+
+
+def patch_send(send):
+    """Helper function to route every requests session through send.
+
+    ARGUMENTS
+    send (function): record_send or replay_send
+
+    RETURNS
+    None
+    """
+
+    from requests.adapters import HTTPAdapter
+
+    if HTTP_ARCHIVE["original_send"] is None:
+        HTTP_ARCHIVE["original_send"] = HTTPAdapter.send
+    HTTPAdapter.send = lambda adapter, request, **kwargs: send(adapter, request, **kwargs)
+
+
+def stop_http_archive():
+    """Stop recording or replaying. When recording, write the archive.
+
+    RETURNS
+    None
+    """
+
+    if HTTP_ARCHIVE["mode"] is None:
+        return
+    from requests.adapters import HTTPAdapter
+
+    HTTPAdapter.send = HTTP_ARCHIVE["original_send"]
+    if HTTP_ARCHIVE["mode"] == "record":
+        with HTTP_ARCHIVE_LOCK:
+            archive = {"format": ARCHIVE_FORMAT, "exchanges": dict(HTTP_ARCHIVE["exchanges"])}
+        with gzip.open(HTTP_ARCHIVE["path"], "wb") as f:
+            pickle.dump(archive, f, protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"Recorded {sum(len(e) for e in archive['exchanges'].values())} HTTP exchanges to {HTTP_ARCHIVE['path']}")
+    HTTP_ARCHIVE.update({"mode": None, "path": None, "exchanges": {}, "served": {}, "latency": None})
+
+
+def http_archive_active():
+    """Is a run being recorded or replayed?
+
+    RETURNS
+    active (bool): True if recording or replaying
+    """
+
+    return HTTP_ARCHIVE["mode"] is not None
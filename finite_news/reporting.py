@@ -0,0 +1,1070 @@
+"""🕵🏻‍♀️ Reporting: Research the content for an issue"""
+
+import asyncio
+import base64
+from datetime import datetime, timedelta
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from io import BytesIO
+import logging
+from threading import BoundedSemaphore, Lock
+from time import monotonic, sleep
+from urllib.parse import urlparse
+
+from finite_news.content_store import use_content_store
+from finite_news.editorial import count_words
+from finite_news.fetching import DOWNLOAD_CHUNK_BYTES, FetchDeadlineExceeded, deadline_remaining, decode_response, get_max_bytes, http_get
+from finite_news.health import record_source_result, source_allowed
+from finite_news.loading import get_fn_secret
+from finite_news.parsing import SOURCE_TYPES, choose_parser, get_recipe, make_soup, select_headlines, select_json_headlines
+from finite_news.planning import source_key
+from finite_news.storage import get_storage
+
+
+# Headlines
+def scrape_headlines(source):
+    """Use a tag scraper to fetch a source's headlines
+    
+    ARGUMENTS
+    source (dict): Description of the website to scrape
+    
+    RETURNS
+    headlines (list of str): Headlines retrieved
+    
+    """
+    response = http_get(source["url"], max_bytes=get_max_bytes(source))
+    return parse_headlines(decode_response(response, source.get("encoding")), source)
+
+
+def strip_ends(headline):
+    """Helper function to remove newlines and tabs from the ends of a headline, however they're interleaved.
+    
+    ARGUMENTS
+    headline (str): The text to clean
+    
+    RETURNS
+    headline (str): The text without newlines or tabs at either end
+    """
+    
+    while True:
+        stripped = headline.strip("\n").strip("\t")
+        if len(stripped) == len(headline):
+            return stripped
+        headline = stripped
+
+
+def parse_headlines(markup, source):
+    """Find a source's headlines in its downloaded page, and clean them.
+    
+    NOTE
+    The page is always parsed whole first (with lxml, only the elements the recipe reads. See SourceRecipe.strainer).
+    After that, each step handles one headline at a time, so a source with max_headlines stops searching the parsed page,
+    and reading and cleaning its elements, as soon as it has enough headlines that pass its filters.
+    
+    ARGUMENTS
+    markup (str): The page's HTML
+    source (dict): Description of the website and which elements hold headlines
+    
+    RETURNS
+    headlines (list of str): Headlines found
+    """
+    
+    recipe = get_recipe(source)
+    headlines = select_headlines(markup, recipe)
+
+    # Apply certain text cleaning that depends on source config
+    # TODO: Move these to editing; keep headlines associated with their source config longer
+
+    # Check if necessary phrase present
+    if recipe.must_contain is not None:
+        headlines = (h for h in headlines if recipe.must_contain in h.lower())
+        
+    # Remove \n and \t from ends of headline. Needed before heal_inner_n
+    headlines = (strip_ends(h) for h in headlines)
+    
+    # Clean headlines with a "\n" in the middle
+    if recipe.heal_inner_n:
+        headlines = (headline.replace("\n", ": ") for headline in headlines)
+    
+    # Ensure headline is long enough
+    if recipe.min_words is not None:
+        headlines = (headline for headline in headlines if count_words(headline)>=recipe.min_words) # Have seen some that are just "Advertisement", or author names
+    
+    # Remove repeats, and stop once there are enough headlines that research_headlines() will keep
+    max_headlines = recipe.max_headlines
+    seen = set()
+    kept = []
+    kept_count = 0
+    for headline in headlines:
+        if headline in seen:
+            continue
+        seen.add(headline)
+        kept.append(headline)
+        if max_headlines and headline.replace("\n","").strip():
+            kept_count += 1
+            if kept_count == max_headlines:
+                break
+    return kept
+
+
+def call_api_for_headlines(source):
+    """Use an API to fetch a source's headlines. 
+
+    NOTE
+        - Requires that the API key named in the source config file is stored in AWS Secrets Manager.
+        - Assumes API response comes back in JSON format.
+        - The response is read as it downloads, and only until max_headlines are found. See select_json_headlines().
+
+    ARGUMENTS
+    source (dict): Description of the API to call and parse, with keys for:
+        - headline_field (str): Path to the headline within each result, like "title" or "headline.main"
+        - results_path (str): Optional, path to the list of results in the response, like "response.docs". Default: "results"
+    
+    RETURNS
+    headlines (list of str): Headlines retrieved
+    """
+    
+    response = http_get(source["url"] + get_fn_secret(source["api_key_name"]), stream=True)
+    try:
+        return select_json_headlines(
+            response.iter_content(DOWNLOAD_CHUNK_BYTES),
+            source.get("results_path", "results"),
+            source["headline_field"],
+            source.get("max_headlines")
+        )
+    finally:
+        response.close() # Stop downloading the rest
+
+
+def get_todays_nba_game(team_name):
+    """Call the NBA API to find out if a team is playing today.
+    
+    NOTE
+    This updated version accounts for the limitation of using the NBA API's current day's scoreboard: 
+    the scoreboard isn't always updated until a certain hour in the morning, after FN may be run.
+    The updated approach here looks at the whole year's schedule, including post-season. Adapted from : https://github.com/swar/nba_api/issues/296
+
+    TODO: Clean and simpify. No need to use Pandas.
+    
+    ARGUMENTS:
+    team_name (str): NBA team such as "Celtics" or "Lakers"
+    
+    RETURNS
+    message (str or None): A headline-style update if the team is playing tonight. "" if they aren't. None if there was a problem
+    """
+    
+    import pandas as pd # Only load pandas on days when a subscriber tracks an NBA team
+    import pytz
+
+    try:
+        url = 'https://cdn.nba.com/static/json/staticData/scheduleLeagueV2.json'
+        r = http_get(url)
+        schedule = r.json()
+        schedule = schedule['leagueSchedule']['gameDates']
+        games = []
+        for gameday in schedule:
+            for game in gameday['games']:
+                game_details = [
+                        game['gameDateTimeUTC'],
+                        game['homeTeam']['teamName'],
+                        game['homeTeam']['teamCity'],
+                        game['awayTeam']['teamName'],
+                        game['awayTeam']['teamCity'],
+                       ]
+                game_details = pd.DataFrame(
+                    [game_details],
+                    columns =[
+                        "gameDateTimeUTC",
+                        "homeTeam",
+                        "homeCity",
+                        "awayTeam",
+                        "awayCity",
+                    ]
+                )
+                games.append(game_details)
+        games = pd.concat([game for game in games])
+
+        eastern = pytz.timezone('US/Eastern')
+        games['gameDateTimeUTC'] = pd.to_datetime(games['gameDateTimeUTC'], errors='coerce')
+        games = games.dropna(subset=['gameDateTimeUTC'])
+        games['gameDateTimeEastern'] = games['gameDateTimeUTC'].apply(lambda t: t.astimezone(eastern))
+        games['gameDate'] = games['gameDateTimeEastern'].apply(lambda d: d.date())
+
+        game = (
+            games.loc[
+                ((games['awayTeam'] == team_name) | (games['homeTeam'] == team_name))
+                & (games['gameDate'] == datetime.today().date())]
+        )
+        if game.shape[0]==1:
+            game = game.iloc[0]
+            tipoff = game["gameDateTimeEastern"].strftime("%I:%M").lstrip("0").replace(":00","")
+            if team_name in game["homeTeam"]:
+                other_team = game["awayTeam"]
+                message = f"The {team_name} host the {other_team} at {tipoff}."
+            else:
+                other_city = game["homeCity"]
+                message = f"The {team_name} are in {other_city}. Tipoff at {tipoff}."
+        else:
+            message = "" # No game today. Not None, so the content store keeps it and a later run doesn't check again
+    except Exception as e:
+        logging.warning(f"NBA game error for {team_name}: {str(type(e))}, {str(e)}")
+        message= None
+    return message
+
+
+def download_headlines(source):
+    """Fetch a source's desired content from the Internet.
+
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+    
+    RETURNS
+    headlines (list of str): Headlines retrieved
+    """
+    
+    if source["method"]=="api":
+        return call_api_for_headlines(source)
+    if source["method"]=="scrape":
+        return scrape_headlines(source)
+    
+
+def research_headlines(source, max_headlines):
+    """Download headlines from a source then post-process each source's list. 
+
+    NOTE
+    See also clean_headline() for post-processing that's done on the level of an individual headline.
+    
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+    max_headlines (int): The upper limit on how many headlines we will take from this source
+    
+    RETURNS
+    headlines (list of str): Headlines from the source, after postprocessing
+    """
+    
+    # Get those headlines
+    headlines = download_headlines(source)
+    
+    # Lightly postprocess 'em
+    if headlines:
+        headlines = [headline.replace("\n","").strip() for headline in headlines if headline]
+        if max_headlines:
+            headlines = headlines[0:max_headlines]
+    return headlines
+
+
+# Forecast
+def get_nws_forecast(nws_config):
+    """Use National Weather Service API to get local forecast.
+        
+    ARGUMENTS
+    nws_config (dict): Parameters for calling the NWS API, including keys for:
+        - office (str): Which NWS office to get the forecast from (See NOTE above)
+        - grid_x (int), grid_y (int): Coordinates for the forecast (See NOTE above)
+        - location_name (str): Optional, Town or city name (no state/country etc)
+        - api_snooze_bar (int): How many seconds to wait before retrying NWS after an exception
+
+    RETURNS
+    forecast (dict or None): Attributes of the forecast retrieved, or None if there was a problem.
+    """
+    
+    MAX_ATTEMPTS = 10 
+    r = None # So the warning below works even if the first request raises, like FetchDeadlineExceeded
+    try:
+        attempts=1
+        while attempts<MAX_ATTEMPTS:
+            url =f"https://api.weather.gov/gridpoints/{nws_config['office']}/{nws_config['grid_x']},{nws_config['grid_y']}/forecast"
+            r = http_get(url, timeout=5)
+            if r.status_code==200:
+                break
+            else:
+                attempts+=1
+                remaining = deadline_remaining()
+                if remaining is not None and remaining < 10:
+                    logging.warning(f"Weather request {r.status_code}. Not enough time left before the fetch deadline to retry")
+                    break
+                logging.info(f"Weather request {r.status_code}. Wait {nws_config['api_snooze_bar']} seconds and retry, take # {attempts} ...")
+                sleep(10)
+        
+        result = r.json()["properties"]["periods"][0]
+        forecast = {
+            "short": result.get("shortForecast", None),
+            "detailed": result.get("detailedForecast", None),
+            "icon_url": result.get("icon", None)
+        }
+        forecast["short"] = forecast["short"].capitalize() # Change from Title Case to Sentence case 
+        if "location_name" in nws_config:
+            forecast["short"] += f" in {nws_config['location_name']}"
+        return forecast
+    except Exception as e:
+        logging.warning(f"Forecast error after {MAX_ATTEMPTS} attempts: {str(type(e))}, {str(e)}, {r}")
+        return None
+    
+
+def get_ca_forecast(forecast_config):
+    """Use Environment Canada API to get local forecast.
+        
+    ARGUMENTS
+    forecast_config (dict): Parameters for calling the env_canada API, including keys for:
+        - lat (float), lon (float): Coordinates for the forecast 
+        - location_name (str): Optional, Town or city name (no province etc)
+
+    RETURNS
+    forecast (dict or None): Attributes of the forecast retrieved, or None if there was a problem.
+    """
+    
+    from env_canada import ECWeather
+
+    try:
+        ec_en = ECWeather(coordinates=(forecast_config["lat"], forecast_config["lon"]))
+        asyncio.run(ec_en.update())
+        forecast_short, forecast_detailed = (
+            ec_en
+            .daily_forecasts
+            [0]
+            ["text_summary"]
+            .split(".", maxsplit=1)
+        )
+        # If the first forecast returned is a day forecast, add the second forecast -- tonight
+        # If the first forecast is a night forecast, don't add the second forecast. That's tomorrow's day forecast.
+        if "night" not in ec_en.daily_forecasts[0]['period'].lower():
+            forecast_detailed += f"\n\nTonight: {ec_en.daily_forecasts[1]['text_summary']}"            
+        forecast = {
+            "short": forecast_short,
+            "detailed": forecast_detailed,
+        }
+        if "location_name" in forecast_config:
+            forecast["short"] += f" in {forecast_config['location_name']}"
+        return forecast
+    except Exception as e:
+        logging.warning(f"env_canada forecast error: {str(type(e))}, {str(e)}")
+        return None
+    
+    
+def get_weather_emoji(forecast):
+    """
+    Label a weather forecast with an emoji. It's used to spice up the section header.
+    
+    ARGUMENTS
+    forecast (dict): Attributes of the forecast retrieved.
+    
+    RETURNS
+    emoji (str): One character
+    """
+
+    forecast = forecast.lower()
+    if "tornado" in forecast:
+        return "🌪️"
+    if "hurricane" in forecast:
+        return "🌀"
+    if "thunder" in forecast or "lightning" in forecast:
+        return "⚡"
+    if "snow" in forecast or "flurries" in forecast:
+        return "❄️"
+    if "rain" in forecast or "pour" in forecast or "shower" in forecast or "drizzle" in forecast: # Must come after snow for snow showers
+        return "☔"
+    if "hot" in forecast:
+        return "🥵"
+    if "freezing" in forecast:
+        return "🥶"
+    if "partly cloudy" in forecast or "mostly sunny" in forecast:
+        return "🌤️"
+    if "sunny" in forecast or "beautiful" in forecast or "warm" in forecast: # Must come after mostly sunny
+        return "😎"
+    if "mostly cloudy" in forecast:
+        return "🌥️"
+    if "cloudy" in forecast:
+        return "☁️"
+    if "windy" in forecast:
+        return "🌬️"
+    return "🔮"
+
+
+def get_forecast(forecast_config):
+    """Use selected API to get weather forecast
+    
+    ARGUMENT
+    forecast_config (dict): Parameters for calling the API, depending on "source"
+    
+    RETURNS
+    forecast (dict or None): Attributes of the forecast retrieved, or None if there was a problem.
+    """
+    
+    if forecast_config["source"] == "nws":
+        return get_nws_forecast(forecast_config)
+    elif forecast_config["source"] == "env_canada":
+        return get_ca_forecast(forecast_config)
+    else:
+        logging.warning(f"Unexpected forecast source. No forecast added. {forecast_config}") 
+        return None
+
+
+# Stocks
+def research_stock_history(ticker):
+    """Retrieve the previous quarter of stock prices
+    
+    ARGUMENTS
+    ticker (str): The abbreviation of the stock
+    
+    RETURNS
+    stock_df (DataFrame): Previous month's stock prices
+    """
+    import yfinance as yf # Only load stock libraries on days when a subscriber gets stocks
+
+    stock = yf.Ticker(ticker)
+    
+    # Get stock name
+    # This is the series name that will be displayed in plot.
+    stock_info = stock.info
+    if "shortName" in stock_info:
+        stock_name = stock.info["shortName"]
+    elif "longName" in stock_info:
+        stock_name = stock.info["longName"]
+    else:
+        stock_name = ticker
+    if len(stock_name)<4: # If shortName / longName are weird, just use ticker
+        stock_name = ticker
+
+    # Get price series
+    stock_df = (
+        stock
+        .history(period="3mo")
+        .reset_index() #.reset_index()[["
+        .assign(
+            date = lambda df: df["Date"].dt.strftime("%m-%d"),
+        )
+        [["date", "Close"]]
+    )
+    stock_df[stock_name] = stock_df["Close"]
+    
+    return (
+        stock_df
+        .set_index(["date"])
+        .drop(columns=["Close"])
+    )
+
+
+def research_stock_histories(tickers):
+    """Get previous quarter prices for a list of stocks
+    
+    ARGUMENTS
+    tickers (list of str): The abbreviation (ticker) of each stock  
+
+    RETURNS
+    stocks_df (DataFrame): Previous month's prices, with each stock as a column and mon-day (str) as index
+    """
+    
+    import pandas as pd
+
+    stocks_l = [research_stock_history(ticker) for ticker in tickers]
+    stocks_df = pd.concat(stocks_l, axis=1)
+    stocks_df = stocks_df.loc[:, stocks_df.max().sort_values(ascending=False).index] # Sort biggest ticker first
+    return stocks_df
+
+
+def plot_stocks(stocks_df, dev_mode=False):
+    """Create a plot for stock prices.
+    
+    ARGUMENTS
+    stocks_df (DataFrame): Previous month's prices, with each stock as a column and mon-day (str) as index
+    dev_mode (bool): If we're in dev/debug, output the plots to local files too.
+    
+    RETURNS
+    png_b64 (str): The PNG image as base64
+
+    """
+    from matplotlib import pyplot as plt
+    import pandas as pd
+    import seaborn as sns
+
+    fig = plt.figure(figsize=(8,5))
+    plt.style.use("dark_background")
+    sns.lineplot(data=stocks_df, palette="husl", dashes=False, lw=4)
+    sns.despine()
+    plt.tight_layout()
+    plot_max_y = stocks_df.iloc[:, 0].max() # Max of biggest ticker
+    _ = plt.ylim(0, 1.2 * plot_max_y) # Max of biggest ticker + 20%
+
+    # Show one x tick per month, plus the last date
+    x_plots = pd.Index(
+        set(
+            list(stocks_df.index[::30])[0:-1] # ::7 when showing quarterly, show every 30 days and drop last one
+            # list(stocks_df.index[::7]) # when showing monthly 
+            + [stocks_df.index[-1]] # Add last date of data (set() de-dups if necessary)
+        )
+    )
+    plt.xticks(
+        x_plots,
+        rotation=45,
+        horizontalalignment='right',
+        fontweight='light'
+    )
+    ax = plt.gca() # Get current axis
+
+    # Add text labels
+    for stock_i, stock_name in enumerate(stocks_df.columns):
+        ticker_s = stocks_df[stock_name].dropna()
+
+        # Add stock name
+        ax.annotate(
+            xy=(ticker_s.index[-1], ticker_s.iloc[-1]),
+            xytext=(30,-5),
+            textcoords='offset points',
+            text=ticker_s.name, # The name of the Series = full name of stock, else ticker
+            fontsize=20,
+            color=ax.lines[stock_i].get_color(),
+            ha='left',
+        )
+        
+        # Add data labels
+        for i in [0, -1]:
+            ax.annotate(
+                xy=(ticker_s.index[i], ticker_s.iloc[i]),
+                xytext=(0, 20), # Place text 20 points above each data point
+                textcoords='offset points',
+                text=int(round(ticker_s.iloc[i],0)),
+                fontsize=18 if i ==-1 else 14,
+                color=ax.lines[stock_i].get_color(),
+                ha='center',
+                va='top'
+            )
+
+    plt.legend([],[], frameon=False) # Remove legend
+    ax.set_xlabel(None) # Remove "Date" name of X axis
+    
+    # Get raw image
+    png_bytes = BytesIO()
+    plt.savefig(png_bytes, format = "png", bbox_inches='tight')
+    png_bytes.seek(0)
+    
+    if dev_mode:
+        plt.savefig(f"stocks_{'_'.join(stocks_df.columns)}.png", format = "png", bbox_inches='tight')
+
+    plt.close(fig)
+    del fig
+    
+    return base64.b64encode(png_bytes.read()).decode()
+
+
+def get_stocks_plot(tickers, dev_mode):
+    """Get on stocks data for the issue.
+    
+    ARGUMENTS
+    tickers (list of str): The abbreviation (ticker) of each stock  
+    dev_mode (bool): If we're in dev/debug, output the plots to local files too.
+
+    RETURNS
+    stocks_plot (base64): Image for a single plot of tickers
+    """
+    
+    stocks_df = research_stock_histories(tickers)
+    return plot_stocks(stocks_df, dev_mode)
+
+
+# Events calendars
+def extract_tag_class(element, soup, config):
+    """Helper function to locate an HTML element's content by class and parse into a string.
+
+    ARGUMENT
+    element (str): Internal Finite News name of the element
+    soup (BeautifulSoup object): The parsed HTML to search
+    config (dict): The calendar_config dictionary describing the web calendar and how we'll process it 
+
+    RETURNS
+    element_str (str): The text of the desired element, if present in the soup
+    """
+    
+    class_name = f"{element}_class"
+    if class_name in config:
+        return (
+            soup
+            .find(class_=config[class_name])
+            .text
+            .strip()
+        )
+    return ""
+
+
+def extract_event_details(event_soup, calendar_config):
+    """Parse an event description from HTML to structured data.
+    
+    ARGUMENTS
+    event_soup (BeautifulSoup object): Parsed HTML for the event
+    calendar_config (dict): Description of the website, calendar structure, and configuration
+
+    RETURNS
+    event (dict): Description of event with keys required for rendering in issue
+    """
+    
+    event = {}
+    
+    # Extract text descriptions about the event
+    for element in ["title", "venue", "dates", "description"]:
+        event[element] = extract_tag_class(element, event_soup, calendar_config)
+    
+    # Extract thumbnail image
+    if "image_html_class" in calendar_config:
+        event["image_html"] = event_soup.find(class_=calendar_config["image_html_class"])
+        if "placeholder_image_src" in calendar_config:
+            if calendar_config["placeholder_image_src"] in event["image_html"].get("src", ""):
+                event["image_html"] = calendar_config["placeholder_image_replacement_url"]
+    else:
+        event["image_html"] = ""
+
+    # Extract link   
+    if "link_url_class" in calendar_config and "link_url_child_key" in "calendar_config":
+        event["link_url"] = (
+            event_soup
+            .find(class_=calendar_config["link_url_class"])
+            .get(calendar_config["link_url_child_key"], "")
+        )
+    else:
+        event["link_url"] = ""
+        
+    return event
+
+
+def scrape_calendar_page(url_base, page, event_item_tag, event_list_class, html_parser="html.parser", max_bytes=None, encoding=None):
+    """Pull content from one page of a web calendar.
+    
+    ARGUMENTS
+    url_base (str): The url for the calendar, with {PAGE} as a placeholder
+    page (int): The page to request
+    event_item_tag (str): The HTML tag where each event is stored
+    event_list_class (str): The element CSS class for those event tags
+    html_parser (str): Which BeautifulSoup parser to use, "html.parser" or "lxml"
+    max_bytes (int): Optional, the most of the page to download. None = all of it
+    encoding (str): Optional, the page's character set, if the website names the wrong one
+    
+    RETURNS
+    page_soup (BeautifulSoup object): Parsed HTML for the calendar page
+    """
+
+    try:
+        url = url_base.replace("{PAGE}", str(page))
+        response = http_get(url, max_bytes=max_bytes)
+        return (
+            make_soup(decode_response(response, encoding), html_parser)
+            .find_all(event_item_tag, class_=event_list_class)
+        )
+    except Exception as e:
+        logging.warning(f"scrape_calendar_page: {str(type(e))}, {str(e)}. {url}")
+
+
+def scrape_calendar(calendar_config):
+    """Pull content from a web calendar. Handle multi-page calendars.
+    
+    ARGUMENTS
+    calendar_config (dict): Description of the website, calendar structure, and configuration
+    
+    RETURNS
+    calendar_events (lsit of dict): List of event descriptions
+    """
+    
+    today = datetime.today() 
+    start_date = today.strftime('%m-%d-%Y')
+    end_date = (
+        (today + timedelta(days=calendar_config["window"]))
+        .strftime('%m-%d-%Y')
+    )
+    url_base = (
+        calendar_config["url_base"]
+        .replace("{START_DATE}", start_date)
+        .replace("{END_DATE}", end_date)
+    )
+
+    exhausted = False
+    calendar_events = []
+    page = 1
+    while True:
+        page_soup = scrape_calendar_page(
+            url_base,
+            page,
+            calendar_config["event_item_tag"],
+            calendar_config["event_list_class"],
+            choose_parser(calendar_config, soup=True),
+            get_max_bytes(calendar_config),
+            calendar_config.get("encoding")
+        )
+        if page_soup:
+            page_events = [extract_event_details(event_soup, calendar_config) for event_soup in page_soup]
+            calendar_events.append(page_events)
+            page += 1
+        else:
+            return [item for sublist in calendar_events for item in sublist] # FLatten nested list
+
+        
+def format_event(event):
+    """Render one event as a table row
+    
+    ARGUMENT
+    event (dict): Description of event
+    
+    RETURNS
+    event_row (str): HTML table row describing that event
+    """
+    
+    if len(event['title'])<2:
+        return ''
+    return f"""
+    <tr>
+       <td>
+           {event['image_html']}
+       </td>
+       <td>
+           <h4><a href="{event['link_url']}">{event['title']}</a></h4>
+           <p><b>{event['venue']}</b></p>
+           <p><b><i>{event['dates']}</b></i></p>
+           <p>{event['description']}</p>
+           <br>
+        </td>
+    </tr>
+    """
+
+
+def format_calendar(events):
+    """Render the list of events as an HTML table.
+    
+    ARGUMENTS
+    events (list of dict): List of event descriptions
+    
+    RETURNS
+    calendar_html (str): List of events formatted as an HTML table
+    """
+    
+    return f"""
+        <table>
+        {''.join([format_event(event) for event in events])}
+        </table>
+    """
+
+
+def get_calendar_events(calendar_config):
+    """Pull all events from a website calendar, formatting results as HTML table.
+    
+    ARGUMENTS
+    calendar_config (dict): Description of the website, calendar structure, and configuration
+    
+    RETURNS
+    calendar_html (str): List of events formatted as an HTML table. "" if there are none, like when the calendar couldn't be read
+    """
+    
+    calendar_events = scrape_calendar(calendar_config)
+    if not calendar_events:
+        return "" # Not an empty table, so the source's health records it as empty instead of ok. See research_and_record_source()
+
+    # Limit total events if requested
+    if calendar_config.get("max_events"):
+        calendar_events = calendar_events[:min(calendar_config["max_events"], len(calendar_events))]
+    return format_calendar(calendar_events).replace("\n","")
+
+
+# Misc sources
+def get_car_talk_credit(bucket_path):
+    """Pull a random Car Talk credit from a CSV in storage. 
+    
+    NOTE
+    - These credits are fake staff credits that were used at the end of each episode of
+    the National Public Radio automotive advice radio show, Car Talk
+    - They came from downloading https://www.cartalk.com/content/staff-credits.
+
+    ARGUMENTS 
+    bucket_path (str): The location of the S3 bucket where required files are stored.
+
+    RETURNS
+    car_talk_credit (str): A fake staff member to thank for creation of this issue of Finite News :D
+    """
+    
+    import pandas as pd
+
+    credits_path = bucket_path + "car_talk_credits.csv"
+    return ": ".join(
+        pd.read_csv(BytesIO(get_storage(credits_path).read(credits_path)), header=None)
+        .sample(1)
+        .values
+        .flatten()
+        .tolist()
+    )
+
+
+def get_screenshots(sources):
+    """Not currently working on SM. Disabled."""
+    if not sources:
+        return []
+    options = Options()
+    options.add_argument('headless')
+    s=Service(ChromeDriverManager().install())
+    driver = webdriver.Chrome(service=s, options=options)
+    driver.maximize_window()
+
+    screenshots = []
+    for source in sources:
+        url = source["url"]
+        driver.get(url)
+        try:
+            elements = driver.find_elements(By.CLASS_NAME, source["element_class"])
+            if source.get("automate_gradually", False):
+            # TODO: Temporary workaround for Birdcast. There's surely a better way
+                b64_screenshots = [element.screenshot_as_base64 for element in elements]
+                screenshot_b64 = b64_screenshots[source["element_number"]]
+            else:       
+                # The simpler way that should work for nondynamically loaded images
+                chart_element = elements[source["element_number"]]
+                screenshot_b64 = chart_element.screenshot_as_base64
+        except Exception as e:
+            logging.warning(f"Selenium error on {source['url']}: {str(type(e))}, {str(e)}")
+        screenshots.append(screenshot_b64)
+        driver.quit()
+    return screenshots
+
+
+# General reporting
+MAX_CONCURRENT_FETCHES = 8 # Defaults for the publication's `fetching` settings
+MAX_CONCURRENT_PER_HOST = 2
+SOURCE_BUDGET_SECONDS = 120
+
+
+def research_source(source):
+    """Download a source's content then post-process.
+
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+
+    RETURNS
+    headlines (list of str): Headlines fround from source
+    or
+    html (str): Formatted block of html
+
+    """
+    if source["type"]=="headlines":
+        headlines = research_headlines(
+            source=source, 
+            max_headlines=source.get("max_headlines", None)
+        )
+        if len(headlines)==0 and not source.get("exclude_from_0_results_warning", False): # Escalate to admin if no results were returned, and that was unexpected. Source's scraper/API may be broken.
+            logging.warning(f"{source['name']}: retrieved 0 headlines") 
+        else:
+            logging.info(f"{source['name']}: retrieved {len(headlines)} headlines")
+        return headlines
+    elif source["type"] == "events_calendar":
+        return get_calendar_events(source)
+    else:
+        logging.warning(f"Unknown type of source {source['type']}: {str(source)}") 
+
+
+RESEARCH_CACHE = {} # Results of research_source() during this run, by source_key(), so each source is fetched once and shared by every issue
+RESEARCH_CACHE_STATS = {"hits": 0, "misses": 0, "logged": None}
+RESEARCH_CACHE_LOCK = Lock()
+RESEARCH_KEY_LOCKS = {} # One lock per source_key, so two threads asking for the same source don't both fetch it
+SKIPPED_SOURCE_KEYS = set() # Sources that ran out of time during this run, so later issues don't wait for them again
+
+
+def research_and_record_source(source):
+    """Research a source, and add how it went to the source's health. See health.py.
+    
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+    
+    RETURNS
+    headlines (list of str) or html (str): Same as research_source()
+    """
+    
+    if source.get("type") not in SOURCE_TYPES: # Skipped with a warning, so not a failure of the source
+        return research_source(source)
+    fetch_started = monotonic()
+    try:
+        result = research_source(source)
+    except FetchDeadlineExceeded: # Out of time, like a source that's still going at the deadline
+        record_source_result(source, monotonic() - fetch_started, "timeout")
+        raise
+    except Exception:
+        record_source_result(source, monotonic() - fetch_started, "error")
+        raise
+    record_source_result(source, monotonic() - fetch_started, "ok" if result else "empty")
+    return result
+
+
+def research_source_once(source):
+    """Research a source the first time any issue asks for it during this run, and reuse the result after that.
+    
+    NOTE
+    If researching the source raised an exception, the same exception is raised again for every issue that
+    asks for it, just like when each issue fetched on its own. But the source isn't fetched again.
+    When building issues from prefetched content, the source is only fetched if its content is missing or stale. See content_store.py.
+    
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+    
+    RETURNS
+    headlines (list of str) or html (str): Same as research_source()
+    """
+    
+    key = source_key(source)
+    with RESEARCH_CACHE_LOCK:
+        key_lock = RESEARCH_KEY_LOCKS.setdefault(key, Lock())
+    with key_lock:
+        hit = key in RESEARCH_CACHE
+        if not hit:
+            try:
+                RESEARCH_CACHE[key] = (use_content_store("source", source, lambda: research_and_record_source(source)), None)
+            except Exception as e:
+                RESEARCH_CACHE[key] = (None, e)
+    with RESEARCH_CACHE_LOCK:
+        RESEARCH_CACHE_STATS["hits" if hit else "misses"] += 1
+    result, exception = RESEARCH_CACHE[key]
+    if exception:
+        raise exception
+    return list(result) if isinstance(result, list) else result # Copy lists, so one issue's edits can't reach another's
+
+
+def reset_research_cache():
+    """Forget the previous run's research and timeouts, so a notebook or long-lived process fetches every source again. Call when a run starts.
+    
+    RETURNS
+    None
+    """
+    
+    with RESEARCH_CACHE_LOCK:
+        RESEARCH_CACHE.clear()
+        RESEARCH_KEY_LOCKS.clear()
+        RESEARCH_CACHE_STATS.update({"hits": 0, "misses": 0, "logged": None})
+        SKIPPED_SOURCE_KEYS.clear()
+
+
+def log_research_cache_stats():
+    """Report how often issues shared a source's research instead of fetching it again. For the admin issue.
+    
+    RETURNS
+    None
+    """
+    
+    stats = (RESEARCH_CACHE_STATS["hits"], RESEARCH_CACHE_STATS["misses"])
+    if sum(stats) and stats != RESEARCH_CACHE_STATS["logged"]: # Don't repeat the same numbers
+        RESEARCH_CACHE_STATS["logged"] = stats
+        logging.warning(f"Research cache: {stats[0]} hits, {stats[1]} misses. Fetched {stats[1]} sources for {sum(stats)} requests")
+
+
+def get_source_host(source):
+    """Helper function to find the website or API server a source is fetched from.
+    
+    ARGUMENTS
+    source (dict): Description of the API to call or website to scrape
+    
+    RETURNS
+    host (str): The host name, like www.example.com, or "" if the source has no URL
+    """
+    
+    return urlparse(source.get("url") or source.get("url_base") or "").netloc
+
+
+def research_sources(sources, return_html=False, fetching_config=None):
+    """Get content from multiple sources, through various means, and post-process.
+    
+    NOTE
+    Sources are fetched concurrently, so an issue takes about as long as its slowest source instead of the sum of them all.
+    Results come back in the same order as sources.
+    A source that takes longer than its time budget, or is still going when the run's fetch deadline passes,
+    is skipped: the issue goes out without it, and the admin gets a warning. That includes a source that gave up
+    on its own because the deadline passed (FetchDeadlineExceeded), whenever it finished.
+    So is a source whose circuit breaker is open because it failed on several runs in a row. See health.py.
+    
+    ARGUMENTS
+    sources (list of dict): A list of sources to get headlines from. A source may set budget_seconds to override the default budget
+    html (bool): Are these sources returning html as str? False = return list of Headlines
+    fetching_config (dict): Optional, the publication's `fetching` settings, with keys for:
+        - max_concurrent_fetches (int): How many sources to fetch at once. 1 = one after another
+        - max_concurrent_per_host (int): How many sources from the same website or API to fetch at once
+        - source_budget_seconds (float): How long to wait for one source before skipping it
+    
+    RETURNS
+    all_source_headlines (list of list): A list of headlines retrieved from every source
+    or 
+    all_source_html (str): Formatted HTML combining all content from sources
+    """
+    
+    if not sources:
+        return "" if return_html else []
+    fetching_config = fetching_config or {}
+    max_concurrent_fetches = max(fetching_config.get("max_concurrent_fetches", MAX_CONCURRENT_FETCHES), 1)
+    default_budget = fetching_config.get("source_budget_seconds", SOURCE_BUDGET_SECONDS)
+    host_slots = {
+        host: BoundedSemaphore(fetching_config.get("max_concurrent_per_host", MAX_CONCURRENT_PER_HOST))
+        for host in {get_source_host(source) for source in sources}
+    }
+    started = {} # When each source began fetching, by position, to enforce its budget
+    skipped = set() # Positions of sources we stopped waiting for
+
+    def research_in_host_slot(i, source):
+        with host_slots[get_source_host(source)]:
+            if i in skipped:
+                return None
+            key = source_key(source)
+            if key in SKIPPED_SOURCE_KEYS and key not in RESEARCH_CACHE: # Already timed out for an earlier issue
+                skipped.add(i)
+                return None
+            if not source_allowed(source): # Its circuit breaker is open after failing too often
+                skipped.add(i)
+                return None
+            started[i] = monotonic()
+            return research_source_once(source)
+
+    def skip(i, reason):
+        skipped.add(i)
+        SKIPPED_SOURCE_KEYS.add(source_key(sources[i]))
+        if i in started: # Sources that never started aren't to blame
+            record_source_result(sources[i], monotonic() - started[i], "timeout")
+        logging.warning(f"{sources[i].get('name', get_source_host(sources[i]))}: skipped, {reason}")
+
+    executor = ThreadPoolExecutor(max_workers=min(max_concurrent_fetches, len(sources)))
+    futures = {executor.submit(research_in_host_slot, i, source): i for i, source in enumerate(sources)}
+    pending = set(futures)
+    while pending:
+        _, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+        remaining = deadline_remaining()
+        for future in sorted(pending, key=futures.get):
+            i = futures[future]
+            budget = sources[i].get("budget_seconds", default_budget)
+            if remaining is not None and remaining <= 0:
+                skip(i, "the run's fetch deadline passed")
+            elif i in started and monotonic() - started[i] > budget:
+                skip(i, f"no content after {budget} seconds")
+            else:
+                continue
+            future.cancel() # Stops sources that haven't started. A running fetch is abandoned; its thread ends at its HTTP timeout
+            pending.discard(future)
+    executor.shutdown(wait=False) # Don't wait for abandoned fetches
+
+    empty = "" if return_html else []
+    research = []
+    for future, i in sorted(futures.items(), key=lambda item: item[1]):
+        if i not in skipped:
+            try:
+                research.append(future.result())
+                continue
+            except FetchDeadlineExceeded: # It ran out of time before the loop above noticed
+                skip(i, "the run's fetch deadline passed")
+        research.append(empty)
+    if return_html:
+        return "".join(research) # Concat HTML results
+    return research # Return list of headlines
+
+
+def get_attributions(sources, nba_used, nws_used, stocks_used):
+    """Compile the names of all sources used in the issue, to give credit.
+    
+    ARGUMENTS
+    sources (list of dict): A list of sources we tried to get headlines or events from
+    nba_used (bool): True if the issue tracks an NBA team
+    nws_used (bool): True if we were got a local forecast
+    stocks_used (bool): True if we included stock data
+    
+    RETURNS
+    attributions (list of str): The names of the sources
+    """
+    
+    attributions = list(set([source["name"] for source in sources])) # De-dups and sorts
+    attributions += ["Car Talk credits"] # TODO: Dynamic
+    if nba_used: attributions+= ["NBA API"]
+    if nws_used: attributions+= ["National Weather Service"]
+    if stocks_used: attributions+= ["Yahoo Finance"]
+    attributions = sorted(attributions)
+    return ", ".join(attributions)
@@ -0,0 +1,286 @@
+"""🗄️ Storage: Read and write the files that configure and remember Finite News
+
+Every file path starts with the BUCKET_PATH secret. An s3:// path uses S3, behind an in-memory cache.
+Any other path is a local directory, which lets the whole pipeline run (and be benchmarked) offline.
+"""
+
+import logging
+import os
+from threading import Lock
+
+UNCACHED_FOLDERS = ["http_cache/", "content_store/"] # Saved pages and prefetched content: big, and each read about once per run, so not kept in memory
+
+
+class S3Storage:
+    """Files in an AWS S3 bucket."""
+
+    def __init__(self):
+        self.fs = None # Connect on first use, to keep the cost of importing finite_news low
+
+    def get_fs(self):
+        """Connect to S3 on first use and reuse the connection for the rest of the run.
+
+        RETURNS
+        fs (s3fs.S3FileSystem): The S3 file system
+        """
+
+        if self.fs is None:
+            import s3fs
+            self.fs = s3fs.S3FileSystem()
+        return self.fs
+
+    def read(self, path):
+        """Read a whole file.
+
+        ARGUMENTS
+        path (str): The full path of the file, like s3://bucket/folder/file.yml
+
+        RETURNS
+        content (bytes): The raw content of the file
+        """
+
+        with self.get_fs().open(path, "rb") as f:
+            return f.read()
+
+    def write(self, path, content):
+        """Create or replace a file.
+
+        ARGUMENTS
+        path (str): The full path of the file
+        content (bytes): What to write
+
+        RETURNS
+        None
+        """
+
+        with self.get_fs().open(path, "wb") as f:
+            f.write(content)
+
+    def list_files(self, folder_path, prefix=""):
+        """Find the files in a folder whose names begin with prefix.
+
+        ARGUMENTS
+        folder_path (str): The full path of the folder, ending in /
+        prefix (str): The beginning of the file names to look for
+
+        RETURNS
+        file_names (list of str): The names of the files, without the folder path
+        """
+
+        return list(self.list_versions(folder_path, prefix))
+
+    def list_versions(self, folder_path, prefix=""):
+        """Find the files in a folder whose names begin with prefix, and the version of each, in one listing.
+
+        ARGUMENTS
+        folder_path (str): The full path of the folder, ending in /
+        prefix (str): The beginning of the file names to look for
+
+        RETURNS
+        versions (dict): For each file name, its S3 ETag, which changes whenever the file does
+        """
+
+        return {
+            f["name"].split("/")[-1]: f.get("ETag")
+            for f in self.get_fs().ls(folder_path, detail=True)
+            if f["name"].split("/")[-1].startswith(prefix)
+        }
+
+
+class LocalStorage:
+    """Files in a directory on this computer."""
+
+    def read(self, path):
+        """Read a whole file.
+
+        ARGUMENTS
+        path (str): The full path of the file
+
+        RETURNS
+        content (bytes): The raw content of the file
+        """
+
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write(self, path, content):
+        """Create or replace a file.
+
+        ARGUMENTS
+        path (str): The full path of the file
+        content (bytes): What to write
+
+        RETURNS
+        None
+        """
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True) # Like S3, where folders don't need creating
+        with open(path, "wb") as f:
+            f.write(content)
+
+    def list_files(self, folder_path, prefix=""):
+        """Find the files in a folder whose names begin with prefix.
+
+        ARGUMENTS
+        folder_path (str): The full path of the folder
+        prefix (str): The beginning of the file names to look for
+
+        RETURNS
+        file_names (list of str): The names of the files, without the folder path
+        """
+
+        return list(self.list_versions(folder_path, prefix))
+
+    def list_versions(self, folder_path, prefix=""):
+        """Find the files in a folder whose names begin with prefix, and the version of each.
+
+        ARGUMENTS
+        folder_path (str): The full path of the folder
+        prefix (str): The beginning of the file names to look for
+
+        RETURNS
+        versions (dict): For each file name, its modification time and size, which change whenever the file does
+        """
+
+        return {
+            entry.name: f"{entry.stat().st_mtime_ns}-{entry.stat().st_size}"
+            for entry in sorted(os.scandir(folder_path), key=lambda entry: entry.name)
+            if entry.is_file() and entry.name.startswith(prefix)
+        }
+
+
+class CachedStorage:
+    """Read-through, write-through memory cache in front of another storage.
+
+    NOTE
+    The first read of a file goes to the underlying storage. Later reads during the run are served from memory.
+    Except for files in UNCACHED_FOLDERS, which always go to the underlying storage, so memory stays small.
+    Call clear_storage_caches() when a run starts, so a notebook or long-lived process sees files changed in the bucket since its last run.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.cache = {}
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, path):
+        """Read a whole file, from memory if we've read or written it already during this run.
+
+        ARGUMENTS
+        path (str): The full path of the file
+
+        RETURNS
+        content (bytes): The raw content of the file
+        """
+
+        if not self.cacheable(path):
+            return self.storage.read(path)
+        with self.lock:
+            if path in self.cache:
+                self.hits += 1
+                return self.cache[path]
+            self.misses += 1
+        content = self.storage.read(path)
+        with self.lock:
+            self.cache[path] = content
+        return content
+
+    def write(self, path, content):
+        """Create or replace a file, and remember its new content.
+
+        ARGUMENTS
+        path (str): The full path of the file
+        content (bytes): What to write
+
+        RETURNS
+        None
+        """
+
+        self.storage.write(path, content)
+        if self.cacheable(path):
+            with self.lock:
+                self.cache[path] = content
+
+    def cacheable(self, path):
+        """Helper function to check whether a file is kept in memory: everything but files in UNCACHED_FOLDERS.
+
+        ARGUMENTS
+        path (str): The full path of the file
+
+        RETURNS
+        cacheable (bool): True if it's kept in memory
+        """
+
+        return not any(f"/{folder}" in path for folder in UNCACHED_FOLDERS)
+
+    def clear(self):
+        """Forget everything read or written, so the next reads go to the underlying storage.
+
+        RETURNS
+        None
+        """
+
+        with self.lock:
+            self.cache = {}
+            self.hits = 0
+            self.misses = 0
+
+    def list_files(self, folder_path, prefix=""):
+        """Find the files in a folder whose names begin with prefix. Not cached, so new files always show up.
+
+        ARGUMENTS
+        folder_path (str): The full path of the folder
+        prefix (str): The beginning of the file names to look for
+
+        RETURNS
+        file_names (list of str): The names of the files, without the folder path
+        """
+
+        return self.storage.list_files(folder_path, prefix)
+
+    def list_versions(self, folder_path, prefix=""):
+        """Find the files in a folder whose names begin with prefix, and the version of each. Not cached.
+
+        ARGUMENTS
+        folder_path (str): The full path of the folder
+        prefix (str): The beginning of the file names to look for
+
+        RETURNS
+        versions (dict): For each file name, a tag that changes whenever the file does
+        """
+
+        return self.storage.list_versions(folder_path, prefix)
+
+
+STORAGES = {} # One storage per kind ("s3" or "local"), shared by the whole run
+
+
+def get_storage(path):
+    """Pick the storage for a path, based on whether it's on S3 or local.
+
+    ARGUMENTS
+    path (str): A full file or folder path, usually beginning with BUCKET_PATH
+
+    RETURNS
+    storage (CachedStorage or LocalStorage): The storage that can read and write this path
+    """
+
+    kind = "s3" if path.startswith("s3://") else "local"
+    if kind not in STORAGES:
+        STORAGES[kind] = CachedStorage(S3Storage()) if kind == "s3" else LocalStorage()
+        logging.info(f"Using {kind} storage")
+    return STORAGES[kind]
+
+
+def clear_storage_caches():
+    """Forget the files cached by the previous run. Call when a run starts.
+
+    RETURNS
+    None
+    """
+
+    for storage in STORAGES.values():
+        if isinstance(storage, CachedStorage):
+            storage.clear()
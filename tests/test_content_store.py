@@ -0,0 +1,64 @@
+"""Tests for prefetching content and building issues from it, in content_store.py."""
+
+import pytest
+
+from finite_news.content_store import CONTENT_STORE, CONTENT_STORE_STATS, configure_content_store, start_content_store, use_content_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    configure_content_store(str(tmp_path) + "/", {"content_max_age_minutes": 60})
+    yield tmp_path
+    start_content_store(None)
+    CONTENT_STORE["path"] = None
+
+
+def counting_fetch(calls, content):
+    def fetch():
+        calls.append(content)
+        return content
+    return fetch
+
+
+def test_build_uses_what_the_prefetch_saved(store):
+    calls = []
+    start_content_store("prefetch")
+    assert use_content_store("forecast", {"office": "BOX"}, counting_fetch(calls, {"short": "Sunny"})) == {"short": "Sunny"}
+    start_content_store("build")
+    assert use_content_store("forecast", {"office": "BOX"}, counting_fetch(calls, {"short": "Rain"})) == {"short": "Sunny"}
+    assert len(calls) == 1
+    assert CONTENT_STORE_STATS["stored"] == 1
+
+
+def test_stale_content_is_fetched_again(store):
+    calls = []
+    start_content_store("prefetch")
+    use_content_store("forecast", {"office": "BOX"}, counting_fetch(calls, {"short": "Sunny"}))
+    configure_content_store(str(store) + "/", {"content_max_age_minutes": -1})
+    start_content_store("build")
+    assert use_content_store("forecast", {"office": "BOX"}, counting_fetch(calls, {"short": "Rain"})) == {"short": "Rain"}
+    assert CONTENT_STORE_STATS["stale"] == 1
+
+
+def test_failures_are_fetched_again_but_nothing_today_is_kept(store):
+    calls = []
+    start_content_store("prefetch")
+    use_content_store("nba_game", "Celtics", counting_fetch(calls, None)) # A problem reaching the API
+    use_content_store("nba_game", "Lakers", counting_fetch(calls, "")) # No game today
+    start_content_store("build")
+    use_content_store("nba_game", "Celtics", counting_fetch(calls, None))
+    use_content_store("nba_game", "Lakers", counting_fetch(calls, ""))
+    assert calls == [None, "", None]
+    assert (CONTENT_STORE_STATS["stored"], CONTENT_STORE_STATS["missing"]) == (1, 1)
+
+
+def test_each_run_starts_with_its_own_mode_and_stats(store):
+    calls = []
+    start_content_store("build")
+    use_content_store("forecast", {"office": "BOX"}, counting_fetch(calls, {"short": "Sunny"}))
+    assert CONTENT_STORE_STATS["missing"] == 1
+    start_content_store(None) # A later run that doesn't use the store
+    assert CONTENT_STORE["mode"] is None and CONTENT_STORE_STATS["missing"] == 0
+    use_content_store("forecast", {"office": "BOX"}, counting_fetch(calls, {"short": "Sunny"}))
+    assert len(calls) == 2 # Fetched again, not read from the store
+    assert CONTENT_STORE_STATS["stored"] == 0
@@ -0,0 +1,130 @@
+"""Tests for the HTTP cache, stats and rate limits in fetching.py, against a local server that sends an ETag."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+from threading import Thread
+from time import monotonic
+
+import pytest
+
+from finite_news import fetching
+from finite_news.fetching import HTTP_CACHE_STATS, HTTP_STATS, TokenBucket, configure_http, http_get, start_fetch_clock, wait_for_rate_limit
+from finite_news.loading import FN_SECRETS_CACHE
+from finite_news.parsing import json_streaming_available
+from finite_news.reporting import call_api_for_headlines
+
+ETAG = '"v1"'
+BODY = json.dumps({"results": [{"title": f"Headline {i}"} for i in range(50)]}).encode("utf-8")
+
+
+class ETagHandler(BaseHTTPRequestHandler):
+    """Serves BODY with an ETag, and 304 Not Modified when the client already has it. Always 503 for paths beginning with /busy."""
+
+    def do_GET(self):
+        self.server.requests.append({"path": self.path, "if_none_match": self.headers.get("If-None-Match"), "at": monotonic()})
+        if self.path.startswith("/busy"):
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ETagHandler)
+    httpd.requests = []
+    Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def http_cache(tmp_path):
+    start_fetch_clock()
+    configure_http({}, str(tmp_path) + "/")
+    yield tmp_path
+    configure_http({}, None)
+
+
+def test_not_modified_response_serves_saved_content(server, http_cache):
+    url = f"http://127.0.0.1:{server.server_port}/news"
+    assert http_get(url).content == BODY
+    response = http_get(url)
+    assert server.requests[-1]["if_none_match"] == ETAG # The server answered 304
+    assert response.status_code == 200
+    assert b"".join(response.iter_content(1000)) == BODY
+    assert response.json()["results"][0]["title"] == "Headline 0"
+
+
+@pytest.mark.skipif(not json_streaming_available(), reason="needs ijson")
+def test_streamed_api_source_works_on_every_run(server, http_cache):
+    FN_SECRETS_CACHE[("fn_secrets", "us-east-1")] = {"secrets": {"TEST_API_KEY": "?key=secret"}, "fetched_at": monotonic()}
+    url = f"http://127.0.0.1:{server.server_port}/api"
+    http_get(url + "?key=secret") # A cached copy from an earlier, unstreamed request
+    source = {"name": "Test API", "type": "headlines", "method": "api", "url": url, "api_key_name": "TEST_API_KEY", "headline_field": "title", "max_headlines": 5}
+    try:
+        first = call_api_for_headlines(source)
+        second = call_api_for_headlines(source)
+    finally:
+        FN_SECRETS_CACHE.pop(("fn_secrets", "us-east-1"))
+    assert first == second == [f"Headline {i}" for i in range(5)]
+    assert all(request["if_none_match"] is None for request in server.requests[1:]) # Streamed requests skip the cache
+
+
+def test_each_run_starts_with_its_own_http_stats(server, http_cache):
+    url = f"http://127.0.0.1:{server.server_port}/news"
+    http_get(url)
+    http_get(url)
+    assert HTTP_STATS["requests"] == 2 and HTTP_CACHE_STATS
+    start_fetch_clock() # The next run in the same process
+    assert HTTP_STATS["requests"] == 0 and not HTTP_CACHE_STATS
+
+
+def test_retries_wait_for_the_rate_limit(server):
+    start_fetch_clock()
+    configure_http({"host_rate_per_second": 4, "host_burst": 1, "retries": 2, "retry_backoff_seconds": 0})
+    try:
+        assert http_get(f"http://127.0.0.1:{server.server_port}/busy").status_code == 503
+    finally:
+        configure_http({})
+    times = [request["at"] for request in server.requests]
+    assert len(times) == 3 # The first attempt and two retries
+    assert all(later - earlier >= 0.2 for earlier, later in zip(times, times[1:])) # 4 per second, not all at once
+    assert HTTP_STATS["throttled"] == 2
+
+
+def test_token_bucket_allows_a_burst_then_spaces_requests():
+    bucket = TokenBucket(rate_per_second=2, burst=3)
+    waits = [bucket.reserve() for _ in range(5)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == pytest.approx(0.5, abs=0.05)
+    assert waits[4] == pytest.approx(1.0, abs=0.05) # Reserved in order, so each waits behind the last
+
+
+def test_each_host_has_its_own_rate_limit(monkeypatch):
+    waits = []
+    monkeypatch.setattr(fetching, "sleep", waits.append)
+    start_fetch_clock()
+    configure_http({"host_rate_per_second": 5, "host_burst": 2, "rate_limits": {"slow.example.com": {"rate_per_second": 1, "burst": 1}}})
+    try:
+        for _ in range(2):
+            wait_for_rate_limit("https://slow.example.com/page")
+            wait_for_rate_limit("https://fast.example.com/page")
+    finally:
+        configure_http({})
+    assert waits == [pytest.approx(1.0, abs=0.05)] # Only the second request to the slow host waits
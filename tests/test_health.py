@@ -0,0 +1,80 @@
+"""Tests for tracking source health across runs, and the circuit breaker, in health.py."""
+
+from datetime import date, timedelta
+import json
+
+import pytest
+
+from finite_news.fetching import configure_http, start_fetch_clock
+from finite_news.health import (
+    SOURCE_HEALTH,
+    configure_source_health,
+    record_source_result,
+    reset_source_health,
+    save_source_health,
+    source_allowed,
+)
+from finite_news.planning import source_key
+from finite_news.reporting import research_and_record_source
+
+SOURCE = {"name": "Flaky", "type": "headlines", "method": "scrape", "url": "http://example.com", "tag": "h2"}
+
+
+@pytest.fixture
+def health(tmp_path):
+    reset_source_health()
+    configure_source_health(str(tmp_path) + "/", {"breaker_failures": 3, "breaker_max_rest_days": 4})
+    yield tmp_path
+    reset_source_health()
+
+
+def next_run(bucket_path):
+    """Save this run's health, and start another run that loads it."""
+    save_source_health()
+    reset_source_health()
+    configure_source_health(str(bucket_path) + "/", {"breaker_failures": 3, "breaker_max_rest_days": 4})
+
+
+def test_breaker_opens_after_failures_in_a_row(health):
+    for _ in range(3):
+        assert source_allowed(SOURCE)
+        record_source_result(SOURCE, 1.0, "error")
+        next_run(health)
+    assert not source_allowed(SOURCE)
+    saved = json.loads((health / "source_health.json").read_text())[source_key(SOURCE)]
+    assert saved["open_until"] == (date.today() + timedelta(days=1)).isoformat()
+
+
+def test_failed_probes_rest_longer_and_a_success_closes_the_breaker(health):
+    for _ in range(3):
+        record_source_result(SOURCE, 1.0, "timeout")
+        next_run(health)
+    rest_days = []
+    for outcome in ["error", "error", "error", "ok"]:
+        SOURCE_HEALTH["sources"][source_key(SOURCE)]["open_until"] = date.today().isoformat() # The rest is over
+        assert source_allowed(SOURCE) # A probe
+        record_source_result(SOURCE, 1.0, outcome)
+        rest_days.append(SOURCE_HEALTH["sources"][source_key(SOURCE)]["rest_days"])
+        next_run(health)
+    assert rest_days == [2, 4, 4, 0] # Doubling, up to breaker_max_rest_days
+    assert source_allowed(SOURCE)
+
+
+def test_only_the_first_result_in_a_run_counts(health):
+    record_source_result(SOURCE, 1.0, "timeout")
+    record_source_result(SOURCE, 9.0, "ok") # The abandoned fetch finishing later
+    assert SOURCE_HEALTH["sources"][source_key(SOURCE)]["outcomes"] == ["timeout"]
+
+
+def test_unreadable_calendar_is_not_ok(health):
+    start_fetch_clock()
+    configure_http({"retries": 0})
+    calendar = {
+        "name": "Closed venue", "type": "events_calendar", "method": "scrape", "url_base": "http://127.0.0.1:9/events?page={PAGE}",
+        "window": 7, "event_item_tag": "div", "event_list_class": "event",
+    }
+    try:
+        assert research_and_record_source(calendar) == ""
+    finally:
+        configure_http({})
+    assert SOURCE_HEALTH["sources"][source_key(calendar)]["outcomes"] == ["empty"]
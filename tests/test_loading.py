@@ -0,0 +1,20 @@
+"""Tests for loading secrets, in loading.py."""
+
+import json
+
+from finite_news.loading import clear_fn_secrets_cache, get_fn_secret
+
+
+def test_secrets_are_fetched_again_after_their_ttl(tmp_path, monkeypatch):
+    secrets_file = tmp_path / "fn_secrets.json"
+    secrets_file.write_text(json.dumps({"API_KEY": "old"}))
+    monkeypatch.setenv("FN_SECRETS_FILE", str(secrets_file))
+    clear_fn_secrets_cache()
+    try:
+        assert get_fn_secret("API_KEY") == "old"
+        secrets_file.write_text(json.dumps({"API_KEY": "rotated"}))
+        assert get_fn_secret("API_KEY") == "old" # Cached
+        monkeypatch.setenv("FN_SECRETS_TTL_SECONDS", "0")
+        assert get_fn_secret("API_KEY") == "rotated"
+    finally:
+        clear_fn_secrets_cache()
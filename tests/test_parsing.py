@@ -0,0 +1,111 @@
+"""Tests that every HTML parser finds the same headlines, following each style of recipe."""
+
+import pytest
+
+from finite_news.parsing import (
+    PARSERS_AVAILABLE,
+    RECIPES,
+    SourceRecipe,
+    choose_parser,
+    compile_recipes,
+    configure_parsing,
+    get_recipe,
+    parser_available,
+    select_headlines,
+)
+from finite_news.reporting import parse_headlines
+
+PAGE = """<!DOCTYPE html><html><head><title>News</title></head><body>
+<div class="top">
+  <h2 class="story big">Story A has two classes</h2>
+  <h2 class="story">Story B has one class</h2>
+  <h2 class="big story">Story C has them the other way around</h2>
+  <h2 class="storyline">Story D only looks like a story</h2>
+  <h2>Story E has no class at all</h2>
+</div>
+<p class="list">Latest</p><ul><li>First of the list|Second of the list|Third of the list</li></ul>
+</body></html>"""
+
+RECIPE_STYLES = {
+    "tag": {"tag": "h2"},
+    "one class": {"tag": "h2", "tag_class": "story"},
+    "several classes": {"tag": "h2", "tag_class": "story big"},
+    "select_query": {"select_query": "div.top h2.big"},
+    "tag_next": {"tag": "p", "tag_class": "list", "tag_next": "li", "split_char": "|"},
+}
+PARSERS = [parser for parser in ["lxml", "selectolax"] if parser_available(parser)]
+
+
+def make_source(recipe, parser):
+    return {"name": "Test", "type": "headlines", "method": "scrape", "url": "http://example.com", "html_parser": parser, **recipe}
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("recipe_name", RECIPE_STYLES)
+def test_parsers_find_the_same_headlines(parser, recipe_name):
+    expected = list(select_headlines(PAGE, SourceRecipe(make_source(RECIPE_STYLES[recipe_name], "html.parser"))))
+    assert expected # The page has something for every recipe
+    assert list(select_headlines(PAGE, SourceRecipe(make_source(RECIPE_STYLES[recipe_name], parser)))) == expected
+
+
+@pytest.mark.parametrize("parser", ["html.parser"] + PARSERS)
+def test_elements_with_several_classes_are_found(parser):
+    headlines = parse_headlines(PAGE, make_source(RECIPE_STYLES["one class"], parser))
+    assert headlines == ["Story A has two classes", "Story B has one class", "Story C has them the other way around"]
+    assert parse_headlines(PAGE, make_source(RECIPE_STYLES["several classes"], parser)) == ["Story A has two classes"]
+
+
+def test_malformed_sources_stop_the_run_with_every_problem():
+    sources = [
+        make_source({"tag": "h2", "max_headlines": "five"}, "html.parser"),
+        make_source({"select_query": "h2[[broken"}, "html.parser"),
+        {"name": "No URL", "type": "headlines", "method": "api", "api_key_name": "KEY", "headline_field": "title"},
+    ]
+    with pytest.raises(ValueError) as error:
+        compile_recipes(sources)
+    assert "max_headlines must be a number" in str(error.value)
+    assert "isn't valid CSS" in str(error.value)
+    assert "No URL: missing url" in str(error.value)
+
+
+def test_sources_of_unknown_types_are_left_for_later():
+    screenshot = {"name": "Chart", "type": "screenshot", "url": "http://example.com"}
+    assert len(compile_recipes([screenshot, make_source({"tag": "h2"}, "html.parser")])) == 1
+
+
+def test_reloaded_settings_reuse_their_recipe():
+    recipes = compile_recipes([make_source({"tag": "h2", "tag_class": "story"}, "html.parser")])
+    compiled = len(RECIPES)
+    reloaded = make_source({"tag": "h2", "tag_class": "story"}, "html.parser") # Like the next run's freshly loaded config
+    assert get_recipe(reloaded) is recipes[0]
+    assert len(RECIPES) == compiled
+
+
+@pytest.fixture
+def default_parser():
+    yield
+    configure_parsing({})
+
+
+def test_a_source_can_choose_its_own_parser(default_parser):
+    configure_parsing({"html_parser": "html.parser"})
+    assert choose_parser({"html_parser": "lxml"}) == ("lxml" if parser_available("lxml") else "html.parser")
+    assert choose_parser({}) == "html.parser"
+
+
+def test_selectolax_uses_lxml_when_a_soup_is_needed(default_parser, monkeypatch):
+    monkeypatch.setitem(PARSERS_AVAILABLE, "lxml", True)
+    monkeypatch.setitem(PARSERS_AVAILABLE, "selectolax", True)
+    configure_parsing({"html_parser": "selectolax"})
+    assert choose_parser() == "selectolax"
+    assert choose_parser(soup=True) == "lxml" # Like calendars
+
+
+def test_missing_or_unknown_parsers_fall_back_to_html_parser(default_parser, monkeypatch, caplog):
+    monkeypatch.setitem(PARSERS_AVAILABLE, "lxml", False) # As if it weren't installed
+    assert choose_parser({"html_parser": "lxml"}) == "html.parser"
+    monkeypatch.delitem(PARSERS_AVAILABLE, "html5lib", raising=False)
+    assert choose_parser({"html_parser": "html5lib"}) == "html.parser"
+    assert "Unknown html_parser html5lib" in caplog.text
+    headlines = parse_headlines(PAGE, make_source(RECIPE_STYLES["one class"], "lxml"))
+    assert headlines[0] == "Story A has two classes"
@@ -0,0 +1,31 @@
+"""Tests for fetching an issue's sources together in reporting.py."""
+
+from time import monotonic
+
+import pytest
+
+from finite_news.fetching import FETCH_DEADLINE, start_fetch_clock
+from finite_news.health import SOURCE_HEALTH, reset_source_health
+from finite_news.reporting import SKIPPED_SOURCE_KEYS, research_sources, reset_research_cache
+
+
+@pytest.fixture
+def fresh_run():
+    start_fetch_clock()
+    reset_research_cache()
+    reset_source_health()
+    yield
+    start_fetch_clock()
+    reset_research_cache()
+    reset_source_health()
+
+
+def test_sources_past_the_deadline_are_skipped_not_fatal(fresh_run):
+    sources = [
+        {"name": f"Source {i}", "type": "headlines", "method": "scrape", "url": f"http://127.0.0.1:9/{i}", "tag": "h2"}
+        for i in range(3)
+    ]
+    FETCH_DEADLINE["at"] = monotonic() - 1 # Every request raises FetchDeadlineExceeded
+    assert research_sources(sources) == [[], [], []]
+    assert len(SKIPPED_SOURCE_KEYS) == 3
+    assert all(health["outcomes"] == ["timeout"] for health in SOURCE_HEALTH["sources"].values())
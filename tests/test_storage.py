@@ -0,0 +1,15 @@
+"""Tests for the in-memory cache in front of S3, in storage.py."""
+
+from finite_news.storage import CachedStorage, LocalStorage
+
+
+def test_small_files_are_cached_but_saved_pages_are_not(tmp_path):
+    (tmp_path / "http_cache").mkdir()
+    bucket_path = str(tmp_path) + "/"
+    storage = CachedStorage(LocalStorage())
+    storage.write(bucket_path + "publication_config.yml", b"sender: {}")
+    storage.write(bucket_path + "http_cache/page.pickle", b"<html>" * 1000)
+    assert storage.read(bucket_path + "publication_config.yml") == b"sender: {}"
+    assert storage.read(bucket_path + "http_cache/page.pickle") == b"<html>" * 1000
+    assert list(storage.cache) == [bucket_path + "publication_config.yml"]
+    assert storage.hits == 1